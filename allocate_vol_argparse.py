@@ -8,149 +8,449 @@
 # ----creation on SolidFire storage systems using EOS 10.0
 # sys is needed to manage exit codes
 # argparse is needed to accept arguments
-# datetime is used to write the log file to a timecode indicator
-# ElementFactory is used to connect SolidFire
-# QoS is needed to set specific QoS on the volume
+# sf_audit records the request and each result in the JSONL audit log
+# sf_session is used to connect SolidFire
+# QoS is needed to set specific QoS on the volume, it is imported when used
+#   so sf_cli.py can build this parser without loading the SDK
+# ThreadPoolExecutor and vol_manifest drive batch creation with -m
+# VolumeNameIndex makes batch duplicate name checks a lookup
+# find_volume pages the volume list and stops at the first match
+# sf_throttle adapts batch concurrency to cluster latency and errors
+# sf_retry retries batch creates rejected by a busy cluster
+# vol_validate holds the volume naming, size and QoS rules
+# vol_preflight checks the batch fits the cluster's space and IOPS first
+# vol_placement spreads a batch across several clusters given to -sm, the
+#   manifest account IDs are those of the first, matched by username on the
+#   others
+# sf_accounts checks the account against the local account cache
+# qos_catalog gives the QoS policy ID of a tier, -q tier and the manifest
+#   tier column create volumes on the policy, a tier policy whose QoS differs
+#   from the catalog stops the run rather than being changed
 
 import sys
 import argparse
-import datetime
-import re
-from solidfire.factory import ElementFactory
-from solidfire.models import QoS
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from vol_manifest import load_manifest
+from vol_index import VolumeNameIndex
+import sf_session
+from vol_listing import find_volume
+from sf_throttle import DEFAULT_RATE, ThrottledClient, limiter_for
+from sf_retry import default_policy as retry
+from sf_audit import get_log, redact_args
+from vol_validate import (BURST_QOS_RANGE, MAX_QOS_RANGE, MIN_QOS_RANGE,
+                          bounded_int, check_volume, volume_name)
+from vol_preflight import MinIopsTally, preflight, print_plan
+from vol_placement import place, print_placement, survey
+from sf_accounts import account_exists, forget
+import qos_catalog
 
-# Build time vars for file output
-rawtime = datetime.datetime.now().isoformat()
-mediumtime = rawtime.replace(':', '_')
-cookedtime = mediumtime.replace('-', '_')
+def add_arguments(parser):
+    # Set vars for connectivity using argparse
+    parser.add_argument('-sm', type=str,
+                        required=True,
+                        metavar='mvip',
+                        help='MVIP/node name or IP, with -m several '
+                        'comma separated MVIPs sharing the same credentials '
+                        'place the batch across the fleet, account IDs are '
+                        'those of the first MVIP')
+    parser.add_argument('-su', type=str,
+                        required=True,
+                        metavar='username',
+                        help='username to connect with')
+    parser.add_argument('-sp', type=str,
+                        required=True,
+                        metavar='password',
+                        help='password for user')
+    parser.add_argument('-v', type=volume_name,
+                        required=False,
+                        metavar='volume',
+                        help='volume name, no "_", 1 to 64 characters in length')
+    parser.add_argument('-a', type=int,
+                        required=False,
+                        metavar='chap account',
+                        help='account to use for CHAP exchange')
+    parser.add_argument('-s', type=int,
+                        required=False,
+                        metavar='volume size',
+                        help='volume size between 1,000,000,000'
+                        'and 8,796,093,022,208')
+    parser.add_argument('-e', type=bool,
+                        required=False,
+                        metavar='512e',
+                        help='True/False enable 512 block emulation')
+    parser.add_argument('-q', type=str,
+                        choices=['custom', 'default', 'tier'],
+                        required=False,
+                        metavar='QoS style',
+                        help='custom/default/tier use custom, default or a '
+                        'QoS tier policy from -t')
+    parser.add_argument('-t', type=str,
+                        required=False,
+                        metavar='tier',
+                        help='QoS tier from the qos_catalog catalog, for -q '
+                        'tier')
+    parser.add_argument('-n', type=bounded_int(*MIN_QOS_RANGE),
+                        required=False,
+                        metavar='min QoS',
+                        help='min QoS between 50 and 15000')
+    parser.add_argument('-x', type=bounded_int(*MAX_QOS_RANGE),
+                        required=False,
+                        metavar='max QoS',
+                        help='max QoS between 100 and 200000')
+    parser.add_argument('-b', type=bounded_int(*BURST_QOS_RANGE),
+                        required=False,
+                        metavar='burst QoS',
+                        help='burst QoS between 100 and 200000')
+    parser.add_argument('-m', type=str,
+                        required=False,
+                        metavar='manifest',
+                        help='CSV or JSONL manifest for batch creation, '
+                        'replaces -v/-a/-s/-e/-q')
+    parser.add_argument('-w', type=int,
+                        default=4,
+                        required=False,
+                        metavar='workers',
+                        help='most concurrent create workers in batch mode, '
+                        'the adaptive limit stays at or below this, default 4')
+    parser.add_argument('-l', type=float,
+                        default=DEFAULT_RATE,
+                        required=False,
+                        metavar='rate',
+                        help='most API calls per second to the cluster in batch '
+                        'mode, default {}'.format(DEFAULT_RATE))
+    parser.add_argument('-F', action='store_true',
+                        help='skip the capacity and QoS preflight in batch mode')
 
-# Open output file
-fh = open(cookedtime, "w")
 
-def enforceVolNaming(vol_name):
+def parse_inputs():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args()
+    return args
+
+
+def create_manifest_vol(sfe, req, policies=None):
+    """
+    This function creates a single volume from a manifest row
+    policies maps the tier names in the batch to QoS policy IDs
+    Returns (request, volume ID, error, elapsed seconds)
+    """
+    from solidfire.models import QoS
+    start = time.time()
     try:
-        return re.match("^[a-zA-Z1-9][a-zA-Z1-9-]{1,63}[a-zA-Z1-9]$", vol_name).group(0)
-    except:
-        raise argparse.ArgumentTypeError("\nString {} does not match required format, ensure there are no special characters,"
-                                         " that it is between 1 and 64 characters in length, and that no '-' exists at the start"
-                                         " or end of the volume".format(vol_name))
-
-# Set vars for connectivity using argparse
-parser = argparse.ArgumentParser()
-parser.add_argument('-sm', type=str,
-                    required=True,
-                    metavar='mvip',
-                    help='MVIP/node name or IP')
-parser.add_argument('-su', type=str,
-                    required=True,
-                    metavar='username',
-                    help='username to connect with')
-parser.add_argument('-sp', type=str,
-                    required=True,
-                    metavar='password',
-                    help='password for user')
-parser.add_argument('-v', type=enforceVolNaming,
-                    required=True,
-                    metavar='volume',
-                    help='volume name, no "_", 1 to 64 characters in length')
-parser.add_argument('-a', type=int,
-                    required=True,
-                    metavar='chap account',
-                    help='account to use for CHAP exchange')
-parser.add_argument('-s', type=int,
-                    required=True,
-                    metavar='volume size',
-                    help='volume size between 1,000,000,000'
-                    'and 8,796,093,022,208')
-parser.add_argument('-e', type=bool,
-                    required=True,
-                    metavar='512e',
-                    help='True/False enable 512 block emulation')
-parser.add_argument('-q', type=str,
-                    choices=['custom', 'default'],
-                    required=True,
-                    metavar='QoS style',
-                    help='custom/default use custom or default qos settings')
-parser.add_argument('-n', type=int,
-                    choices=range(50, 15001),
-                    required=False,
-                    metavar='min QoS',
-                    help='min QoS between 50 and 15000')
-parser.add_argument('-x', type=int,
-                    choices=range(100, 200001),
-                    required=False,
-                    metavar='max QoS',
-                    help='max QoS between 100 and 200000')
-parser.add_argument('-b', type=int,
-                    choices=range(100, 200001),
-                    required=False,
-                    metavar='burst QoS',
-                    help='burst QoS between 100 and 200000')
-args = parser.parse_args()
-
-# Write the submitted info out to the file
-fh.write(args)
-
-# Take input and create new vars
-src_mvip = args.sm
-src_user = args.su
-src_pass = args.sp
-vol_name = args.v
-vol_acct = args.a
-vol_size = args.s
-vol_512e = args.e
-
-# QoS, if requested
-if args.q == "custom":
-    minQoS = args.n
-    maxQoS = args.x
-    burstQoS = args.b
-    qos = QoS(burst_iops=burstQoS,
-              max_iops=maxQoS,
-              min_iops=minQoS)
-
-# Verify all variable inputs are valid and within boundaries
-if len(vol_name) > 64:
-    fh.write("Vol name exceeds character limit of 64. "
-             "\n\tRequested length is %d" % len(vol_name))
-    fh.close()
-    sys.exit(1)
+        if req.tier is not None:
+            result = retry.call("CreateVolume", sfe.create_volume,
+                                req.name,
+                                req.account,
+                                req.size,
+                                req.enable512e,
+                                qos_policy_id=policies[req.tier])
+        elif req.has_qos:
+            qos = QoS(burst_iops=req.burst_iops,
+                      max_iops=req.max_iops,
+                      min_iops=req.min_iops)
+            result = retry.call("CreateVolume", sfe.create_volume,
+                                req.name,
+                                req.account,
+                                req.size,
+                                req.enable512e,
+                                qos=qos)
+        else:
+            result = retry.call("CreateVolume", sfe.create_volume,
+                                req.name,
+                                req.account,
+                                req.size,
+                                req.enable512e)
+        return req, result.volume_id, None, time.time() - start
+    except Exception as e:
+        return req, None, str(e), time.time() - start
+
+
+def run_batch(sfe, reqs, errors, workers, cluster=None, mvip=None):
+    """
+    This function finishes validating the manifest rows against the
+        cluster, then creates every volume over the shared connection
+        using a bounded pool of workers
+    The capacity and QoS preflight runs when cluster names the cluster
+    mvip keys the QoS policy cache for rows with a tier
+    """
+    audit = get_log()
+    # Accounts and existing names are fetched once for the whole batch
+    accounts = set(acct.account_id for acct in sfe.list_accounts().accounts)
+    existing = VolumeNameIndex(sfe)
+    tally = MinIopsTally()
+    existing.refresh(on_volume=tally.add)
+    for req in reqs:
+        if req.account not in accounts:
+            errors.append("line {}: account ID {} does not exist".format(
+                req.line, req.account))
+        if req.name in existing:
+            errors.append("line {}: duplicate volume name {} exists on "
+                          "the cluster".format(req.line, req.name))
+    if cluster is not None and reqs:
+        plan = preflight(sfe, cluster, [(req.size, req.min_iops)
+                                        for req in reqs], tally=tally)
+        print_plan(plan)
+        audit.record("preflight", cluster=cluster, fits=plan.fits,
+                     errors=plan.errors, warnings=plan.warnings)
+        errors.extend("preflight: {}".format(err) for err in plan.errors)
+    if errors:
+        for err in errors:
+            print(err)
+            audit.record("error", message=err)
+        sys.exit("Manifest validation failed with {} error(s), "
+                 "no volumes were created".format(len(errors)))
+
+    try:
+        policies = batch_policies(sfe, mvip or cluster, reqs)
+    except ValueError as e:
+        fail("{}, no volumes were created".format(e))
+    failed, _ = create_batch(sfe, reqs, workers, existing, policies=policies)
+    if failed and policies:
+        # A cached policy may have been deleted, look it up next run
+        qos_catalog.forget(mvip or cluster)
+    print("Retries: {}".format(retry.snapshot()))
+    if failed:
+        sys.exit(1)
+
+
+def batch_policies(sfe, mvip, reqs):
+    """
+    Returns the QoS policy IDs of the tiers used by reqs on the cluster,
+        creating any policy that is missing
+    Raises ValueError if an existing policy differs from the catalog
+    """
+    names = set(req.tier for req in reqs if req.tier is not None)
+    if not names:
+        return {}
+    return qos_catalog.policy_ids(sfe, mvip, names)
+
+
+def create_batch(sfe, reqs, workers, existing, cluster=None, policies=None):
+    """
+    This function creates already validated manifest rows with a bounded
+        pool of workers and prints the results
+    cluster, if set, prefixes every line so fleet runs can be told apart
+    policies maps the tiers in reqs to QoS policy IDs
+    Returns (failed count, elapsed seconds)
+    """
+    audit = get_log()
+    tag = "" if cluster is None else "{} ".format(cluster)
+    print("-----{}Creating {} volumes with {} workers-----".format(
+        tag, len(reqs), workers))
+    failed = 0
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(create_manifest_vol, sfe, req, policies)
+                   for req in reqs]
+        for future in as_completed(futures):
+            req, vol_id, err, elapsed = future.result()
+            audit.record("result", line=req.line, name=req.name,
+                         volume_id=vol_id, error=err, elapsed=elapsed,
+                         cluster=cluster)
+            if err is None:
+                existing.add(req.name, vol_id)
+                print("{}line {}: created {} as volume ID {} "
+                      "in {:.2f}s".format(tag, req.line, req.name, vol_id,
+                                          elapsed))
+            else:
+                failed += 1
+                print("{}line {}: FAILED {} after {:.2f}s: {}".format(
+                    tag, req.line, req.name, elapsed, err))
+    total = time.time() - start
+
+    created = len(reqs) - failed
+    rate = created / total if total > 0 else 0.0
+    print("{}{} created, {} failed in {:.2f}s, "
+          "{:.2f} volumes/second".format(tag, created, failed, total, rate))
+    audit.record("summary", created=created, failed=failed, elapsed=total,
+                 cluster=cluster)
+    if isinstance(sfe, ThrottledClient):
+        print("{}Throttle: {}".format(tag, sfe.limiter.snapshot()))
+    return failed, total
+
+
+def run_fleet(clusters, user, password, reqs, errors, workers, rate):
+    """
+    This function surveys every cluster in parallel, places each manifest
+        row on the cluster with the most headroom for it, then creates
+        the volumes on all clusters at once, workers per cluster
+    """
+    audit = get_log()
+
+    def connect(cluster):
+        sfe = sf_session.connect(cluster, user, password)
+        return ThrottledClient(sfe, limiter_for(cluster, max_limit=workers,
+                                                rate=rate))
+
+    loads = survey(clusters, connect)
+    errors.extend(place(reqs, loads))
+    print_placement(loads)
+    audit.record("placement", clusters={load.cluster: [req.name for req in
+                                                       load.placed]
+                                        for load in loads})
+    if errors:
+        for err in errors:
+            print(err)
+            audit.record("error", message=err)
+        sys.exit("Manifest validation failed with {} error(s), "
+                 "no volumes were created".format(len(errors)))
+
+    busy = [load for load in loads if load.placed]
+    policies = {}
+    for load in busy:
+        try:
+            policies[load.cluster] = batch_policies(load.sfe, load.cluster,
+                                                    load.placed)
+        except ValueError as e:
+            fail("{}, no volumes were created".format(e))
+
+    def create_on(load):
+        result = create_batch(load.sfe, load.placed, workers, load.names,
+                              load.cluster, policies[load.cluster])
+        if result[0] and policies[load.cluster]:
+            qos_catalog.forget(load.cluster)
+        return result
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=len(busy) or 1) as pool:
+        results = list(pool.map(create_on, busy))
+    total = time.time() - start
+    failed = sum(result[0] for result in results)
+    created = len(reqs) - failed
+    print("Fleet: {} created, {} failed on {} clusters in {:.2f}s, "
+          "{:.2f} volumes/second".format(created, failed, len(busy), total,
+                                         created / total if total > 0
+                                         else 0.0))
+    print("Retries: {}".format(retry.snapshot()))
+    if failed:
+        sys.exit(1)
+
+
+def fail(message):
+    """
+    Records the error in the audit log and exits with it
+    """
+    get_log().record("error", message=message)
+    sys.exit(message)
+
+
+def run(args):
+    # Single volume mode still needs the volume arguments
+    if args.m is None:
+        missing = [opt for opt, val in (('-v', args.v), ('-a', args.a),
+                                        ('-s', args.s), ('-e', args.e),
+                                        ('-q', args.q)) if val is None]
+        if missing:
+            sys.exit("the following arguments are required: "
+                     "{}".format(", ".join(missing)))
+    if args.w < 1:
+        sys.exit("-w must be at least 1")
+
+    # Record the submitted info, without the password
+    audit = get_log()
+    audit.record("request", script="allocate_vol_argparse",
+                 args=redact_args(args))
+
+    # Take input and create new vars
+    src_mvip = args.sm
+    src_user = args.su
+    src_pass = args.sp
+    vol_name = args.v
+    vol_acct = args.a
+    vol_size = args.s
+    vol_512e = args.e
+
+    clusters = [mvip.strip() for mvip in src_mvip.split(",") if mvip.strip()]
+    if len(clusters) > 1 and args.m is None:
+        sys.exit("several MVIPs in -sm need a -m manifest")
+    if args.m is not None:
+        # Rows are checked before any connection is made
+        reqs, errors = load_manifest(args.m)
+        if len(clusters) > 1:
+            run_fleet(clusters, src_user, src_pass, reqs, errors, args.w,
+                      args.l)
+            return
+        sfe = sf_session.connect(src_mvip, src_user, src_pass)
+        limiter = limiter_for(src_mvip, max_limit=args.w, rate=args.l)
+        run_batch(ThrottledClient(sfe, limiter), reqs, errors, args.w,
+                  cluster=None if args.F else src_mvip, mvip=src_mvip)
+        return
+
+    # QoS, if requested
+    if args.q == "custom":
+        from solidfire.models import QoS
+        minQoS = args.n
+        maxQoS = args.x
+        burstQoS = args.b
+        qos = QoS(burst_iops=burstQoS,
+                  max_iops=maxQoS,
+                  min_iops=minQoS)
+
+    # A tier must be in the catalog
+    if args.q == "tier" and args.t not in qos_catalog.tiers():
+        fail("-q tier needs -t, one of {}".format(
+            ", ".join(sorted(qos_catalog.tiers()))))
+
+    # Verify all variable inputs are valid and within boundaries
+    if args.q == "custom":
+        problems = check_volume(vol_name, vol_acct, vol_size, vol_512e,
+                                args.n, args.x, args.b)
+    else:
+        problems = check_volume(vol_name, vol_acct, vol_size, vol_512e)
+    if problems:
+        fail("Invalid volume request:\n\t" + "\n\t".join(problems))
 
-def main():
     # Connect to SF cluster
-    sfe = ElementFactory.create(src_mvip, src_user, src_pass)
+    sfe = sf_session.connect(src_mvip, src_user, src_pass)
 
     # Verify account exists
-    check_account = sfe.list_accounts(vol_acct)
-    if len(check_account.accounts) == 0:
-        fh.write("Submitted account ID does not exist")
-        fh.close()
-        sys.exit(1)
+    if not account_exists(sfe, src_mvip, vol_acct):
+        fail("Submitted account ID does not exist")
 
     # Check for duplicate volume name
-    vol_check = sfe.list_volumes()
-    for vol in vol_check.volumes:
-        if vol.name == vol_name:
-            fh.write("duplicate volume name detected, script will exit")
-            fh.close()
-            sys.exit(1)
+    if find_volume(sfe, vol_name) is not None:
+        fail("duplicate volume name detected, script will exit")
 
     # Actually do the work
-    if args.q == "custom":
-        sfe.create_volume(vol_name,
-                          vol_acct,
-                          vol_size,
-                          vol_512e,
-                          qos=qos)
-    elif args.q == "default":
-        sfe.create_volume(vol_name,
-                          vol_acct,
-                          vol_size,
-                          vol_512e)
-    else:
-        fh.write("Unhandled exception has occurred.")
-        fh.close()
-        sys.exit(1)
+    try:
+        if args.q == "custom":
+            result = sfe.create_volume(vol_name,
+                                       vol_acct,
+                                       vol_size,
+                                       vol_512e,
+                                       qos=qos)
+        elif args.q == "default":
+            result = sfe.create_volume(vol_name,
+                                       vol_acct,
+                                       vol_size,
+                                       vol_512e)
+        elif args.q == "tier":
+            try:
+                policy_id = qos_catalog.policy_ids(sfe, src_mvip,
+                                                   [args.t])[args.t]
+            except ValueError as e:
+                fail(str(e))
+            result = sfe.create_volume(vol_name,
+                                       vol_acct,
+                                       vol_size,
+                                       vol_512e,
+                                       qos_policy_id=policy_id)
+        else:
+            fail("Unhandled exception has occurred.")
+    except Exception:
+        # The cached account or policy may have been deleted, look them
+        #   up next run
+        forget(src_mvip)
+        qos_catalog.forget(src_mvip)
+        raise
+    audit.record("result", name=vol_name, volume_id=result.volume_id,
+                 error=None)
+
+
+def main():
+    run(parse_inputs())
 
 if __name__ == "__main__":
     main()
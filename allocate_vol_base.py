@@ -9,6 +9,7 @@
 
 from solidfire.factory import ElementFactory
 from solidfire.models import QoS
+from sf_accounts import resolve_account
 
 def main():
     # Create connection to SF Cluster
@@ -17,12 +18,8 @@ def main():
     # --------- EXAMPLE 1 - Existing ACCOUNT -----------
     # Send the request with required parameters and gather the result
     #	add_account_result = sfe.add_account(username="account1")
-    list_accounts_result = sfe.list_accounts()
-
-    # Pull the account ID from the result object
-    for account in list_accounts_result.accounts:
-        if account.username == 'account1': 
-            vol_acct = account.account_id
+    # Pull the account ID from the local account cache
+    vol_acct = resolve_account(sfe, "sf-mvip", "account1")
 
     # --------- EXAMPLE 2 - CREATE A VOLUME -------------
     # Create a new QoS object for the volume
@@ -9,25 +9,16 @@
 #   by switching from web calls to python CLI parsing
 import sys
 import argparse
-import requests
 import base64
 import json
-import re
-from solidfire.factory import ElementFactory
-# QoS is a dataobject model and must be imported to set QoS
-# it is not required to get/print QoS information
-from solidfire.models import QoS
+# requests is only imported by post_json_rpc() so sf_cli.py and
+#   json_rpc_async.py can use this module without loading it
+from sf_metrics import post_json_rpc
+from rpc_payload import default_encoder
+from vol_validate import (BURST_QOS_RANGE, MAX_QOS_RANGE, MIN_QOS_RANGE,
+                          bounded_int, check_volume, volume_name)
 
-def enforceVolNaming(vol_name):
-    try:
-        return re.match("^[a-zA-Z1-9][a-zA-Z1-9-]{1,63}[a-zA-Z1-9]$", vol_name).group(0)
-    except:
-        raise argparse.ArgumentTypeError("\nString {} does not match required format, ensure there are no special characters,"
-                                         " that it is between 1 and 64 characters in length, and that no '-' exists at the start"
-                                         " or end of the volume".format(vol_name))
-
-def get_inputs():
-    parser = argparse.ArgumentParser()
+def add_arguments(parser):
     parser.add_argument('-sm', type=str,
                         required=True,
                         metavar='mvip',
@@ -40,7 +31,7 @@ def get_inputs():
                         required=True,
                         metavar='password',
                         help='password for user')
-    parser.add_argument('-v', type=enforceVolNaming,
+    parser.add_argument('-v', type=volume_name,
                         required=True,
                         metavar='vol_name',
                         help='volume name')
@@ -57,23 +48,21 @@ def get_inputs():
                         choices=['true', 'false', 'True', 'False'],
                         metavar='vol_512e',
                         help='enable 512 block emulation')
-    parser.add_argument('-n', type=int,
-                        choices=range(50, 15001),
+    parser.add_argument('-n', type=bounded_int(*MIN_QOS_RANGE),
                         required=True,
                         metavar='min_qos',
                         help='minimum QoS, between 50 and 15,000')
-    parser.add_argument('-x', type=int,
-                        choices=range(100, 200001),
+    parser.add_argument('-x', type=bounded_int(*MAX_QOS_RANGE),
                         required=True,
                         metavar='max_qos',
                         help='maximum QoS, between 100, and 15,000')
-    parser.add_argument('-b', type=int,
-                        choices=range(100, 200001),
+    parser.add_argument('-b', type=bounded_int(*BURST_QOS_RANGE),
                         required=True,
                         metavar='burst_qos',
                         help='burst QoS, between max and 200,000')
-    args = parser.parse_args()
 
+
+def split_inputs(args):
     src_mvip = args.sm
     src_user = args.su
     src_pass = args.sp
@@ -86,6 +75,11 @@ def get_inputs():
     burst_qos = args.b
     return src_mvip, src_user, src_pass, vol_name, vol_acct, vol_size, vol_512e, min_qos, max_qos, burst_qos
 
+def get_inputs():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    return split_inputs(parser.parse_args())
+
 def connect_cluster(src_mvip, src_user, src_pass):
     # Web/REST auth credentials build authentication
     auth = (src_user + ":" + src_pass)
@@ -104,55 +98,25 @@ def connect_cluster(src_mvip, src_user, src_pass):
 
 def main(headers, url, vol_name, vol_acct, vol_size, vol_512e, min_qos, max_qos, burst_qos):
     vol_size = vol_size * 1024 * 1024 * 1024
-    if vol_size < 1000000000 or vol_size > 8796093022208:
-        sys.exit("volume size is either less than 1GB or more than 8TiB")
+    problems = check_volume(vol_name, vol_acct, vol_size, vol_512e,
+                            min_qos, max_qos, burst_qos)
+    if problems:
+        sys.exit("Invalid volume request:\n\t" + "\n\t".join(problems))
 
-    if vol_512e != "true" and vol_512e != "false":
-        sys.exit("512 emulation must be either true or false")
+    # The body is encoded straight to bytes, see rpc_payload.py
+    payload = default_encoder.create_volume(vol_name, vol_acct, vol_size,
+                                            vol_512e == "true", min_qos,
+                                            max_qos, burst_qos)
 
-    if max_qos > 15000 or max_qos < 100 or max_qos < min_qos:
-        sys.exit("Maximum QoS is out of bounds, max QoS is valid between 100 and 15000, submitted was %s" % max_qos)
-
-    if min_qos < 50 or min_qos > 15000:
-        sys.exit("Minimum QoS is out of bounds, min QoS must be between 50 and 15000 submitted was %s" % min_qos)
-
-    if burst_qos > 200000 or burst_qos < max_qos:
-        sys.exit("Burst QoS is out of bounds, it must be below 200,000 and equal to or greater than max QoS.\n"
-              "Current QoS is set to %s" % burst_qos)
-        
-    # Various payload params in one liner
-    # payload = "{\r    \"method\": \"CreateVolume\",\r    
-    #               \"params\": {\r        \"name\": \"<Volume Name>\",\r        
-    #               \"accountID\": <Account ID>,\r        \"totalSize\": <Volume Size in Bytes>,\r        
-    #               \"vol_512e\": <Optional Boolean true or false>,\r        \"attributes\": {},\r        
-    #               \"qos\": {\r            \"minIOPS\": <Optional Minimum IOPS>,\r        
-    #               \"maxIOPS\": <Optional Maximum IOPS>,\r            \"burstIOPS\": <Optional Burst IOPS>,\r        
-    #               \"burstTime\": 60\r        }\r    },\r    \"id\": 1\r}"
-    # payload in JSON multi-line
-    payload = "{" + \
-                    "\n  \"method\": \"CreateVolume\"," + \
-                    "\n    \"params\": {" + \
-                    "\n    \t\"name\": \"" + str(vol_name) + "\"," + \
-                    "\n    \t\"accountID\": \"" + str(vol_acct) + "\"," + \
-                    "\n    \t\"totalSize\": " + str(vol_size) + "," + \
-                    "\n    \t\"enable512e\": \"" + str(vol_512e) + "\"," + \
-                    "\n    \t\"attributes\": {}," + \
-                    "\n    \t\"qos\": {" + \
-                    "\n    \t    \"minIOPS\": " + str(min_qos) + "," + \
-                    "\n    \t    \"maxIOPS\": " + str(max_qos) + "," + \
-                    "\n    \t    \"burstIOPS\": " + str(burst_qos) + "," + \
-                    "\n    \t    \"burstTime\": 60" + \
-                    "\n    \t}" +\
-                    "\n    }," + \
-                    "\n    \"id\": 1" + \
-                "\n}"
-
-    response = requests.request("POST", url, data=payload, headers=headers, verify=False)
-
-    raw = json.loads(response.text)
+    raw = post_json_rpc("CreateVolume", url, payload, headers, verify=False)
 
     print(json.dumps(raw, indent=4, sort_keys=True))
 
+def run(args):
+    src_mvip, src_user, src_pass, vol_name, vol_acct, vol_size, vol_512e, min_qos, max_qos, burst_qos = split_inputs(args)
+    headers, url = connect_cluster(src_mvip, src_user, src_pass)
+    main(headers, url, vol_name, vol_acct, vol_size, vol_512e, min_qos, max_qos, burst_qos)
+
 if __name__ == "__main__":
     src_mvip, src_user, src_pass, vol_name, vol_acct, vol_size, vol_512e, min_qos, max_qos, burst_qos = get_inputs()
     headers, url = connect_cluster(src_mvip, src_user, src_pass)
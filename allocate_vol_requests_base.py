@@ -6,13 +6,10 @@
 # This scripts shows how to gather volume information on volumeID 1 using requests and web calls
 # output is in JSON formatted text.  This can be modified to be used in a more iterative fashion 
 #   by switching from web calls to python CLI parsing
-import requests
 import base64
 import json
-from solidfire.factory import ElementFactory
-# QoS is a dataobject model and must be imported to set QoS
-# it is not required to get/print QoS information
-from solidfire.models import QoS
+from sf_metrics import post_json_rpc
+from rpc_payload import default_encoder
 
 def main():
     # Web/REST auth credentials build authentication
@@ -29,36 +26,11 @@ def main():
     # Be certain of your API version path here
     url = "https://sf-mvip/json-rpc/9.0"
 
-    # Various payload params in one liner
-    # payload = "{\r    \"method\": \"CreateVolume\",\r    
-    #               \"params\": {\r        \"name\": \"<Volume Name>\",\r        
-    #               \"accountID\": <Account ID>,\r        \"totalSize\": <Volume Size in Bytes>,\r        
-    #               \"enable512e\": <Optional Boolean true or false>,\r        \"attributes\": {},\r        
-    #               \"qos\": {\r            \"minIOPS\": <Optional Minimum IOPS>,\r        
-    #               \"maxIOPS\": <Optional Maximum IOPS>,\r            \"burstIOPS\": <Optional Burst IOPS>,\r        
-    #               \"burstTime\": 60\r        }\r    },\r    \"id\": 1\r}"
-    # payload in JSON multi-line
-    payload = "{" + \
-                    "\n  \"method\": \"CreateVolume\"," + \
-                    "\n    \"params\": {" + \
-                    "\n    \t\"name\": \"new-volume\"," + \
-                    "\n    \t\"accountID\": 1," + \
-                    "\n    \t\"totalSize\": 1073741824," + \
-                    "\n    \t\"enable512e\": false," + \
-                    "\n    \t\"attributes\": {}," + \
-                    "\n    \t\"qos\": {" + \
-                    "\n    \t    \"minIOPS\": 150," + \
-                    "\n    \t    \"maxIOPS\": 350," + \
-                    "\n    \t    \"burstIOPS\": 550," + \
-                    "\n    \t    \"burstTime\": 60" + \
-                    "\n    \t}" +\
-                    "\n    }," + \
-                    "\n    \"id\": 1" + \
-                "\n}"
+    # The body is encoded straight to bytes, see rpc_payload.py
+    payload = default_encoder.create_volume("new-volume", 1, 1073741824,
+                                            False, 150, 350, 550)
 
-    response = requests.request("POST", url, data=payload, headers=headers, verify=False)
-
-    raw = json.loads(response.text)
+    raw = post_json_rpc("CreateVolume", url, payload, headers, verify=False)
 
     print(json.dumps(raw, indent=4, sort_keys=True))
 
@@ -7,13 +7,10 @@
 # output is in JSON formatted text.  This can be modified to be used in a more iterative fashion 
 #   by switching from web calls to python CLI parsing
 import sys
-import requests
 import base64
 import json
-from solidfire.factory import ElementFactory
-# QoS is a dataobject model and must be imported to set QoS
-# it is not required to get/print QoS information
-from solidfire.models import QoS
+from sf_metrics import post_json_rpc
+from rpc_payload import default_encoder
 
 if len(sys.argv) < 11:
     print("Insufficient arguments entered:\n"
@@ -33,6 +30,12 @@ max_qos = sys.argv[9]
 burst_qos = sys.argv[10]
 
 def main():
+    global vol_acct, vol_size, min_qos, max_qos, burst_qos
+    try:
+        vol_acct = int(vol_acct)
+    except:
+        sys.exit("Account ID is not a number")
+
     try:
         vol_size = int(vol_size)
     except:
@@ -43,13 +46,6 @@ def main():
     if vol_512e != "true" and vol_512e != "false":
         sys.exit("512 emulation must be either true or false")
 
-    try:
-        max_qos = int(max_qos)
-    except:
-        sys.exit("Script exited due to incorrect max QoS information")
-    if max_qos > 15000 or max_qos < 100 or max_qos < min_qos:
-        sys.exit("Maximum QoS is out of bounds, max QoS is valid between 100 and 15000, or less than minimum QoS submitted was %s" % max_qos)
-
     try:
         min_qos = int(min_qos)
     except:
@@ -57,6 +53,13 @@ def main():
     if min_qos < 50 or min_qos > 15000:
         sys.exit("Minimum QoS is out of bounds, min QoS must be between 50 and 15000 submitted was %s" % min_qos)
 
+    try:
+        max_qos = int(max_qos)
+    except:
+        sys.exit("Script exited due to incorrect max QoS information")
+    if max_qos > 15000 or max_qos < 100 or max_qos < min_qos:
+        sys.exit("Maximum QoS is out of bounds, max QoS is valid between 100 and 15000, or less than minimum QoS submitted was %s" % max_qos)
+
     try:
         burst_qos = int(burst_qos)
     except:
@@ -79,36 +82,12 @@ def main():
     # Be certain of your API version path here
     url = "https://" + src_mvip + "/json-rpc/9.0"
 
-    # Various payload params in one liner
-    # payload = "{\r    \"method\": \"CreateVolume\",\r    
-    #               \"params\": {\r        \"name\": \"<Volume Name>\",\r        
-    #               \"accountID\": <Account ID>,\r        \"totalSize\": <Volume Size in Bytes>,\r        
-    #               \"vol_512e\": <Optional Boolean true or false>,\r        \"attributes\": {},\r        
-    #               \"qos\": {\r            \"minIOPS\": <Optional Minimum IOPS>,\r        
-    #               \"maxIOPS\": <Optional Maximum IOPS>,\r            \"burstIOPS\": <Optional Burst IOPS>,\r        
-    #               \"burstTime\": 60\r        }\r    },\r    \"id\": 1\r}"
-    # payload in JSON multi-line
-    payload = "{" + \
-                    "\n  \"method\": \"CreateVolume\"," + \
-                    "\n    \"params\": {" + \
-                    "\n    \t\"name\": \"" + str(vol_name) + "\"," + \
-                    "\n    \t\"accountID\": \"" + str(vol_acct) + "\"," + \
-                    "\n    \t\"totalSize\": " + str(vol_size) + "," + \
-                    "\n    \t\"vol_512e\": \"" + str(vol_512e) + "\"," + \
-                    "\n    \t\"attributes\": {}," + \
-                    "\n    \t\"qos\": {" + \
-                    "\n    \t    \"minIOPS\": " + str(min_qos) + "," + \
-                    "\n    \t    \"maxIOPS\": " + str(max_qos) + "," + \
-                    "\n    \t    \"burstIOPS\": " + str(burst_qos) + "," + \
-                    "\n    \t    \"burstTime\": 60" + \
-                    "\n    \t}" +\
-                    "\n    }," + \
-                    "\n    \"id\": 1" + \
-                "\n}"
-
-    response = requests.request("POST", url, data=payload, headers=headers, verify=False)
+    # The body is encoded straight to bytes, see rpc_payload.py
+    payload = default_encoder.create_volume(vol_name, vol_acct, vol_size,
+                                            vol_512e == "true", min_qos,
+                                            max_qos, burst_qos)
 
-    raw = json.loads(response.text)
+    raw = post_json_rpc("CreateVolume", url, payload, headers, verify=False)
 
     print(json.dumps(raw, indent=4, sort_keys=True))
 
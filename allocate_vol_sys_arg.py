@@ -10,8 +10,9 @@
 # example python allocate_vol_argument.py sf-mvip admin Netapp1! account1 myvol1 1048576000 false 250 750 1000 
 
 import sys
-from solidfire.factory import ElementFactory
 from solidfire.models import QoS
+import sf_session
+from sf_accounts import forget, resolve_account
 
 #Verify inputs using sys
 if len(sys.argv) < 11:
@@ -30,28 +31,32 @@ else:
 
 def main():
     # Create connection to SF Cluster
-    sfe = ElementFactory.create(src_mvip, src_user, src_pass,print_ascii_art=False)
+    sfe = sf_session.connect(src_mvip, src_user, src_pass)
 
     # --------- EXAMPLE 1 - Existing ACCOUNT -----------
     # Send the request with required parameters and gather the result
     #	add_account_result = sfe.add_account(username="account1")
-    list_accounts_result = sfe.list_accounts()
-
-    # Pull the account ID from the result object
-    for account in list_accounts_result.accounts:
-        if account.username == vol_acct: 
-            acc_id = account.account_id
+    # The account ID comes from the local account cache when it can
+    acc_id = resolve_account(sfe, src_mvip, vol_acct)
+    if acc_id is None:
+        sys.exit("Account {} does not exist".format(vol_acct))
 
     # --------- EXAMPLE 2 - CREATE A VOLUME -------------
     # Create a new QoS object for the volume
     qos = QoS(burst_iops=burst_qos, max_iops=max_qos, min_iops=min_qos)
 
     # Send the request with required parameters and gather the result
-    create_volume_result = sfe.create_volume(name=vol_name,
-                                             account_id=acc_id,
-                                             total_size=vol_size,
-                                             enable512e=enable_512e,
-                                             qos=qos)
+    try:
+        create_volume_result = sfe.create_volume(
+            name=vol_name,
+            account_id=acc_id,
+            total_size=int(vol_size),
+            enable512e=vol_512e.lower() == "true",
+            qos=qos)
+    except Exception:
+        # The cached account may have been deleted, look it up next run
+        forget(src_mvip)
+        raise
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,165 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script benchmarks holding a volume inventory in memory
+# A ListVolumes response body of -n volumes in the mock cluster's format,
+#   every fourth one paired, is built first, then held as
+#   dicts      the decoded JSON-RPC records
+#   models     SDK Volume objects, as list_volumes() returns them
+#   records    a vol_inventory Inventory streamed from the body with
+#              rpc_stream, so no dict or model outlives its conversion
+# Memory is what tracemalloc counts as still allocated once each is built,
+#   the body itself not included, then the same filters are timed on the
+#   model list and the inventory
+# usage: python bench_inventory.py [-n count] [-r repeats]
+# example python bench_inventory.py -n 100000
+
+import argparse
+import fnmatch
+import gc
+import json
+import time
+import tracemalloc
+from rpc_stream import iter_records
+from vol_inventory import Inventory
+
+MB = 1024.0 * 1024
+
+
+def volume_dict(i):
+    vol = {"volumeID": i,
+           "name": "tenant{}-vol-{:06d}".format(i % 50, i),
+           "accountID": i % 10 + 1,
+           "totalSize": (1 + i % 8) * 1000000000,
+           "enable512e": i % 2 == 0,
+           "access": "readWrite",
+           "status": "active",
+           "qos": {"minIOPS": 50 * (1 + i % 4), "maxIOPS": 15000,
+                   "burstIOPS": 15000, "burstTime": 60},
+           "qosPolicyID": None,
+           "attributes": {},
+           "createTime": "2016-10-18T12:00:00Z",
+           "volumePairs": []}
+    if i % 4 == 0:
+        vol["volumePairs"].append({"clusterPairID": 1,
+                                   "remoteVolumeID": i,
+                                   "remoteVolumeName": vol["name"],
+                                   "remoteSliceID": i,
+                                   "volumePairUUID": "%032x" % i,
+                                   "remoteReplication": {"mode": "Async",
+                                                         "state": "Active"}})
+    return vol
+
+
+def build_body(count):
+    return json.dumps({"id": 1, "result": {
+        "volumes": [volume_dict(i) for i in range(1, count + 1)]}}).encode()
+
+
+def chunks(body, size=64 * 1024):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def load_dicts(body):
+    return json.loads(body.decode())["result"]["volumes"]
+
+
+def load_models(body):
+    from solidfire.models import Volume
+    return [Volume.extract(raw) for raw in
+            iter_records("ListVolumes", chunks(body), "volumes")]
+
+
+def load_records(body):
+    return Inventory.from_dicts(iter_records("ListVolumes", chunks(body),
+                                             "volumes"))
+
+
+def measure(load, body):
+    """
+    Returns (what load built, MB it holds, seconds it took)
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    held = load(body)
+    elapsed = time.time() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return held, size / MB, elapsed
+
+
+def best_of(repeats, fn):
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        found = fn()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(found)
+
+
+def model_filters(models):
+    return (
+        ("pattern tenant7-*", lambda: [
+            v for v in models if fnmatch.fnmatchcase(v.name, "tenant7-*")]),
+        ("account 3", lambda: [v for v in models if v.account_id == 3]),
+        ("IDs 40000-41000", lambda: [
+            v for v in models if 40000 <= v.volume_id <= 41000]),
+        ("paired", lambda: [v for v in models if v.volume_pairs]),
+    )
+
+
+def inventory_filters(inventory):
+    return (
+        ("pattern tenant7-*", lambda: inventory.filter(pattern="tenant7-*")),
+        ("account 3", lambda: inventory.filter(account=3)),
+        ("IDs 40000-41000", lambda: inventory.filter(ids=(40000, 41000))),
+        ("paired", lambda: inventory.filter(paired=True)),
+    )
+
+
+def get_inputs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=100000,
+                        metavar='count', help='volumes, default 100000')
+    parser.add_argument('-r', type=int, default=3,
+                        metavar='repeats',
+                        help='runs per filter, the best is kept, default 3')
+    return parser.parse_args()
+
+
+def main():
+    args = get_inputs()
+    body = build_body(args.n)
+    print("ListVolumes body of {} volumes: {:.1f}MB".format(args.n,
+                                                           len(body) / MB))
+    print("{:<8} {:>10} {:>12} {:>9}".format("held as", "MB", "bytes/vol",
+                                             "load s"))
+    held = {}
+    for name, load in (("dicts", load_dicts), ("models", load_models),
+                       ("records", load_records)):
+        held[name], size, elapsed = measure(load, body)
+        print("{:<8} {:>10.1f} {:>12.0f} {:>9.2f}".format(
+            name, size, size * MB / args.n, elapsed))
+        if name == "dicts":
+            # Only kept to be measured
+            held[name] = None
+
+    print("{:<18} {:>10} {:>11} {:>8}".format("filter", "models ms",
+                                              "records ms", "matched"))
+    for (label, on_models), (_, on_records) in zip(
+            model_filters(held["models"]), inventory_filters(held["records"])):
+        models_s, matched = best_of(args.r, on_models)
+        records_s, found = best_of(args.r, on_records)
+        if found != matched:
+            raise SystemExit("{}: models matched {}, records {}".format(
+                label, matched, found))
+        print("{:<18} {:>10.1f} {:>11.1f} {:>8}".format(
+            label, models_s * 1000, records_s * 1000, matched))
+
+
+if __name__ == "__main__":
+    main()
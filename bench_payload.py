@@ -0,0 +1,131 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script benchmarks building CreateVolume request bodies
+#   concat   the string concatenation the requests scripts used, with the
+#            body then encoded to bytes as requests does
+#   dumps    json.dumps of a params dict, as json_rpc_async.py used
+#   encoder  PayloadEncoder.create_volume from rpc_payload.py
+# Each way builds -n bodies with and without QoS, the encoder output is
+#   checked to decode to the same request as dumps first
+# usage: python bench_payload.py [-n count] [-r repeats]
+# example python bench_payload.py -n 200000 -r 5
+
+import argparse
+import json
+import time
+from rpc_payload import PayloadEncoder
+
+
+def build_concat(i, qos):
+    # The old body, with accountID and enable512e corrected to unquoted
+    payload = "{" + \
+                    "\n  \"method\": \"CreateVolume\"," + \
+                    "\n    \"params\": {" + \
+                    "\n    \t\"name\": \"" + str("bench-%d" % i) + "\"," + \
+                    "\n    \t\"accountID\": " + str(1) + "," + \
+                    "\n    \t\"totalSize\": " + str(1000000000) + "," + \
+                    "\n    \t\"enable512e\": " + str(False).lower() + "," + \
+                    "\n    \t\"attributes\": {}"
+    if qos:
+        payload = payload + "," + \
+                    "\n    \t\"qos\": {" + \
+                    "\n    \t    \"minIOPS\": " + str(500) + "," + \
+                    "\n    \t    \"maxIOPS\": " + str(1000) + "," + \
+                    "\n    \t    \"burstIOPS\": " + str(2000) + "," + \
+                    "\n    \t    \"burstTime\": 60" + \
+                    "\n    \t}"
+    payload = payload + \
+                    "\n    }," + \
+                    "\n    \"id\": " + str(i) + \
+                "\n}"
+    return payload.encode("utf-8")
+
+
+def build_dumps(i, qos):
+    params = {"name": "bench-%d" % i,
+              "accountID": 1,
+              "totalSize": 1000000000,
+              "enable512e": False,
+              "attributes": {}}
+    if qos:
+        params["qos"] = {"minIOPS": 500,
+                         "maxIOPS": 1000,
+                         "burstIOPS": 2000,
+                         "burstTime": 60}
+    return json.dumps({"method": "CreateVolume",
+                       "params": params,
+                       "id": i}).encode("utf-8")
+
+
+def encoder_builder():
+    encoder = PayloadEncoder()
+
+    def build_encoder(i, qos):
+        if qos:
+            return encoder.create_volume("bench-%d" % i, 1, 1000000000,
+                                         False, 500, 1000, 2000)
+        return encoder.create_volume("bench-%d" % i, 1, 1000000000, False)
+    return build_encoder
+
+
+def check(build_encoder):
+    ids = []
+    for qos in (False, True):
+        got = json.loads(build_encoder(1, qos).decode("utf-8"))
+        want = json.loads(build_dumps(1, qos).decode("utf-8"))
+        # The encoder numbers its own requests
+        ids.append(got.pop("id"))
+        want.pop("id")
+        concat = json.loads(build_concat(1, qos).decode("utf-8"))
+        concat.pop("id")
+        if got != want or concat != want:
+            raise SystemExit("bodies differ with qos={}:\n{}\n{}".format(
+                qos, got, want))
+    if ids != [1, 2]:
+        raise SystemExit("encoder ids {} are not 1, 2".format(ids))
+
+
+def time_builder(build, count, qos, repeats):
+    """
+    Returns the best seconds per body over repeats runs and the body size
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(count):
+            build(i, qos)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / count, len(build(count, qos))
+
+
+def get_inputs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=100000,
+                        metavar='count', help='bodies per run, default 100000')
+    parser.add_argument('-r', type=int, default=3,
+                        metavar='repeats',
+                        help='runs per builder, the best is kept, default 3')
+    return parser.parse_args()
+
+
+def main():
+    args = get_inputs()
+    check(encoder_builder())
+    print("{:<8} {:<5} {:>10} {:>12} {:>7} {:>9}".format(
+        "builder", "qos", "us/body", "bodies/sec", "bytes", "speedup"))
+    for qos in (False, True):
+        baseline = None
+        for name, build in (("concat", build_concat),
+                            ("dumps", build_dumps),
+                            ("encoder", encoder_builder())):
+            per_body, size = time_builder(build, args.n, qos, args.r)
+            baseline = baseline or per_body
+            print("{:<8} {:<5} {:>10.2f} {:>12.0f} {:>7} {:>8.2f}x".format(
+                name, str(qos).lower(), per_body * 1e6, 1 / per_body, size,
+                baseline / per_body))
+
+
+if __name__ == "__main__":
+    main()
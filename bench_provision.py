@@ -0,0 +1,308 @@
+#!/usr/local/bin/python
+# Written for Python 3.7 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script benchmarks the provisioning paths of this repo offline
+# It starts mock_element_server.py clusters in a separate process, so the
+#   server threads do not share the GIL with the paths being measured, and
+#   measures volumes/second and p50/p99 latency per volume for:
+#   single     what one allocate_vol_argparse.py run does per volume: version
+#              probe, account check, duplicate check and create, in series
+#   batch      allocate_vol_argparse.py -m, create_manifest_vol on -w workers
+#   raw        one requests POST of CreateVolume per volume, in series
+#   raw-async  AsyncElementClient from json_rpc_async.py, -w calls in flight
+#   paired     the create_vol_with_pairing_argparse_functions.py pipeline
+# Use -l and -E to add cluster latency and injected xDBVersionMismatch errors
+#   and -o to save the results as JSON to compare runs for regressions
+# batch, raw-async and paired run under an AdaptiveLimiter like the scripts,
+#   -R sets its calls per second ceiling, which is printed and saved with the
+#   results, the scripts default to sf_throttle.DEFAULT_RATE and the
+#   benchmark to no ceiling so the concurrency gain shows
+# usage: python bench_provision.py [-n count] [-w workers] [-l latency_ms] [-E error_rate] [-R rate] [-p path ...] [-o results.json]
+# example python bench_provision.py -n 500 -w 16 -l 5 -p batch raw-async paired
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from mock_element_server import API_VERSION
+
+USER = "admin"
+PASSWORD = "Netapp1!"
+PATHS = ("single", "batch", "raw", "raw-async", "paired")
+# Paths that run under an AdaptiveLimiter and so take -R
+THROTTLED = ("batch", "raw-async", "paired")
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "mock_element_server.py")
+ERROR_METHODS = ["CreateVolume", "ModifyVolume", "StartVolumePairing",
+                 "CompleteVolumePairing"]
+
+
+def sdk_client(base_url):
+    """
+    Element client for a mock cluster, the SDK itself only speaks HTTPS so
+        the dispatcher is pointed at the plain HTTP mock endpoint
+    """
+    from solidfire import Element
+    from solidfire.common import CurlDispatcher
+    # The SDK sets up INFO logging of every request when it is imported
+    logging.getLogger("solidfire.Element").setLevel(logging.WARNING)
+    endpoint = "{}/json-rpc/{}".format(base_url, API_VERSION)
+    host = base_url.split("://", 1)[1]
+    return Element(host, USER, PASSWORD, API_VERSION, False,
+                   dispatcher=CurlDispatcher(endpoint, USER, PASSWORD, False))
+
+
+def start_mocks(names, args, timeout=30):
+    """
+    Runs mock_element_server.py serving a cluster per name in a child
+        process, the clusters pair with each other as they share it
+    Returns (process, [base URL per name]) once every port accepts
+        connections
+    """
+    cmd = [sys.executable, MOCK_SERVER, "-p", "0", "-n"] + list(names) + [
+        "-l", str(args.l), "-j", str(args.j), "-E", str(args.E),
+        "-r", "0", "-M"] + ERROR_METHODS
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            universal_newlines=True)
+    urls = []
+    for name in names:
+        line = proc.stdout.readline()
+        match = re.search(r" at (\S+)/json-rpc/", line)
+        if match is None:
+            proc.kill()
+            sys.exit("mock server for {} did not start".format(name))
+        urls.append(match.group(1))
+    deadline = time.time() + timeout
+    for url in urls:
+        host, port = url.split("://", 1)[1].rsplit(":", 1)
+        while True:
+            try:
+                socket.create_connection((host, int(port)), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline or proc.poll() is not None:
+                    proc.kill()
+                    sys.exit("mock server at {} is not accepting "
+                             "connections".format(url))
+                time.sleep(0.05)
+    return proc, urls
+
+
+def summarize(path, latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    done = len(latencies)
+
+    def pct(p):
+        if not latencies:
+            return None
+        return latencies[min(done - 1, int(p * done))] * 1000
+
+    return {"path": path,
+            "volumes": done,
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "volumes_per_second": round(done / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99)}
+
+
+def bench_single(base_url, count, workers, rate):
+    from vol_listing import find_volume
+    sfe = sdk_client(base_url)
+    latencies, errors = [], 0
+    start = time.time()
+    for i in range(1, count + 1):
+        t = time.time()
+        try:
+            sfe.get_api()
+            sfe.list_accounts(1)
+            name = "bench-single-{}".format(i)
+            if find_volume(sfe, name) is None:
+                sfe.create_volume(name, 1, 1000000000, False)
+            latencies.append(time.time() - t)
+        except Exception:
+            errors += 1
+    return latencies, errors, time.time() - start
+
+
+def bench_batch(base_url, count, workers, rate):
+    from allocate_vol_argparse import create_manifest_vol
+    from sf_throttle import AdaptiveLimiter, ThrottledClient
+    from vol_manifest import VolumeRequest
+    sfe = ThrottledClient(sdk_client(base_url),
+                          AdaptiveLimiter(max_limit=workers, rate=rate))
+    reqs = [VolumeRequest(i, "bench-batch-{}".format(i), 1, 1000000000, False,
+                          500, 1000, 5000) for i in range(1, count + 1)]
+    latencies, errors = [], 0
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            contextlib.redirect_stdout(io.StringIO()):
+        for req, vol_id, err, elapsed in pool.map(
+                lambda req: create_manifest_vol(sfe, req), reqs):
+            if err is None:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+    return latencies, errors, time.time() - start
+
+
+def bench_raw(base_url, count, workers, rate):
+    import requests
+    from allocate_vol_requests_argparse import connect_cluster
+    from rpc_payload import PayloadEncoder
+    headers, _ = connect_cluster("mock", USER, PASSWORD)
+    url = "{}/json-rpc/{}".format(base_url, API_VERSION)
+    encoder = PayloadEncoder()
+    latencies, errors = [], 0
+    start = time.time()
+    for i in range(1, count + 1):
+        payload = encoder.create_volume("bench-raw-{}".format(i), 1,
+                                        1000000000, False)
+        t = time.time()
+        raw = json.loads(requests.request("POST", url, data=payload,
+                                          headers=headers).text)
+        if "error" in raw:
+            errors += 1
+        else:
+            latencies.append(time.time() - t)
+    return latencies, errors, time.time() - start
+
+
+def bench_raw_async(base_url, count, workers, rate):
+    from json_rpc_async import AsyncElementClient
+    from sf_throttle import AdaptiveLimiter
+    latencies = []
+
+    async def one(client, gate, i):
+        # Calls queued behind the first -w are not counted in their latency
+        async with gate:
+            t = time.time()
+            await client.create_volume("bench-async-{}".format(i), 1,
+                                       1000000000, False)
+            latencies.append(time.time() - t)
+
+    async def run():
+        async with AsyncElementClient(
+                "mock", USER, PASSWORD, concurrency=workers,
+                limiter=AdaptiveLimiter(max_limit=workers,
+                                        rate=rate)) as client:
+            client.url = "{}/json-rpc/{}".format(base_url, API_VERSION)
+            gate = asyncio.Semaphore(workers)
+            results = await asyncio.gather(
+                *[one(client, gate, i) for i in range(1, count + 1)],
+                return_exceptions=True)
+        return sum(1 for r in results if isinstance(r, Exception))
+
+    start = time.time()
+    errors = asyncio.run(run())
+    return latencies, errors, time.time() - start
+
+
+def bench_paired(base_url, count, workers, rate, dst_url):
+    import create_vol_with_pairing_argparse_functions as pairing
+    from sf_throttle import AdaptiveLimiter, ThrottledClient
+    pairing.sfe_src = ThrottledClient(
+        sdk_client(base_url), AdaptiveLimiter(max_limit=workers, rate=rate))
+    pairing.sfe_dst = ThrottledClient(
+        sdk_client(dst_url), AdaptiveLimiter(max_limit=workers, rate=rate))
+    latencies, errors = [], 0
+
+    def one(i):
+        t = time.time()
+        pair = pairing.VolumePair("bench-pair-{}".format(i))
+        pairing.provision_pair(pair, 1, 1000000000, False, "Async",
+                               create_pool)
+        return time.time() - t
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers * 2) as create_pool, \
+            ThreadPoolExecutor(max_workers=workers) as pipeline, \
+            contextlib.redirect_stdout(io.StringIO()):
+        futures = [pipeline.submit(one, i) for i in range(1, count + 1)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    return latencies, errors, time.time() - start
+
+
+def get_inputs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=200,
+                        metavar='count', help='volumes per path, default 200')
+    parser.add_argument('-w', type=int, default=8,
+                        metavar='workers',
+                        help='concurrency for the concurrent paths, default 8')
+    parser.add_argument('-l', type=float, default=2.0,
+                        metavar='latency_ms',
+                        help='mock latency per call, default 2')
+    parser.add_argument('-j', type=float, default=0.0,
+                        metavar='jitter_ms', help='mock jitter per call')
+    parser.add_argument('-E', type=float, default=0.0,
+                        metavar='error_rate',
+                        help='share of mutating calls failed with '
+                        'xDBVersionMismatch')
+    parser.add_argument('-R', type=float, default=0.0,
+                        metavar='rate',
+                        help='most API calls per second to each cluster for '
+                        'the {} paths, default 0 for no ceiling'.format(
+                            ", ".join(THROTTLED)))
+    parser.add_argument('-p', type=str, nargs='+', default=list(PATHS),
+                        choices=PATHS, metavar='path',
+                        help='paths to run, default all of {}'.format(
+                            ", ".join(PATHS)))
+    parser.add_argument('-o', type=str, metavar='results.json',
+                        help='write the results to this file as JSON')
+    return parser.parse_args()
+
+
+def main():
+    args = get_inputs()
+    rate = args.R or None
+    mock, (src_url, dst_url) = start_mocks(("bench-src", "bench-dst"), args)
+
+    benches = {"single": bench_single,
+               "batch": bench_batch,
+               "raw": bench_raw,
+               "raw-async": bench_raw_async,
+               "paired": lambda url, n, w, r: bench_paired(url, n, w, r,
+                                                           dst_url)}
+    results = []
+    print("Throttle for {}: {}".format(
+        ", ".join(THROTTLED),
+        "{:g} calls/second per cluster".format(rate) if rate
+        else "no rate ceiling"))
+    print("{:<10} {:>8} {:>7} {:>9} {:>10} {:>9} {:>9}".format(
+        "path", "volumes", "errors", "seconds", "vols/sec", "p50 ms", "p99 ms"))
+    try:
+        for path in args.p:
+            latencies, errors, elapsed = benches[path](src_url, args.n,
+                                                       args.w, rate)
+            result = summarize(path, latencies, errors, elapsed)
+            result["throttle_rate"] = rate if path in THROTTLED else None
+            results.append(result)
+            print("{path:<10} {volumes:>8} {errors:>7} {seconds:>9.2f} "
+                  "{volumes_per_second:>10.1f} {p50:>9} {p99:>9}".format(
+                      p50="{:.1f}".format(result["p50_ms"] or 0),
+                      p99="{:.1f}".format(result["p99_ms"] or 0), **result))
+    finally:
+        mock.terminate()
+        mock.wait()
+    if args.o:
+        with open(args.o, "w") as of:
+            json.dump({"settings": vars(args), "results": results}, of,
+                      indent=2)
+
+
+if __name__ == "__main__":
+    main()
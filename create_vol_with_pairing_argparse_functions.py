@@ -1,67 +1,78 @@
 #!/bin/bash/python
 # create a series of volumes and pair them
 
-from solidfire.factory import ElementFactory
+import os
 import time
 import sys
 import argparse
-import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from repl_watcher import wait_for_replication, print_watch
+from sf_throttle import DEFAULT_RATE, ThrottledClient, limiter_for
+from sf_retry import default_policy as retry
+import sf_session
+from vol_validate import volume_prefix
+from vol_preflight import preflight, print_plan
+from vol_index import VolumeNameIndex
+from vol_journal import Journal, journal_path, replay
 
-def connect_src():
+# Checkpoint journal for the run, opened by run()
+journal = None
+
+def connect_src(argv):
     print("-----Source connect called-----")
-    argv = parse_inputs()
     src_mvip = argv.sm
     src_user = argv.su
     src_pass = argv.sp
 
     global sfe_src
-    sfe_src = ElementFactory.create(src_mvip,
-                                    src_user,
-                                    src_pass,
-                                    print_ascii_art=False)
+    sfe_src = sf_session.connect(src_mvip,
+                                 src_user,
+                                 src_pass)
+    sfe_src = ThrottledClient(sfe_src, limiter_for(src_mvip,
+                                                   max_limit=argv.w,
+                                                   rate=argv.l))
+    return sfe_src
 
-def connect_dst():
+def connect_dst(argv):
     print("-----Destination connect called-----")
-    argv = parse_inputs()
     dst_mvip = argv.dm
     dst_user = argv.du
     dst_pass = argv.dp
 
     global sfe_dst    
-    sfe_dst = ElementFactory.create(dst_mvip,
-                                    dst_user,
-                                    dst_pass,
-                                    print_ascii_art=False)
+    sfe_dst = sf_session.connect(dst_mvip,
+                                 dst_user,
+                                 dst_pass)
+    sfe_dst = ThrottledClient(sfe_dst, limiter_for(dst_mvip,
+                                                   max_limit=argv.w,
+                                                   rate=argv.l))
+    return sfe_dst
 
 
 def create_src_vol(new_vol, vol_acct, vol_size, vol_512e):
     """
     This function creates the source volumes from the arguments supplied
-    outputs src_vol_id for use in pairing functions
+    returns src_vol_id for use in pairing functions
     """
     print("-----Create source vol called-----")
     src_vol = sfe_src.create_volume(new_vol,
                                     account_id=vol_acct,
                                     total_size=vol_size,
                                     enable512e=vol_512e)
-
-    global src_vol_id
-    src_vol_id = src_vol.volume_id
-    
+    return src_vol.volume_id
 
 
 def create_dst_vol(new_vol, vol_acct, vol_size, vol_512e):
     """
     This function creates the destination volumes from the arguments supplied
-    outputs dst_vol_id for use in pairing functions
+    returns dst_vol_id for use in pairing functions
     """
     print("-----Create destination vol called-----")
     dst_vol = sfe_dst.create_volume(new_vol,
                                     account_id=vol_acct,
                                     total_size=vol_size,
                                     enable512e=vol_512e)
-    global dst_vol_id
-    dst_vol_id = dst_vol.volume_id
+    return dst_vol.volume_id
 
 def modify_dest_vol(dst_vol_id):
     """
@@ -76,15 +87,14 @@ def modify_dest_vol(dst_vol_id):
 def start_pair_vols(src_vol_id, vol_repl):
     """
     This function starts the pairing process
-    It configures the source and sets the pairing key to the
-        variable pair_key for use in the complete_pair_vols function
+    It configures the source and returns the pairing key for use
+        in the complete_pair_vols function
     """
     print("-----Create pair vol called-----")
     key = sfe_src.start_volume_pairing(src_vol_id,
                                        mode=vol_repl)
-    global pair_key
-    pair_key = key.volume_pairing_key
-    
+    return key.volume_pairing_key
+
 def complete_pair_vols(pair_key, dst_vol_id):
     """
     This function completes the pairing process
@@ -96,7 +106,7 @@ def complete_pair_vols(pair_key, dst_vol_id):
 
 def remove_vol_pair(src_vol_id):
     """
-    This function is only used in the exception statements
+    This function is only used when retrying pair completion
     When a DBVersion mismatch is detected attempting to re-pair will not work
     Therefore we have to remove the pair on the source and attempt again.
     """
@@ -104,54 +114,143 @@ def remove_vol_pair(src_vol_id):
     sfe_src.remove_volume_pair(src_vol_id)
 
 
-def check_repl_status():
+class VolumePair(object):
     """
-    This function is a debug fucntion that is being used to test timings.  It
-        is designed to watch for new volumes that start as PausedMisconfigured
-        for longer than two minutes on replication initialization.
-        Two minutes is the target as there is a source/target sync
-        state that can take up to 60 seconds per side to stabilize and
-        for transfer operations to start.
+    Per-volume pipeline state, one instance for each volume being paired
     """
-    print("-----Check repl status called-----")
-    vols = sfe_src.list_active_paired_volumes()
-    status = []
-    t = 0
-    bad_state = "PausedMisconfigured"
-    for vol in vols.volumes:
-        for v in vol.volume_pairs:
-            if bad_state in v.remote_replication.state:
-                status.append(v.remote_replication.state)
-                while bad_state in status:
-                    status.clear()
-                    vols = sfe_src.list_active_paired_volumes()
-                    for vol in vols.volumes:
-                        for v in vol.volume_pairs:
-                            if bad_state in v.remote_replication.state:
-                                if bad_state not in status:
-                                    status.append(v.remote_replication.state)
-                                t = t + 1
-                                time.sleep(1)
-                                print(status)
-                min = t // 60
-                sec = t % 60
-                print("{} minutes and {} seconds elapsed, "
-                      "\n\ttotal seconds were {}".format(min, sec, t))
-
-def enforceVolNaming(vol_name):
-    try:
-        return re.match("^[a-zA-Z1-9][a-zA-Z1-9-]{1,62}$", vol_name).group(0)
-    except:
-        raise argparse.ArgumentTypeError("\nVolume {} does not match required"
-                                         " name format, ensure there are "
-                                         "no special characters,"
-                                         " that it is between 1 and 64 "
-                                         "characters in length, and that no "
-                                         "'-' exists at the start"
-                                         " of the volume".format(vol_name,))
 
-def parse_inputs():
-    parser = argparse.ArgumentParser()
+    def __init__(self, name):
+        self.name = name
+        self.src_vol_id = None
+        self.dst_vol_id = None
+        self.pair_key = None
+        self.paired = False
+        self.paired_at = None
+        self.steps = set()
+
+    def checkpoint(self, step, **fields):
+        """
+        Marks a step done and records it in the journal before moving on
+        """
+        self.steps.add(step)
+        if journal is not None:
+            journal.record(self.name, step, **fields)
+
+    def restore(self, state):
+        """
+        Picks up the steps a previous run recorded for this volume
+        """
+        self.steps = set(state.steps)
+        self.src_vol_id = state.fields.get("src_vol_id")
+        self.dst_vol_id = state.fields.get("dst_vol_id")
+        self.pair_key = state.fields.get("pair_key")
+        if "paired" in self.steps:
+            self.paired = True
+            self.paired_at = state.stamps["paired"]
+
+
+def create_vol_pair(pair, vol_acct, vol_size, vol_512e, create_pool):
+    """
+    This function creates the source and destination volumes at the same
+        time and then sets the destination to replicationTarget
+    Steps already in the journal are skipped
+    """
+    src = dst = None
+    if "src_created" not in pair.steps:
+        src = create_pool.submit(retry.call, "CreateVolume", create_src_vol,
+                                 pair.name, vol_acct, vol_size, vol_512e)
+    if "dst_created" not in pair.steps:
+        dst = create_pool.submit(retry.call, "CreateVolume", create_dst_vol,
+                                 pair.name, vol_acct, vol_size, vol_512e)
+    if src is not None:
+        pair.src_vol_id = src.result()
+        pair.checkpoint("src_created", src_vol_id=pair.src_vol_id)
+    if dst is not None:
+        pair.dst_vol_id = dst.result()
+        pair.checkpoint("dst_created", dst_vol_id=pair.dst_vol_id)
+    if "dst_modified" not in pair.steps:
+        retry.call("ModifyVolume", modify_dest_vol, pair.dst_vol_id)
+        pair.checkpoint("dst_modified")
+
+
+def pair_vols(pair, vol_repl):
+    """
+    This function starts and completes pairing for one volume
+    A DBVersionMismatch on completion means the key cannot be re-used, so
+        before each completion retry the pair is removed on the source and
+        a fresh key is issued
+    """
+    if "key_issued" not in pair.steps:
+        pair.pair_key = retry.call("StartVolumePairing", start_pair_vols,
+                                   pair.src_vol_id, vol_repl)
+        pair.checkpoint("key_issued", pair_key=pair.pair_key)
+    print("Volume pairing key is: {}".format(pair.pair_key))
+
+    def reissue_key():
+        retry.call("RemoveVolumePair", remove_vol_pair, pair.src_vol_id)
+        pair.pair_key = retry.call("StartVolumePairing", start_pair_vols,
+                                   pair.src_vol_id, vol_repl)
+        pair.checkpoint("key_issued", pair_key=pair.pair_key)
+
+    retry.call("CompleteVolumePairing",
+               lambda: complete_pair_vols(pair.pair_key, pair.dst_vol_id),
+               before_retry=reissue_key)
+    pair.checkpoint("paired")
+
+
+def provision_pair(pair, vol_acct, vol_size, vol_512e, vol_repl,
+                   create_pool):
+    """
+    This function runs every stage for one volume, several of these run
+        at once so volume i+1 is being created while volume i is pairing
+    """
+    create_vol_pair(pair, vol_acct, vol_size, vol_512e, create_pool)
+    pair_vols(pair, vol_repl)
+    pair.paired = True
+    pair.paired_at = time.time()
+    return pair
+
+
+def recover_pairs(pairs):
+    """
+    This function closes the gaps a crash can leave between an API call
+        succeeding and its step reaching the journal, before resuming
+    """
+    src_index = dst_index = None
+    unkeyed = []
+    for pair in pairs:
+        if "src_created" not in pair.steps:
+            if src_index is None:
+                src_index = VolumeNameIndex(sfe_src)
+                src_index.refresh()
+            if pair.name in src_index:
+                pair.src_vol_id = src_index.get(pair.name)
+                pair.checkpoint("src_created", src_vol_id=pair.src_vol_id)
+        if "dst_created" not in pair.steps:
+            if dst_index is None:
+                dst_index = VolumeNameIndex(sfe_dst)
+                dst_index.refresh()
+            if pair.name in dst_index:
+                pair.dst_vol_id = dst_index.get(pair.name)
+                pair.checkpoint("dst_created", dst_vol_id=pair.dst_vol_id)
+        if "src_created" in pair.steps and "key_issued" not in pair.steps:
+            unkeyed.append(pair.src_vol_id)
+        elif "key_issued" in pair.steps and "paired" not in pair.steps:
+            # The target only lists a pair once completion went through
+            dst = sfe_dst.list_volumes(volume_ids=[pair.dst_vol_id]).volumes
+            if dst and dst[0].volume_pairs:
+                pair.checkpoint("paired")
+                pair.paired = True
+                pair.paired_at = time.time()
+    if unkeyed:
+        # An unrecorded key still leaves the source half paired, the
+        #   cluster rejects unpairing a volume that never was
+        for vol in sfe_src.list_volumes(volume_ids=unkeyed).volumes:
+            if vol.volume_pairs:
+                retry.call("RemoveVolumePair", remove_vol_pair, vol.volume_id)
+
+
+def add_arguments(parser):
     parser.add_argument('-sm', type=str,
                         required=True,
                         metavar='smvip',
@@ -176,7 +275,7 @@ def parse_inputs():
                         required=True,
                         metavar='dpassword',
                         help='Destinationpassword for user')
-    parser.add_argument('-v', type=enforceVolNaming,
+    parser.add_argument('-v', type=volume_prefix,
                         required=True,
                         metavar='volume',
                         help='volume name, no "_", 1 to 64 characters in length')
@@ -202,15 +301,46 @@ def parse_inputs():
                         required=True,
                         metavar='vol count',
                         help='number of volumes to create')
+    parser.add_argument('-w', type=int,
+                        default=4,
+                        required=False,
+                        metavar='in flight',
+                        help='volumes provisioned at the same time, default 4')
+    parser.add_argument('-t', type=int,
+                        default=600,
+                        required=False,
+                        metavar='repl timeout',
+                        help='seconds to wait for replication to start, '
+                        'default 600')
+    parser.add_argument('-l', type=float,
+                        default=DEFAULT_RATE,
+                        required=False,
+                        metavar='rate',
+                        help='most API calls per second to each cluster, '
+                        'default {}'.format(DEFAULT_RATE))
+    parser.add_argument('-F', action='store_true',
+                        help='skip the capacity and QoS preflight')
+    parser.add_argument('-J', type=str,
+                        required=False,
+                        metavar='journal',
+                        help='checkpoint journal file, default one per '
+                        'source, destination and volume name under '
+                        '~/.solidfire_vol_create/journals')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue the run recorded in the journal from '
+                        'the step each volume stopped at')
+
+def parse_inputs():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
     args = parser.parse_args()
     return args
 
-def main():
+def run(argv):
     """
-    This function does the work, creates both sides, pairs the vols and
-        adjusts pairing in the even of a DBVersionMismatch error
+    This function does the work, it runs up to -w volumes through the
+        create/modify/pair pipeline at once
     """
-    argv = parse_inputs()
     rep_mode = argv.r
     vol_count = argv.c
     vol_512e = argv.e
@@ -218,8 +348,8 @@ def main():
     vol_acct = argv.a
     vol_name = argv.v
     
-    sfe_src = connect_src()
-    sfe_dst = connect_dst()
+    sfe_src = connect_src(argv)
+    sfe_dst = connect_dst(argv)
     
     # set replication mode based off of inputs
     if rep_mode == "sync":
@@ -232,64 +362,79 @@ def main():
         sys.exit("Argparse should prevent this from ever being seen"
                  "script will exit with unexpected replication mode submitted")
 
+    pairs = [VolumePair(vol_name + str(i)) for i in range(1, vol_count + 1)]
+    in_flight = max(1, argv.w)
+
+    # Every finished step is journaled so a failed run can be resumed
+    global journal
+    journal_file = argv.J or journal_path("pair", argv.sm, argv.dm, vol_name)
+    states = replay(journal_file)
+    if states and not argv.resume:
+        sys.exit("Journal {} holds an earlier run, continue it with "
+                 "--resume or remove the file".format(journal_file))
+    if argv.resume and not states:
+        sys.exit("Nothing to resume in journal {}".format(journal_file))
+    journal = Journal(journal_file)
+    for pair in pairs:
+        if pair.name in states:
+            pair.restore(states[pair.name])
+    if argv.resume:
+        recover_pairs(pairs)
+        print("-----Resuming, {} of {} volumes already paired-----".format(
+            sum(1 for pair in pairs if pair.paired), len(pairs)))
+
+    # Both sides get the same volumes, so both have to have room for them
+    if not argv.F:
+        plans = [preflight(sfe_src, argv.sm,
+                           [(vol_size, None) for pair in pairs
+                            if "src_created" not in pair.steps]),
+                 preflight(sfe_dst, argv.dm,
+                           [(vol_size, None) for pair in pairs
+                            if "dst_created" not in pair.steps])]
+        for plan in plans:
+            print_plan(plan)
+        if not all(plan.fits for plan in plans):
+            sys.exit("Preflight failed, no volumes were created")
+
     try:
-        i = 1
-        while i < vol_count + 1:
-            new_vol = vol_name + str(i)
-
-            create_src_vol(new_vol, vol_acct, vol_size, vol_512e)
-            create_dst_vol(new_vol, vol_acct, vol_size, vol_512e)
-            modify_dest_vol(dst_vol_id)
-
-            try:
-                start_pair_vols(src_vol_id, vol_repl)
-                print("Volume pairing key is: {}".format(pair_key))
-
-            # Catches exceptions on start pairing process
-            except Exception as e:
-                if "xDBVersionMismatch" in str(e):
-                    while "xDBVersionMismatch" in str(e):
-                        e = ""
-                        print("##########\n"
-                              "DBVersionMismatch encountered, "
-                              "retrying pair start"
-                              "\n##########")
-                        start_pair_vols(src_vol_id, vol_repl)
-
-                else:
-                    print(e)
-                    sys.exit("Unhandled exception, script will exit")
-
-            try:
-                complete_pair_vols(pair_key, dst_vol_id)
-
-            # Catches exceptions in the complete pairing process
-            # We must remove pairing, start pairing and complete pairing
-            #   when this error occurs here as the key cannot be re-used
-            except Exception as e:
-                if "xDBVersionMismatch" in str(e):
-                    while "xDBVersionMismatch" in str(e):
-                        e = ""
-                        print("##########\n"
-                              "DBVersionMismatch encountered, "
-                              "retrying pair completion"
-                              "\n##########")
-                        remove_vol_pair(src_vol_id)
-                        start_pair_vols(src_vol_id, vol_repl)
-                        complete_pair_vols(pair_key, dst_vol_id)
-
-                else:
-                    print(e)
-                    sys.exit("Unhandled exception, script will exit")
-            i = i + 1
+        # Creates run on their own pool so a pipeline worker waiting on
+        #   its source and destination creates can never starve them
+        with ThreadPoolExecutor(max_workers=in_flight * 2) as create_pool, \
+                ThreadPoolExecutor(max_workers=in_flight) as pipeline:
+            futures = [pipeline.submit(provision_pair, pair, vol_acct,
+                                       vol_size, vol_512e, vol_repl,
+                                       create_pool)
+                       for pair in pairs if not pair.paired]
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            # Stop feeding new volumes after the first unhandled failure
+            for future in pending:
+                future.cancel()
+            for future in futures:
+                if future.done() and not future.cancelled():
+                    future.result()
 
     except Exception as e:
         print(e)
+        print("Unhandled exception, no further volumes will be started")
 
     finally:
-        time.sleep(120)
-        check_repl_status()
+        # Only pairs that finished pairing are watched
+        paired = dict((pair.src_vol_id, pair.paired_at)
+                      for pair in pairs if pair.paired)
+        print("-----Waiting for {} pairs to replicate-----".format(len(paired)))
+        print_watch(wait_for_replication(sfe_src, paired, timeout=argv.t,
+                                         started=paired))
+        print("Retries: {}".format(retry.snapshot()))
+        journal.close()
+        if all(pair.paired for pair in pairs):
+            os.remove(journal_file)
+        else:
+            print("Journal kept at {}, rerun with --resume to finish the "
+                  "remaining volumes".format(journal_file))
         print("Script complete")
 
+def main():
+    run(parse_inputs())
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,237 @@
+#!/usr/local/bin/python
+# Written for Python 3.7 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module is an asyncio client for the SolidFire /json-rpc/<version> endpoint
+# It builds the same auth headers and URL as connect_cluster() in
+#   allocate_vol_requests_argparse.py, keeps a pool of keep-alive connections
+#   and lets many API calls run in flight at once up to a concurrency limit
+# Within that limit the per-cluster AdaptiveLimiter from sf_throttle sets how
+#   many calls are actually in flight from observed latency and errors
+# Every call is recorded by method, cluster and outcome in sf_metrics
+# Request bodies are built as bytes by rpc_payload, once per call so a
+#   retried call resends the same body
+# Manifest rows with a tier are created with the tier's qosPolicyID, looked
+#   up by qos_catalog over an SDK connection, so later policy changes
+#   retier them
+# aiohttp is required for this module
+# usage: python json_rpc_async.py -sm <MVIP> -su <USER> -sp <PASSWORD> -m <manifest> [-c <concurrency>]
+# example python json_rpc_async.py -sm sf-mvip -su admin -sp Netapp1! -m tenant1.csv -c 32
+
+import sys
+import time
+import argparse
+import asyncio
+import json
+import aiohttp
+from allocate_vol_requests_argparse import connect_cluster
+from vol_manifest import load_manifest
+from sf_throttle import limiter_for
+from sf_retry import default_policy, error_name
+from sf_metrics import default_metrics
+from rpc_payload import default_encoder
+from rpc_stream import JsonRpcError
+
+
+class AsyncElementClient(object):
+    """
+    Async JSON-RPC client for one cluster, use as an async context manager
+    concurrency caps the calls in flight, pool_size caps open connections
+        and defaults to the concurrency limit so every call can reuse one
+    limiter defaults to the shared limiter for mvip from sf_throttle
+    retry defaults to the process wide RetryPolicy from sf_retry
+    """
+
+    def __init__(self, mvip, user, password, concurrency=16, pool_size=None,
+                 timeout=300, limiter=None, retry=None):
+        self.headers, self.url = connect_cluster(mvip, user, password)
+        self.limiter = limiter or limiter_for(mvip, max_limit=concurrency)
+        self.retry = retry or default_policy
+        self.metrics = default_metrics
+        self.cluster = mvip
+        self.concurrency = concurrency
+        self.pool_size = pool_size or concurrency
+        self.timeout = timeout
+        self.encoder = default_encoder
+        self._sem = None
+        self._session = None
+
+    async def __aenter__(self):
+        self._sem = asyncio.Semaphore(self.concurrency)
+        # ssl=False matches verify=False in the requests based scripts
+        connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=False,
+                                         keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector, headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def call(self, method, params=None):
+        """
+        Sends one JSON-RPC call and returns its result dict, retrying as
+            the retry policy allows for method
+        Raises JsonRpcError if the cluster returns an error object
+        """
+        return await self.send(method, self.encoder.encode(method, params))
+
+    async def send(self, method, payload):
+        """
+        Sends a body already encoded by rpc_payload, as call() does
+        """
+        return await self.retry.call_async(method, self._send, method,
+                                           payload)
+
+    async def _send(self, method, payload):
+        response_bytes = 0
+        async with self._sem:
+            started = await self.limiter.acquire_async()
+            try:
+                async with self._session.post(self.url, data=payload) as response:
+                    body = await response.read()
+                response_bytes = len(body)
+                raw = json.loads(body.decode("utf-8"))
+                if "error" in raw:
+                    raise JsonRpcError(method, raw["error"])
+            except Exception as e:
+                self.limiter.release(started, e)
+                self.metrics.observe(method, self.cluster,
+                                     time.time() - started, len(payload),
+                                     response_bytes, error_name(e))
+                raise
+            self.limiter.release(started)
+            self.metrics.observe(method, self.cluster, time.time() - started,
+                                 len(payload), response_bytes)
+        return raw["result"]
+
+    async def call_many(self, calls):
+        """
+        Runs a list of (method, params) calls concurrently
+        Returns results in the same order, failed calls return their exception
+        """
+        return await asyncio.gather(*[self.call(method, params)
+                                      for method, params in calls],
+                                    return_exceptions=True)
+
+    async def create_volume(self, name, account_id, total_size, enable512e,
+                            min_iops=None, max_iops=None, burst_iops=None,
+                            qos_policy_id=None):
+        return await self.send("CreateVolume", self.encoder.create_volume(
+            name, account_id, total_size, enable512e, min_iops, max_iops,
+            burst_iops, qos_policy_id=qos_policy_id))
+
+    async def list_volumes(self, **params):
+        return await self.call("ListVolumes", params)
+
+
+def get_inputs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-sm', type=str,
+                        required=True,
+                        metavar='mvip',
+                        help='MVIP/node name or IP')
+    parser.add_argument('-su', type=str,
+                        required=True,
+                        metavar='username',
+                        help='username to connect with')
+    parser.add_argument('-sp', type=str,
+                        required=True,
+                        metavar='password',
+                        help='password for user')
+    parser.add_argument('-m', type=str,
+                        required=True,
+                        metavar='manifest',
+                        help='CSV or JSONL volume manifest')
+    parser.add_argument('-c', type=int,
+                        default=16,
+                        metavar='concurrency',
+                        help='API calls in flight at once, default 16')
+    return parser.parse_args()
+
+
+def manifest_policies(mvip, user, password, reqs):
+    """
+    Returns the QoS policy IDs of the tiers used by reqs on the cluster,
+        creating any policy that is missing
+    qos_catalog works through the SDK, so it is only loaded and connected
+        when a row has a tier
+    Raises ValueError if an existing policy differs from the catalog
+    """
+    names = set(req.tier for req in reqs if req.tier is not None)
+    if not names:
+        return {}
+    import qos_catalog
+    import sf_session
+    sfe = sf_session.connect(mvip, user, password)
+    return qos_catalog.policy_ids(sfe, mvip, names)
+
+
+def create_request(client, req, policies):
+    """
+    The create_volume() call for one manifest row, a row with a tier is
+        created on the tier's QoS policy rather than with its IOPS
+    """
+    if req.tier is not None:
+        return client.create_volume(req.name, req.account, req.size,
+                                    req.enable512e,
+                                    qos_policy_id=policies[req.tier])
+    return client.create_volume(req.name, req.account, req.size,
+                                req.enable512e, req.min_iops, req.max_iops,
+                                req.burst_iops)
+
+
+async def create_manifest(client, reqs, policies=None):
+    """
+    Creates every manifest volume concurrently and prints per-row results
+    policies maps the tier names in reqs to QoS policy IDs
+    Returns the number of failed rows
+    """
+    results = await asyncio.gather(
+        *[create_request(client, req, policies) for req in reqs],
+        return_exceptions=True)
+    failed = 0
+    for req, result in zip(reqs, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print("line {}: FAILED {}: {}".format(req.line, req.name, result))
+        else:
+            print("line {}: created {} as volume ID {}".format(
+                req.line, req.name, result["volumeID"]))
+    return failed
+
+
+def main():
+    args = get_inputs()
+    reqs, errors = load_manifest(args.m)
+    if errors:
+        for err in errors:
+            print(err)
+        sys.exit("Manifest validation failed with {} error(s), "
+                 "no volumes were created".format(len(errors)))
+    try:
+        policies = manifest_policies(args.sm, args.su, args.sp, reqs)
+    except ValueError as e:
+        sys.exit("{}, no volumes were created".format(e))
+
+    async def run():
+        async with AsyncElementClient(args.sm, args.su, args.sp,
+                                      concurrency=args.c) as client:
+            return await create_manifest(client, reqs, policies)
+
+    start = time.time()
+    failed = asyncio.run(run())
+    if failed and policies:
+        # A cached policy may have been deleted, look it up next run
+        import qos_catalog
+        qos_catalog.forget(args.sm)
+    total = time.time() - start
+    created = len(reqs) - failed
+    print("{} created, {} failed in {:.2f}s, {:.2f} volumes/second".format(
+        created, failed, total, created / total if total > 0 else 0.0))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script dumps a cluster inventory using requests and web calls
+# The response is read with rpc_stream, one record at a time, so even a
+#   cluster with tens of thousands of volumes never has its whole listing
+#   in memory
+# -j writes each record as one line of JSON straight from the response,
+#   otherwise each record is printed indented as the other requests scripts do
+# usage: python list_vol_requests_argparse.py -sm <MVIP> -su <USER> -sp <PASSWORD> [-M method] [-j] [-o file]
+# example python list_vol_requests_argparse.py -sm sf-mvip -su admin -sp Netapp1! -M ListVolumes -j -o volumes.jsonl
+
+import sys
+import argparse
+import json
+# requests is only imported by stream_json_rpc() so sf_cli.py can build
+#   this parser without loading it
+from allocate_vol_requests_argparse import connect_cluster
+from rpc_payload import default_encoder
+from rpc_stream import RECORD_KEYS, JsonRpcError, stream_json_rpc, write_jsonl
+
+
+def add_arguments(parser):
+    parser.add_argument('-sm', type=str,
+                        required=True,
+                        metavar='mvip',
+                        help='MVIP/node name or IP')
+    parser.add_argument('-su', type=str,
+                        required=True,
+                        metavar='username',
+                        help='username to connect with')
+    parser.add_argument('-sp', type=str,
+                        required=True,
+                        metavar='password',
+                        help='password for user')
+    parser.add_argument('-M', type=str,
+                        default='ListVolumes',
+                        choices=sorted(RECORD_KEYS),
+                        metavar='method',
+                        help='list method to call, one of {}, default '
+                        'ListVolumes'.format(", ".join(sorted(RECORD_KEYS))))
+    parser.add_argument('-j', action='store_true',
+                        help='write one JSON record per line as received')
+    parser.add_argument('-o', type=str,
+                        required=False,
+                        metavar='file',
+                        help='write the records to this file, default stdout')
+
+
+def dump(records, out, jsonl):
+    """
+    Writes records to out, returns how many were written
+    """
+    if jsonl:
+        return write_jsonl(records, out)
+    written = 0
+    for record in records:
+        out.write(json.dumps(record, indent=4, sort_keys=True))
+        out.write("\n")
+        written += 1
+    return written
+
+
+def run(args):
+    headers, url = connect_cluster(args.sm, args.su, args.sp)
+    records = stream_json_rpc(args.M, url, default_encoder.encode(args.M),
+                              headers, raw=args.j, verify=False)
+    out = sys.stdout if args.o is None else open(args.o, "w")
+    try:
+        written = dump(records, out, args.j)
+    except JsonRpcError as e:
+        sys.exit(str(e))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.o is not None:
+        print("{} records written to {}".format(written, args.o))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
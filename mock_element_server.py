@@ -0,0 +1,509 @@
+#!/usr/local/bin/python
+# Written for Python 3.7 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script is a local stand-in for the SolidFire Element JSON-RPC API
+# It keeps volumes, accounts and volume pairs in memory and answers
+#   POST /json-rpc/<version> for the methods the scripts in this repo use:
+#   GetAPI, CreateVolume, ListVolumes, ListAccounts, ModifyVolume,
+#   ModifyVolumes, StartVolumePairing, CompleteVolumePairing, RemoveVolumePair,
+#   ListActivePairedVolumes, GetClusterCapacity, CreateQoSPolicy,
+#   ListQoSPolicies, ModifyQoSPolicy, DeleteVolumes, ListDeletedVolumes
+#   and PurgeDeletedVolumes
+# Every call can be delayed by a fixed latency plus jitter, and a share of
+#   calls can be failed with an injected error such as xDBVersionMismatch
+# Several servers in one process pair with each other, a new pair reports
+#   PausedMisconfigured for -r seconds and Active after that, give -n more
+#   than one name to serve a cluster for each from this process
+# Serves plain HTTP unless -c/-k give a certificate and key for HTTPS
+# usage: python mock_element_server.py [-p port] [-n name ...] [-l latency_ms] [-j jitter_ms] [-E error_rate] [-N error_name]
+# example python mock_element_server.py -p 8443 -l 20 -E 0.05 -N xDBVersionMismatch
+
+import argparse
+import base64
+import json
+import random
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_VERSION = "12.3"
+SUPPORTED_VERSIONS = ["7.0", "8.0", "9.0", "10.0", "11.0", "12.0", "12.3"]
+DEFAULT_QOS = {"minIOPS": 50, "maxIOPS": 15000, "burstIOPS": 15000,
+               "burstTime": 60}
+
+# Clusters started in this process by name, so pairing keys can be completed
+#   across them, and one lock for all of them so pairing never deadlocks
+_clusters = {}
+_state_lock = threading.Lock()
+
+
+class MockApiError(Exception):
+    def __init__(self, name, message, code=500):
+        Exception.__init__(self, message)
+        self.name = name
+        self.code = code
+
+
+def _require_int(params, key, required=True):
+    value = params.get(key)
+    if value is None and not required:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise MockApiError("xInvalidParameter",
+                           "Invalid parameter {}: {!r}".format(key, value))
+    return value
+
+
+def _page(records, params):
+    start = params.get("startVolumeID", 0) or 0
+    limit = params.get("limit")
+    out = [r for r in records if r["volumeID"] >= start]
+    return out[:limit] if limit is not None else out
+
+
+class MockCluster(object):
+    """
+    In-memory state of one cluster, method handlers take and return the
+        JSON-RPC params and result dicts
+    """
+
+    def __init__(self, name="mock-cluster", accounts=10, latency=0.0,
+                 jitter=0.0, error_rate=0.0, error_name="xDBVersionMismatch",
+                 error_methods=None, repl_converge=5.0,
+                 max_provisioned_space=100 * 2 ** 40, max_iops=200000):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_name = error_name
+        self.error_methods = set(error_methods or [])
+        self.repl_converge = repl_converge
+        self.max_provisioned_space = max_provisioned_space
+        self.max_iops = max_iops
+        self.volumes = {}
+        self.deleted = {}
+        self.accounts = dict((i, {"accountID": i,
+                                  "username": "account{}".format(i),
+                                  "status": "active",
+                                  "initiatorSecret": "mockinitsecret{}".format(i),
+                                  "targetSecret": "mocktargetsecret{}".format(i),
+                                  "attributes": {},
+                                  "volumes": []})
+                             for i in range(1, accounts + 1))
+        self.qos_policies = {}
+        self.calls = {}
+        self._next_id = 1
+        self._next_policy_id = 1
+        self._lock = _state_lock
+        _clusters[name] = self
+
+    def handle(self, method, params):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        handler = getattr(self, "api_" + method, None)
+        if handler is None:
+            raise MockApiError("xUnknownAPIMethod",
+                               "Unknown method {}".format(method))
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if (self.error_rate and (not self.error_methods or
+                                     method in self.error_methods) and
+                    method != "GetAPI" and random.random() < self.error_rate):
+                raise MockApiError(self.error_name,
+                                   "Injected {}".format(self.error_name))
+            return handler(params)
+
+    def _volume(self, params, key="volumeID"):
+        vol_id = _require_int(params, key)
+        if vol_id not in self.volumes:
+            raise MockApiError("xVolumeIDDoesNotExist",
+                               "VolumeID {} does not exist.".format(vol_id))
+        return self.volumes[vol_id]
+
+    def _pair_state(self, pair):
+        if pair.get("pairedAt") is None:
+            return "PausedMisconfigured"
+        if time.time() - pair["pairedAt"] < self.repl_converge:
+            return "PausedMisconfigured"
+        return "Active"
+
+    def _render(self, vol):
+        out = dict(vol)
+        out["volumePairs"] = []
+        for pair in vol["volumePairs"]:
+            pair = dict(pair)
+            pair["remoteReplication"] = {"mode": pair.pop("mode"),
+                                         "state": self._pair_state(pair)}
+            pair.pop("pairedAt", None)
+            out["volumePairs"].append(pair)
+        return out
+
+    def api_GetAPI(self, params):
+        return {"currentVersion": API_VERSION,
+                "supportedVersions": SUPPORTED_VERSIONS}
+
+    def api_ListAccounts(self, params):
+        start = params.get("startAccountID", 0) or 0
+        limit = params.get("limit")
+        accts = [a for i, a in sorted(self.accounts.items()) if i >= start]
+        return {"accounts": accts[:limit] if limit is not None else accts}
+
+    def api_CreateVolume(self, params):
+        name = params.get("name")
+        if not isinstance(name, str) or not name:
+            raise MockApiError("xInvalidParameter", "Invalid volume name")
+        account_id = _require_int(params, "accountID")
+        total_size = _require_int(params, "totalSize")
+        enable512e = params.get("enable512e", False)
+        if not isinstance(enable512e, bool):
+            raise MockApiError("xInvalidParameter",
+                               "Invalid parameter enable512e: {!r}".format(
+                                   enable512e))
+        if account_id not in self.accounts:
+            raise MockApiError("xAccountIDDoesNotExist",
+                               "AccountID {} does not exist.".format(account_id))
+        qos = dict(DEFAULT_QOS)
+        policy_id = params.get("qosPolicyID")
+        if policy_id is not None:
+            qos.update(self._policy({"qosPolicyID": policy_id})["qos"])
+            qos.pop("curve", None)
+        else:
+            qos.update(params.get("qos") or {})
+        vol_id = self._next_id
+        self._next_id += 1
+        vol = {"volumeID": vol_id,
+               "name": name,
+               "accountID": account_id,
+               "totalSize": total_size,
+               "enable512e": enable512e,
+               "access": params.get("access", "readWrite"),
+               "status": "active",
+               "qos": qos,
+               "qosPolicyID": policy_id,
+               "attributes": params.get("attributes") or {},
+               "createTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+               "volumePairs": []}
+        self.volumes[vol_id] = vol
+        self.accounts[account_id]["volumes"].append(vol_id)
+        if policy_id is not None:
+            self.qos_policies[policy_id]["volumeIDs"].append(vol_id)
+        return {"volumeID": vol_id, "volume": self._render(vol)}
+
+    def api_ListVolumes(self, params):
+        vols = [v for _, v in sorted(self.volumes.items())]
+        if params.get("volumeIDs"):
+            wanted = set(params["volumeIDs"])
+            vols = [v for v in vols if v["volumeID"] in wanted]
+        if params.get("accounts"):
+            wanted = set(params["accounts"])
+            vols = [v for v in vols if v["accountID"] in wanted]
+        return {"volumes": [self._render(v) for v in _page(vols, params)]}
+
+    def api_ModifyVolume(self, params):
+        vol = self._volume(params)
+        if "access" in params:
+            vol["access"] = params["access"]
+        if "qos" in params:
+            vol["qos"].update(params["qos"])
+            # Inline QoS takes a volume off its QoS policy
+            if vol.get("qosPolicyID") is not None:
+                self.qos_policies[vol["qosPolicyID"]]["volumeIDs"].remove(
+                    vol["volumeID"])
+                vol["qosPolicyID"] = None
+        if "totalSize" in params:
+            vol["totalSize"] = _require_int(params, "totalSize")
+        if "accountID" in params:
+            vol["accountID"] = _require_int(params, "accountID")
+        return {"volume": self._render(vol)}
+
+    def api_ModifyVolumes(self, params):
+        vol_ids = params.get("volumeIDs")
+        if not isinstance(vol_ids, list) or not vol_ids:
+            raise MockApiError("xInvalidParameter", "volumeIDs is required")
+        # Nothing is changed unless every volume exists
+        vols = [self._volume({"volumeID": vol_id}) for vol_id in vol_ids]
+        for vol in vols:
+            self.api_ModifyVolume(dict(params, volumeID=vol["volumeID"]))
+        return {"volumes": [self._render(vol) for vol in vols]}
+
+    def _policy(self, params):
+        policy_id = _require_int(params, "qosPolicyID")
+        if policy_id not in self.qos_policies:
+            raise MockApiError("xQoSPolicyDoesNotExist",
+                               "QoSPolicyID {} does not exist.".format(
+                                   policy_id))
+        return self.qos_policies[policy_id]
+
+    def api_CreateQoSPolicy(self, params):
+        name = params.get("name")
+        if not isinstance(name, str) or not name:
+            raise MockApiError("xInvalidParameter", "Invalid policy name")
+        if any(p["name"] == name for p in self.qos_policies.values()):
+            raise MockApiError("xDuplicateQoSPolicyName",
+                               "QoS policy {} already exists.".format(name))
+        qos = dict(DEFAULT_QOS, curve={})
+        qos.update(params.get("qos") or {})
+        policy_id = self._next_policy_id
+        self._next_policy_id += 1
+        policy = {"qosPolicyID": policy_id, "name": name, "qos": qos,
+                  "volumeIDs": []}
+        self.qos_policies[policy_id] = policy
+        return {"qosPolicy": policy}
+
+    def api_ListQoSPolicies(self, params):
+        return {"qosPolicies": [p for _, p in
+                                sorted(self.qos_policies.items())]}
+
+    def api_ModifyQoSPolicy(self, params):
+        policy = self._policy(params)
+        if params.get("name"):
+            policy["name"] = params["name"]
+        if params.get("qos"):
+            policy["qos"].update(params["qos"])
+            # Volumes on the policy follow it
+            for vol_id in policy["volumeIDs"]:
+                if vol_id in self.volumes:
+                    self.volumes[vol_id]["qos"].update(
+                        (k, v) for k, v in policy["qos"].items()
+                        if k != "curve")
+        return {"qosPolicy": policy}
+
+    def api_StartVolumePairing(self, params):
+        vol = self._volume(params)
+        if vol["volumePairs"]:
+            raise MockApiError("xVolumeAlreadyPaired",
+                               "Volume {} is already paired".format(
+                                   vol["volumeID"]))
+        mode = params.get("mode", "Async")
+        vol["volumePairs"].append({"clusterPairID": 1,
+                                   "remoteVolumeID": 0,
+                                   "remoteVolumeName": "",
+                                   "mode": mode,
+                                   "pairedAt": None})
+        key = {"cluster": self.name, "volumeID": vol["volumeID"],
+               "mode": mode, "nonce": random.random()}
+        return {"volumePairingKey": base64.b64encode(
+            json.dumps(key).encode("utf-8")).decode("ascii")}
+
+    def api_CompleteVolumePairing(self, params):
+        vol = self._volume(params)
+        if vol["access"] != "replicationTarget":
+            raise MockApiError("xVolumeAccessNotReplicationTarget",
+                               "Volume {} is not a replicationTarget".format(
+                                   vol["volumeID"]))
+        try:
+            key = json.loads(base64.b64decode(params["volumePairingKey"]))
+        except (KeyError, ValueError, TypeError):
+            raise MockApiError("xInvalidPairingKey", "Invalid pairing key")
+        now = time.time()
+        vol["volumePairs"] = [{"clusterPairID": 1,
+                               "remoteVolumeID": key["volumeID"],
+                               "remoteVolumeName": "",
+                               "mode": key["mode"],
+                               "pairedAt": now}]
+        source = _clusters.get(key["cluster"])
+        if source is not None and source is not self:
+            src_vol = source.volumes.get(key["volumeID"])
+            if src_vol is not None and src_vol["volumePairs"]:
+                src_vol["volumePairs"][0]["remoteVolumeID"] = vol["volumeID"]
+                src_vol["volumePairs"][0]["remoteVolumeName"] = vol["name"]
+                src_vol["volumePairs"][0]["pairedAt"] = now
+        return {}
+
+    def api_GetVolumeStats(self, params):
+        vol = self._volume(params)
+        # The mock stores no data, nonZeroBlocks can be set on a volume
+        return {"volumeStats": {"volumeID": vol["volumeID"],
+                                "accountID": vol["accountID"],
+                                "volumeSize": vol["totalSize"],
+                                "nonZeroBlocks": vol.get("nonZeroBlocks", 0),
+                                "readBytes": 0, "readOps": 0,
+                                "writeBytes": 0, "writeOps": 0,
+                                "unalignedReads": 0, "unalignedWrites": 0,
+                                "volumeAccessGroups": [],
+                                "timestamp": time.strftime(
+                                    "%Y-%m-%dT%H:%M:%SZ", time.gmtime())}}
+
+    def api_RemoveVolumePair(self, params):
+        vol = self._volume(params)
+        if not vol["volumePairs"]:
+            raise MockApiError("xVolumePairDoesNotExist",
+                               "VolumeID {} is not paired.".format(
+                                   vol["volumeID"]))
+        vol["volumePairs"] = []
+        return {}
+
+    def _volume_ids(self, params, volumes):
+        vol_ids = params.get("volumeIDs")
+        if not isinstance(vol_ids, list) or not vol_ids:
+            raise MockApiError("xInvalidParameter", "volumeIDs is required")
+        for vol_id in vol_ids:
+            if vol_id not in volumes:
+                raise MockApiError("xVolumeIDDoesNotExist",
+                                   "VolumeID {} does not exist.".format(vol_id))
+        return vol_ids
+
+    def api_DeleteVolumes(self, params):
+        vol_ids = self._volume_ids(params, self.volumes)
+        for vol_id in vol_ids:
+            if self.volumes[vol_id]["volumePairs"]:
+                raise MockApiError("xInvalidParameter",
+                                   "VolumeID {} is paired, remove the pair "
+                                   "first.".format(vol_id))
+        for vol_id in vol_ids:
+            vol = self.volumes.pop(vol_id)
+            vol["status"] = "deleted"
+            vol["deleteTime"] = time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                                              time.gmtime())
+            self.deleted[vol_id] = vol
+            self.accounts[vol["accountID"]]["volumes"].remove(vol_id)
+        return {"volumes": [self._render(self.deleted[vol_id])
+                            for vol_id in vol_ids]}
+
+    def api_ListDeletedVolumes(self, params):
+        return {"volumes": [self._render(v) for _, v in
+                            sorted(self.deleted.items())]}
+
+    def api_PurgeDeletedVolumes(self, params):
+        for vol_id in self._volume_ids(params, self.deleted):
+            del self.deleted[vol_id]
+        return {}
+
+    def api_GetClusterCapacity(self, params):
+        # Volumes are treated as 10% written at 2x dedup and 2x compression
+        provisioned = sum(v["totalSize"] for v in self.volumes.values())
+        non_zero = provisioned // 10 // 4096
+        unique = non_zero // 2
+        used = int(unique * 4096 / (2 * 0.93))
+        return {"clusterCapacity": {
+            "maxProvisionedSpace": self.max_provisioned_space,
+            "provisionedSpace": provisioned,
+            "maxUsedSpace": self.max_provisioned_space // 4,
+            "usedSpace": used,
+            "nonZeroBlocks": non_zero,
+            "zeroBlocks": provisioned // 4096 - non_zero,
+            "snapshotNonZeroBlocks": 0,
+            "uniqueBlocks": unique,
+            "uniqueBlocksUsedSpace": used,
+            "maxIOPS": self.max_iops,
+            "currentIOPS": 0,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}}
+
+    def api_ListActivePairedVolumes(self, params):
+        vols = [v for _, v in sorted(self.volumes.items()) if v["volumePairs"]]
+        return {"volumes": [self._render(v) for v in _page(vols, params)]}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes, with Nagle on the body
+    #   waits for a delayed ACK of the headers, about 40ms per call on a
+    #   client that does not ACK at once
+    disable_nagle_algorithm = True
+    cluster = None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        req_id = None
+        try:
+            request = json.loads(self.rfile.read(length))
+            req_id = request.get("id")
+            result = self.cluster.handle(request["method"],
+                                         request.get("params") or {})
+            body = {"id": req_id, "result": result}
+        except MockApiError as e:
+            body = {"id": req_id, "error": {"name": e.name, "code": e.code,
+                                            "message": str(e)}}
+        except (ValueError, KeyError) as e:
+            body = {"id": req_id, "error": {"name": "xInvalidRequest",
+                                            "code": 400, "message": str(e)}}
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(cluster, host="127.0.0.1", port=0, certfile=None,
+                 keyfile=None):
+    """
+    Serves cluster from a background thread
+    Returns (server, base URL), port 0 picks a free port
+    """
+    handler = type("Handler", (MockHandler,), {"cluster": cluster})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, "{}://{}:{}".format(scheme, host, server.server_address[1])
+
+
+def get_inputs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-H', type=str, default='127.0.0.1',
+                        metavar='host', help='address to listen on')
+    parser.add_argument('-p', type=int, default=8443,
+                        metavar='port',
+                        help='port to listen on, 0 picks a free one, '
+                        'default 8443')
+    parser.add_argument('-n', type=str, nargs='+', default=['mock-cluster'],
+                        metavar='name',
+                        help='cluster names, each served on the next port')
+    parser.add_argument('-a', type=int, default=10,
+                        metavar='accounts', help='accounts to create, IDs 1..a')
+    parser.add_argument('-l', type=float, default=0.0,
+                        metavar='latency_ms', help='latency added to every call')
+    parser.add_argument('-j', type=float, default=0.0,
+                        metavar='jitter_ms', help='random extra latency, up to')
+    parser.add_argument('-E', type=float, default=0.0,
+                        metavar='error_rate', help='share of calls to fail, 0-1')
+    parser.add_argument('-N', type=str, default='xDBVersionMismatch',
+                        metavar='error_name', help='name of the injected error')
+    parser.add_argument('-M', type=str, nargs='*',
+                        metavar='method', help='only inject errors into these')
+    parser.add_argument('-r', type=float, default=5.0,
+                        metavar='seconds',
+                        help='seconds a new pair stays PausedMisconfigured')
+    parser.add_argument('-c', type=str, metavar='certfile',
+                        help='certificate for HTTPS')
+    parser.add_argument('-k', type=str, metavar='keyfile',
+                        help='private key for HTTPS')
+    return parser.parse_args()
+
+
+def main():
+    args = get_inputs()
+    servers = []
+    for i, name in enumerate(args.n):
+        cluster = MockCluster(name, accounts=args.a, latency=args.l / 1000.0,
+                              jitter=args.j / 1000.0, error_rate=args.E,
+                              error_name=args.N, error_methods=args.M,
+                              repl_converge=args.r)
+        server, url = start_server(cluster, args.H, args.p and args.p + i,
+                                   args.c, args.k)
+        servers.append(server)
+        # Flushed so a parent process reading the pipe learns the URL at once
+        print("Serving {} at {}/json-rpc/{}".format(name, url, API_VERSION),
+              flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script keeps named QoS tiers as QoS policies on a cluster
+# The tiers (gold, silver, bronze unless a catalog file says otherwise) are
+#   read from TIERS_PATH, the SF_QOS_TIERS environment variable, default
+#   ~/.solidfire_vol_create/qos_tiers.json, a JSON object of
+#   {"tier": {"min_iops": n, "max_iops": n, "burst_iops": n}}
+# Each tier is a QoS policy of the same name, volumes are created with its
+#   policy ID, so retiering everything in a tier is one ModifyQoSPolicy
+# The policy IDs are cached per cluster in a local file with the QoS they
+#   were set to, a cached ID is used as long as it is inside the TTL and the
+#   tier's QoS has not changed since
+# Otherwise the cluster's policies are listed once and missing tiers are
+#   created
+# A policy shared by every volume of a tier is never changed on the way to
+#   creating a volume, if its QoS differs from the local catalog the create
+#   fails instead, as another catalog may have set it
+# Run as a script it creates the missing tiers, updates every policy whose
+#   QoS differs to match the catalog and lists them, this is the only way
+#   a policy is modified
+# usage: python qos_catalog.py -sm <MVIP> -su <USER> -sp <PASSWORD>
+# example python qos_catalog.py -sm sf-mvip -su admin -sp Netapp1!
+
+import sys
+import argparse
+import json
+import os
+import threading
+import time
+import sf_session
+from sf_session import read_cache, write_cache
+from vol_validate import BURST_QOS_RANGE, MAX_QOS_RANGE, MIN_QOS_RANGE
+
+TIERS_PATH = os.environ.get("SF_QOS_TIERS", os.path.join(
+    os.path.expanduser("~"), ".solidfire_vol_create", "qos_tiers.json"))
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".solidfire_vol_create",
+                          "qos_policies.json")
+DEFAULT_TTL = 60 * 60
+# (min, max, burst) IOPS of the tiers used when there is no catalog file
+DEFAULT_TIERS = {"gold": (5000, 15000, 30000),
+                 "silver": (1000, 5000, 10000),
+                 "bronze": (100, 1000, 2000)}
+
+_lock = threading.Lock()
+_tiers = None
+
+
+def load_tiers(path=TIERS_PATH):
+    """
+    Returns the catalog as a dict of tier name to (min, max, burst) IOPS
+    Exits if the catalog file is not valid
+    """
+    try:
+        with open(path) as tf:
+            raw = json.load(tf)
+    except (IOError, OSError):
+        return dict(DEFAULT_TIERS)
+    except ValueError as e:
+        sys.exit("QoS tier catalog {} is not valid JSON: {}".format(path, e))
+    tiers = {}
+    problems = []
+    for name, qos in sorted(raw.items()):
+        try:
+            values = tuple(int(qos[field]) for field in
+                           ("min_iops", "max_iops", "burst_iops"))
+        except (KeyError, TypeError, ValueError):
+            problems.append("{}: min_iops, max_iops and burst_iops must be "
+                            "numbers".format(name))
+            continue
+        for value, (low, high) in zip(values, (MIN_QOS_RANGE, MAX_QOS_RANGE,
+                                               BURST_QOS_RANGE)):
+            if not low <= value <= high:
+                problems.append("{}: {} is not between {} and {}".format(
+                    name, value, low, high))
+        if not values[0] <= values[1] <= values[2]:
+            problems.append("{}: QoS must satisfy min <= max <= burst, got "
+                            "{}/{}/{}".format(name, *values))
+        tiers[name] = values
+    if problems:
+        sys.exit("QoS tier catalog {} is not valid:\n\t{}".format(
+            path, "\n\t".join(problems)))
+    return tiers
+
+
+def tiers():
+    """
+    Returns the catalog, read once per process
+    """
+    global _tiers
+    if _tiers is None:
+        _tiers = load_tiers()
+    return _tiers
+
+
+def _qos(values):
+    from solidfire.models import QoS
+    return QoS(min_iops=values[0], max_iops=values[1], burst_iops=values[2])
+
+
+def sync_policies(sfe, mvip, names, cache_path=CACHE_PATH, update=False):
+    """
+    Lists the cluster's QoS policies and creates the tiers in names that
+        are missing
+    A policy whose QoS differs from the catalog is updated to match with
+        update, otherwise ValueError is raised once the rest are cached
+    Returns the tier name to {"id", "qos"} map written to the cache
+    """
+    catalog = tiers()
+    mismatched = {}
+    found = {}
+    for policy in sfe.list_qos_policies().qos_policies:
+        found[policy.name] = (policy.qos_policy_id,
+                              (policy.qos.min_iops, policy.qos.max_iops,
+                               policy.qos.burst_iops))
+    policies = {}
+    for name in sorted(names):
+        values = catalog[name]
+        if name not in found:
+            policy_id = sfe.create_qos_policy(
+                name, _qos(values)).qos_policy.qos_policy_id
+            print("Created QoS policy {} ({}) as ID {}".format(
+                name, "/".join(map(str, values)), policy_id))
+        else:
+            policy_id, current = found[name]
+            if current != values and not update:
+                mismatched[name] = "{} is {} on {}, the catalog has " \
+                    "{}".format(name, "/".join(map(str, current)), mvip,
+                                "/".join(map(str, values)))
+                continue
+            if current != values:
+                sfe.modify_qos_policy(policy_id, qos=_qos(values))
+                print("Updated QoS policy {} from {} to {}".format(
+                    name, "/".join(map(str, current)),
+                    "/".join(map(str, values))))
+        policies[name] = {"id": policy_id, "qos": list(values)}
+
+    with _lock:
+        cache = read_cache(cache_path)
+        entry = cache.get(mvip, {}).get("policies", {})
+        entry.update(policies)
+        for name in mismatched:
+            entry.pop(name, None)
+        cache[mvip] = {"policies": entry, "stamp": time.time()}
+        try:
+            write_cache(cache_path, cache)
+        except (IOError, OSError) as e:
+            print("Unable to write QoS policy cache {}: {}".format(cache_path,
+                                                                   e))
+    if mismatched:
+        raise ValueError("QoS tier policies differ from the local catalog, "
+                         "update them with qos_catalog.py or fix {}: "
+                         "{}".format(TIERS_PATH, "; ".join(
+                             mismatched[name] for name in sorted(mismatched))))
+    return policies
+
+
+def policy_ids(sfe, mvip, names, ttl=DEFAULT_TTL, cache_path=CACHE_PATH):
+    """
+    Returns a dict of tier name to QoS policy ID on the cluster for every
+        tier in names, from the cache when it can
+    Raises ValueError if a policy's QoS differs from the catalog
+    """
+    catalog = tiers()
+    unknown = [name for name in names if name not in catalog]
+    if unknown:
+        raise KeyError("unknown QoS tier(s) {}".format(", ".join(unknown)))
+    entry = read_cache(cache_path).get(mvip)
+    if entry is not None and time.time() - entry.get("stamp", 0) <= ttl:
+        cached = entry.get("policies", {})
+        if all(name in cached and tuple(cached[name]["qos"]) == catalog[name]
+               for name in names):
+            return dict((name, cached[name]["id"]) for name in names)
+    policies = sync_policies(sfe, mvip, names, cache_path)
+    return dict((name, policies[name]["id"]) for name in names)
+
+
+def forget(mvip, cache_path=CACHE_PATH):
+    """
+    Drops mvip from the QoS policy cache
+    """
+    with _lock:
+        cache = read_cache(cache_path)
+        if cache.pop(mvip, None) is not None:
+            write_cache(cache_path, cache)
+
+
+def add_arguments(parser):
+    parser.add_argument('-sm', type=str,
+                        required=True,
+                        metavar='mvip',
+                        help='MVIP/node name or IP')
+    parser.add_argument('-su', type=str,
+                        required=True,
+                        metavar='username',
+                        help='username to connect with')
+    parser.add_argument('-sp', type=str,
+                        required=True,
+                        metavar='password',
+                        help='password for user')
+
+
+def run(args):
+    sfe = sf_session.connect(args.sm, args.su, args.sp)
+    catalog = tiers()
+    policies = sync_policies(sfe, args.sm, catalog, update=True)
+    print("{:<12} {:>9} {:>8} {:>8} {:>8}".format("tier", "policy ID",
+                                                  "min", "max", "burst"))
+    for name in sorted(policies):
+        print("{:<12} {:>9} {:>8} {:>8} {:>8}".format(
+            name, policies[name]["id"], *catalog[name]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module watches newly paired volumes until replication is running
+# A new pair starts as PausedMisconfigured while the source and target sync
+#   up, which can take up to 60 seconds per side
+# The watcher pages through ListActivePairedVolumes, tracks the state of every
+#   watched pair and returns as soon as each one has left PausedMisconfigured
+#   or the deadline passes, with the time each pair took to converge
+# Polling backs off while nothing changes and drops back to the initial
+#   interval whenever a pair converges
+
+import time
+from vol_listing import DEFAULT_PAGE_SIZE, iter_active_paired_volumes
+
+BAD_STATE = "PausedMisconfigured"
+
+
+class ReplicationWatch(object):
+    """
+    Result of wait_for_replication()
+    converged maps source volume ID to seconds taken to leave BAD_STATE
+    states maps source volume ID to the last replication states seen
+    """
+
+    def __init__(self, volume_ids):
+        self.pending = set(volume_ids)
+        self.converged = {}
+        self.states = {}
+        self.polls = 0
+        self.elapsed = 0.0
+
+
+def _pair_states(vol):
+    states = []
+    for pair in vol.volume_pairs or []:
+        remote = pair.remote_replication
+        states.append(remote.state if remote is not None else None)
+    return states
+
+
+def wait_for_replication(sfe, volume_ids, timeout=600, interval=1.0,
+                         max_interval=15.0, backoff=1.5,
+                         page_size=DEFAULT_PAGE_SIZE, started=None):
+    """
+    Polls the source cluster until every volume in volume_ids has left
+        PausedMisconfigured or timeout seconds have passed
+    A pair counts as converged once it is listed with a known state on
+        every volume pair and none of them is PausedMisconfigured
+    started optionally maps volume ID to the time.time() its pairing
+        completed, convergence is measured from the watch start otherwise
+    """
+    started = started or {}
+    watch = ReplicationWatch(volume_ids)
+    start = time.time()
+    deadline = start + timeout
+    delay = interval
+    while watch.pending:
+        watch.polls += 1
+        progressed = False
+        # Paging starts at the lowest pending ID and stops after the highest
+        first, last = min(watch.pending), max(watch.pending)
+        for vol in iter_active_paired_volumes(sfe, first, page_size):
+            if vol.volume_id > last:
+                break
+            if vol.volume_id not in watch.pending:
+                continue
+            states = _pair_states(vol)
+            watch.states[vol.volume_id] = states
+            if states and all(s is not None and BAD_STATE not in s
+                              for s in states):
+                watch.pending.discard(vol.volume_id)
+                watch.converged[vol.volume_id] = (
+                    time.time() - started.get(vol.volume_id, start))
+                progressed = True
+
+        now = time.time()
+        if not watch.pending or now >= deadline:
+            break
+        delay = interval if progressed else min(delay * backoff, max_interval)
+        time.sleep(min(delay, deadline - now))
+
+    watch.elapsed = time.time() - start
+    return watch
+
+
+def print_watch(watch):
+    """
+    Prints convergence time per pair followed by a summary
+    """
+    for vol_id in sorted(watch.converged):
+        print("volume ID {} replicating after {:.1f}s, state {}".format(
+            vol_id, watch.converged[vol_id], watch.states.get(vol_id)))
+    for vol_id in sorted(watch.pending):
+        print("volume ID {} not converged, last state {}".format(
+            vol_id, watch.states.get(vol_id, "not listed")))
+    if watch.converged:
+        times = sorted(watch.converged.values())
+        print("{} of {} pairs converged in {:.1f}s over {} polls, "
+              "median {:.1f}s, slowest {:.1f}s".format(
+                  len(times), len(times) + len(watch.pending), watch.elapsed,
+                  watch.polls, times[len(times) // 2], times[-1]))
+    else:
+        print("No pairs converged in {:.1f}s over {} polls".format(
+            watch.elapsed, watch.polls))
@@ -0,0 +1,115 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module encodes JSON-RPC request bodies straight to bytes
+# Each method with a builder has its body as a pre-encoded bytes template,
+#   so a request is one bytes % (values) with no dict built and no JSON
+#   encoder pass, and the values are checked to be the types the API takes
+# Numbers must be ints, an ID, size or IOPS passed as a string, float or
+#   bool is a TypeError, as the SDK would reject it, instead of a value %d
+#   quietly truncates or turns into 1 or 0
+# Every body gets the next id from the encoder's counter
+# Methods without a builder go through encode(), a compact json.dumps
+
+import itertools
+import json
+from json.encoder import encode_basestring_ascii
+
+BURST_TIME = 60
+
+_CREATE_VOLUME = (b'{"method":"CreateVolume","params":{"name":%s,'
+                  b'"accountID":%d,"totalSize":%d,"enable512e":%s,'
+                  b'"attributes":{}},"id":%d}')
+_CREATE_VOLUME_QOS = (b'{"method":"CreateVolume","params":{"name":%s,'
+                      b'"accountID":%d,"totalSize":%d,"enable512e":%s,'
+                      b'"attributes":{},"qos":{"minIOPS":%d,"maxIOPS":%d,'
+                      b'"burstIOPS":%d,"burstTime":%d}},"id":%d}')
+_CREATE_VOLUME_POLICY = (b'{"method":"CreateVolume","params":{"name":%s,'
+                         b'"accountID":%d,"totalSize":%d,"enable512e":%s,'
+                         b'"attributes":{},"qosPolicyID":%d},"id":%d}')
+_MODIFY_VOLUME_QOS = (b'{"method":"ModifyVolume","params":{"volumeID":%d,'
+                      b'"qos":{"minIOPS":%d,"maxIOPS":%d,"burstIOPS":%d,'
+                      b'"burstTime":%d}},"id":%d}')
+_LIST_VOLUMES = (b'{"method":"ListVolumes","params":{"startVolumeID":%d,'
+                 b'"limit":%d},"id":%d}')
+_LIST_ACCOUNTS = b'{"method":"ListAccounts","params":{},"id":%d}'
+_BOOLS = {True: b"true", False: b"false"}
+
+
+def _string(value):
+    if not isinstance(value, str):
+        raise TypeError("expected a string, got {!r}".format(value))
+    return encode_basestring_ascii(value).encode("ascii")
+
+
+def _int(value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError("expected an integer, got {!r}".format(value))
+    return value
+
+
+def _bool(value):
+    if not isinstance(value, bool):
+        raise TypeError("expected True or False, got {!r}".format(value))
+    return _BOOLS[value]
+
+
+class PayloadEncoder(object):
+    """
+    Builds JSON-RPC bodies as bytes with ids counting up from first_id
+    Safe to share between threads, each body gets a different id
+    """
+
+    def __init__(self, first_id=1):
+        self._ids = itertools.count(first_id)
+
+    def encode(self, method, params=None):
+        """
+        Any method, encoded with json.dumps
+        """
+        return json.dumps({"method": method,
+                           "params": params or {},
+                           "id": next(self._ids)},
+                          separators=(",", ":")).encode("utf-8")
+
+    def create_volume(self, name, account_id, total_size, enable512e,
+                      min_iops=None, max_iops=None, burst_iops=None,
+                      burst_time=BURST_TIME, qos_policy_id=None):
+        """
+        CreateVolume, with custom QoS when min_iops is set or on a QoS
+            policy when qos_policy_id is, not both
+        """
+        if qos_policy_id is not None:
+            if min_iops is not None:
+                raise ValueError("give custom QoS or a QoS policy, not both")
+            return _CREATE_VOLUME_POLICY % (_string(name), _int(account_id),
+                                            _int(total_size),
+                                            _bool(enable512e),
+                                            _int(qos_policy_id),
+                                            next(self._ids))
+        if min_iops is None:
+            return _CREATE_VOLUME % (_string(name), _int(account_id),
+                                     _int(total_size), _bool(enable512e),
+                                     next(self._ids))
+        return _CREATE_VOLUME_QOS % (_string(name), _int(account_id),
+                                     _int(total_size), _bool(enable512e),
+                                     _int(min_iops), _int(max_iops),
+                                     _int(burst_iops), _int(burst_time),
+                                     next(self._ids))
+
+    def modify_volume_qos(self, volume_id, min_iops, max_iops, burst_iops,
+                          burst_time=BURST_TIME):
+        return _MODIFY_VOLUME_QOS % (_int(volume_id), _int(min_iops),
+                                     _int(max_iops), _int(burst_iops),
+                                     _int(burst_time), next(self._ids))
+
+    def list_volumes(self, start_volume_id, limit):
+        return _LIST_VOLUMES % (_int(start_volume_id), _int(limit),
+                                next(self._ids))
+
+    def list_accounts(self):
+        return _LIST_ACCOUNTS % next(self._ids)
+
+
+# Shared by every caller in a process so ids never repeat within a run
+default_encoder = PayloadEncoder()
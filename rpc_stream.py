@@ -0,0 +1,217 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module reads large JSON-RPC responses a record at a time
+# stream_json_rpc() POSTs with requests in streaming mode and walks the
+#   response as it arrives: the envelope is scanned key by key, and each
+#   element of the chosen array under "result" is decoded and yielded on
+#   its own, so only one record and one network chunk are held at a time
+#   instead of the body text, the whole decoded tree and a printed copy
+# With raw=True each record is yielded as its JSON text from the response,
+#   on one line, which write_jsonl() passes through without re-encoding
+# Only the stdlib decoder is used, no streaming JSON package is needed
+
+import codecs
+import json
+import time
+from sf_metrics import OK, cluster_of, default_metrics
+from sf_retry import error_name
+
+CHUNK_SIZE = 64 * 1024
+# The array under "result" each list method returns its records in
+RECORD_KEYS = {"ListVolumes": "volumes",
+               "ListActivePairedVolumes": "volumes",
+               "ListDeletedVolumes": "volumes",
+               "ListAccounts": "accounts"}
+
+_WHITESPACE = " \t\n\r"
+
+
+class JsonRpcError(Exception):
+    """
+    An error object returned by the cluster for a JSON-RPC call
+    """
+
+    def __init__(self, method, error):
+        self.method = method
+        self.name = error.get("name", "Unknown")
+        self.code = error.get("code", 500)
+        self.message = error.get("message", "")
+        Exception.__init__(self, "{} failed: {} ({}) {}".format(
+            method, self.name, self.code, self.message))
+
+
+class _Reader(object):
+    """
+    A text buffer over a stream of byte chunks, refilled as values are read
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = next(self._chunks, None)
+        # Drop what has been read so the buffer stays about a chunk long
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        if chunk is None:
+            self.eof = True
+            self.buf += self._utf8.decode(b"", final=True)
+        else:
+            self.buf += self._utf8.decode(chunk)
+        return True
+
+    def peek(self):
+        """
+        Returns the next non-whitespace character, "" at the end
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError("expected {!r} at response offset {}, got "
+                             "{!r}".format(char, self.pos, found))
+        self.pos += 1
+
+    def value(self, raw=False):
+        """
+        Decodes the next value, or with raw returns its JSON text
+        A value running to the end of the buffer may be cut short, a
+            number especially, so it is only taken once more data or the
+            end of the response confirms it
+        """
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self.buf) and self._fill():
+                continue
+            start, self.pos = self.pos, end
+            if raw:
+                # Strings cannot hold a bare newline, so this is safe
+                return self.buf[start:end].replace("\n", "").replace("\r", "")
+            return obj
+
+    def members(self):
+        """
+        Yields the keys of the object starting here, the caller reads each
+            value before asking for the next key
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+    def elements(self, raw=False):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value(raw)
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+
+def iter_records(method, chunks, key, raw=False):
+    """
+    Yields each element of result[key] from a JSON-RPC response arriving
+        as byte chunks
+    Raises JsonRpcError if the response is an error
+    """
+    reader = _Reader(chunks)
+    for top in reader.members():
+        if top == "error":
+            raise JsonRpcError(method, reader.value())
+        if top != "result":
+            reader.value()
+            continue
+        for name in reader.members():
+            if name == key:
+                for record in reader.elements(raw):
+                    yield record
+            else:
+                reader.value()
+
+
+def stream_json_rpc(method, url, payload, headers, key=None, raw=False,
+                    metrics=None, chunk_size=CHUNK_SIZE, **kwargs):
+    """
+    POSTs one JSON-RPC payload with requests and yields the records of the
+        result one by one, key defaults to RECORD_KEYS[method]
+    The call is recorded in sf_metrics once the records are exhausted or
+        the generator is closed
+    """
+    import requests
+    if metrics is None:
+        metrics = default_metrics
+    key = key or RECORD_KEYS[method]
+    counted = [0]
+    outcome = OK
+    started = time.time()
+
+    def chunks(response):
+        for chunk in response.iter_content(chunk_size):
+            counted[0] += len(chunk)
+            yield chunk
+
+    try:
+        with requests.request("POST", url, data=payload, headers=headers,
+                              stream=True, **kwargs) as response:
+            for record in iter_records(method, chunks(response), key, raw):
+                yield record
+    except JsonRpcError as e:
+        outcome = e.name
+        raise
+    except Exception as e:
+        outcome = error_name(e)
+        raise
+    finally:
+        metrics.observe(method, cluster_of(url), time.time() - started,
+                        len(payload), counted[0], outcome)
+
+
+def write_jsonl(records, out):
+    """
+    Writes records to out one per line, raw records are written as they
+        are, decoded ones are encoded compactly
+    Returns the number of records written
+    """
+    written = 0
+    for record in records:
+        if not isinstance(record, str):
+            record = json.dumps(record, separators=(",", ":"))
+        out.write(record)
+        out.write("\n")
+        written += 1
+    return written
@@ -0,0 +1,86 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module resolves account usernames and IDs without a ListAccounts
+#   call on every run
+# Each cluster's username to account ID map is kept in a local cache file
+#   keyed by MVIP, entries older than the TTL are fetched again
+# A lookup that misses the cache fetches the cluster's accounts once before
+#   giving up, so a new account is found straight away, and forget() drops
+#   a cluster whose cached account turned out to be gone
+# The cache holds no credentials, only usernames, IDs and a timestamp
+
+import os
+import threading
+import time
+from sf_session import read_cache, write_cache
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".solidfire_vol_create",
+                          "accounts.json")
+DEFAULT_TTL = 60 * 60
+
+_lock = threading.Lock()
+
+
+def _cached_accounts(mvip, ttl, cache_path):
+    entry = read_cache(cache_path).get(mvip)
+    if entry is None or time.time() - entry.get("stamp", 0) > ttl:
+        return None
+    return entry["accounts"]
+
+
+def refresh(sfe, mvip, cache_path=CACHE_PATH):
+    """
+    Fetches every account on the cluster into the cache
+    Returns the username to account ID map
+    """
+    accounts = dict((acct.username, acct.account_id)
+                    for acct in sfe.list_accounts().accounts)
+    with _lock:
+        cache = read_cache(cache_path)
+        cache[mvip] = {"accounts": accounts, "stamp": time.time()}
+        try:
+            write_cache(cache_path, cache)
+        except (IOError, OSError) as e:
+            print("Unable to write account cache {}: {}".format(cache_path,
+                                                                e))
+    return accounts
+
+
+def forget(mvip, cache_path=CACHE_PATH):
+    """
+    Drops mvip from the account cache
+    """
+    with _lock:
+        cache = read_cache(cache_path)
+        if cache.pop(mvip, None) is not None:
+            write_cache(cache_path, cache)
+
+
+def _lookup(sfe, mvip, found, ttl, cache_path):
+    accounts = _cached_accounts(mvip, ttl, cache_path)
+    if accounts is not None:
+        result = found(accounts)
+        if result is not None:
+            return result
+    return found(refresh(sfe, mvip, cache_path))
+
+
+def resolve_account(sfe, mvip, username, ttl=DEFAULT_TTL,
+                    cache_path=CACHE_PATH):
+    """
+    Returns the account ID for username on the cluster, None if there is
+        no such account
+    """
+    return _lookup(sfe, mvip, lambda accounts: accounts.get(username), ttl,
+                   cache_path)
+
+
+def account_exists(sfe, mvip, account_id, ttl=DEFAULT_TTL,
+                   cache_path=CACHE_PATH):
+    """
+    Returns True if account_id is an account on the cluster
+    """
+    return _lookup(sfe, mvip,
+                   lambda accounts: True if account_id in accounts.values()
+                   else None, ttl, cache_path) is True
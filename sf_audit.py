@@ -0,0 +1,178 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module writes the audit log of what the scripts were asked to do
+#   and what came of it, one JSON object per line
+# Records are queued by the caller and written by a background thread in
+#   batches, so a batch run never waits on log I/O
+# Passwords in the recorded arguments are replaced before queueing
+# All runs append to one log, AUDIT_PATH, which is rotated to .1, .2, ...
+#   once it passes max_bytes, and whatever is queued is written at exit
+# Runs can overlap, so each batch is written and any rotation done holding
+#   an exclusive flock on AUDIT_PATH.lock, and a writer whose log was
+#   rotated by another run reopens AUDIT_PATH before writing
+# AUDIT_PATH is the SF_AUDIT_LOG environment variable, default
+#   ~/.solidfire_vol_create/audit.jsonl
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl is POSIX only, overlapping runs on Windows are not locked
+    fcntl = None
+
+AUDIT_PATH = os.environ.get("SF_AUDIT_LOG", os.path.join(
+    os.path.expanduser("~"), ".solidfire_vol_create", "audit.jsonl"))
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# Argument names holding passwords, -sp and -dp in the scripts
+SECRET_ARGS = ("sp", "dp", "password")
+REDACTED = "********"
+
+_STOP = object()
+
+
+def redact_args(args):
+    """
+    Returns the argparse Namespace as a dict with passwords replaced
+    """
+    fields = dict(vars(args))
+    for name in SECRET_ARGS:
+        if fields.get(name) is not None:
+            fields[name] = REDACTED
+    return fields
+
+
+class AuditLog(object):
+    """
+    Appends JSON records to path from a background writer thread
+    The writer wakes every flush_interval seconds or when records are
+        queued, writes everything queued and flushes once per batch
+    """
+
+    def __init__(self, path=AUDIT_PATH, max_bytes=DEFAULT_MAX_BYTES,
+                 backups=DEFAULT_BACKUPS, flush_interval=1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.run_id = "{}-{}".format(int(time.time()), os.getpid())
+        self._queue = queue.Queue()
+        self._file = None
+        self._lock_file = None
+        self._thread = threading.Thread(target=self._writer,
+                                        name="audit-log")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def record(self, event, **fields):
+        """
+        Queues one record, never blocks on the file
+        """
+        fields["event"] = event
+        fields["time"] = time.time()
+        fields["run"] = self.run_id
+        self._queue.put(fields)
+
+    def close(self):
+        """
+        Writes everything queued and stops the writer
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _writer(self):
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [rec for rec in batch if rec is not _STOP]
+            try:
+                self._write(batch)
+            except (IOError, OSError) as e:
+                print("Unable to write audit log {}: {}".format(self.path, e))
+        if self._file is not None:
+            self._file.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        if self._lock_file is None:
+            log_dir = os.path.dirname(self.path)
+            if log_dir and not os.path.isdir(log_dir):
+                os.makedirs(log_dir)
+            self._lock_file = open(self.path + ".lock", "a")
+        if fcntl is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            if self._file is not None and self._rotated():
+                self._file.close()
+                self._file = None
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write("".join(json.dumps(rec, default=str) + "\n"
+                                     for rec in batch))
+            self._file.flush()
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _rotated(self):
+        """
+        True if the open log is no longer the file at path, another run
+            rotated it
+        """
+        try:
+            current = os.stat(self.path)
+        except OSError:
+            return True
+        return not os.path.samestat(current, os.fstat(self._file.fileno()))
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            older = "{}.{}".format(self.path, i)
+            if os.path.exists(older):
+                os.replace(older, "{}.{}".format(self.path, i + 1))
+        if self.backups:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """
+    Returns the process wide audit log, its writer starts on first use
+    """
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = AuditLog()
+            atexit.register(_log.close)
+        return _log
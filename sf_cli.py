@@ -0,0 +1,84 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script is a single entry point for the volume scripts in this repo
+# Each subcommand takes the same arguments as the script it runs:
+#   allocate      allocate_vol_argparse.py, one volume or a -m manifest batch
+#   rpc-allocate  allocate_vol_requests_argparse.py, one volume over JSON-RPC
+#   pair-create   create_vol_with_pairing_argparse_functions.py
+#   reconcile     vol_reconcile.py, make a cluster match a desired-state file
+#   rpc-list      list_vol_requests_argparse.py, stream a cluster inventory
+#   qos           vol_qos.py, set new QoS on many volumes at once
+#   qos-tiers     qos_catalog.py, create or update the QoS tier policies
+#   teardown      vol_teardown.py, unpair, delete and purge test volumes
+# Only the module for the chosen subcommand is imported, and that module
+#   only loads the SolidFire SDK or requests once it actually calls a cluster
+# -T prints how long startup took before the subcommand started running
+# usage: python sf_cli.py [-T] <subcommand> <arguments>
+# example python sf_cli.py allocate -sm sf-mvip -su admin -sp Netapp1! -m tenant1.csv -w 8
+
+import time
+_start = time.time()
+
+import sys
+import argparse
+import importlib
+
+SUBCOMMANDS = (
+    ("allocate", "allocate_vol_argparse",
+     "create one volume, or a manifest batch with -m, through the SDK"),
+    ("rpc-allocate", "allocate_vol_requests_argparse",
+     "create one volume with a raw JSON-RPC call"),
+    ("pair-create", "create_vol_with_pairing_argparse_functions",
+     "create and pair a series of volumes across two clusters"),
+    ("reconcile", "vol_reconcile",
+     "create, modify and pair volumes to match a desired-state file"),
+    ("rpc-list", "list_vol_requests_argparse",
+     "stream volumes or accounts with a raw JSON-RPC call"),
+    ("qos", "vol_qos",
+     "retier the QoS of volumes selected by name, account or ID range"),
+    ("qos-tiers", "qos_catalog",
+     "create or update the QoS policies of the tier catalog"),
+    ("teardown", "vol_teardown",
+     "remove pairs, delete and purge volumes by prefix or journal"),
+)
+
+
+def build_parser(chosen=None):
+    """
+    Builds the parser, only the chosen subcommand gets its full arguments
+        so only its module is imported
+    """
+    parser = argparse.ArgumentParser(prog="sf_cli.py")
+    parser.add_argument('-T', action='store_true',
+                        help='print startup time before running')
+    subparsers = parser.add_subparsers(dest='command', metavar='subcommand')
+    subparsers.required = True
+    for name, module_name, help_text in SUBCOMMANDS:
+        sub = subparsers.add_parser(name, help=help_text)
+        if name == chosen:
+            module = importlib.import_module(module_name)
+            module.add_arguments(sub)
+            sub.set_defaults(module=module)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    names = [name for name, _, _ in SUBCOMMANDS]
+    chosen = next((arg for arg in argv if arg in names), None)
+
+    imported = time.time()
+    args = build_parser(chosen).parse_args(argv)
+    ready = time.time()
+    if args.T:
+        sys.stderr.write("startup {:.1f} ms: cli imports {:.1f} ms, "
+                         "{} module and parsing {:.1f} ms\n".format(
+                             (ready - _start) * 1000,
+                             (imported - _start) * 1000,
+                             args.command, (ready - imported) * 1000))
+    args.module.run(args)
+
+
+if __name__ == "__main__":
+    main()
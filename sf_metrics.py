@@ -0,0 +1,266 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module records every Element API call a script makes
+# Each call is counted by method, cluster and outcome ("ok" or the error
+#   name) with its latency in a histogram and its request/response bytes
+# SDK clients are covered by instrument(), which sf_session.connect() applies,
+#   raw requests calls go through post_json_rpc() and the async client
+#   records its own calls
+# When the process exits the totals are written to METRICS_DIR as
+#   api_metrics-<time>-<pid>.json   per method/cluster counts, errors, mean,
+#                                   p50, p99, max
+#   api_metrics-<time>-<pid>.prom   Prometheus text format, for a
+#                                   node_exporter textfile collector or to
+#                                   diff between runs
+#   named per process so runs at the same time keep their own files
+# METRICS_DIR is the SF_METRICS_DIR environment variable, default
+#   ~/.solidfire_vol_create/metrics, set it to an empty string to write
+#   nothing
+
+import atexit
+import json
+import os
+import threading
+import time
+from sf_retry import error_name
+
+OK = "ok"
+
+# Upper bounds in seconds, API calls range from a few ms to minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+METRICS_DIR = os.environ.get("SF_METRICS_DIR", os.path.join(
+    os.path.expanduser("~"), ".solidfire_vol_create", "metrics"))
+
+
+class _Series(object):
+    """
+    Latency histogram and byte totals for one (method, cluster)
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.outcomes = {}
+
+    def quantile(self, q):
+        """
+        Estimated from the buckets, the upper bound of the bucket holding q
+        """
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets[:-1]):
+            seen += n
+            if seen >= rank:
+                return min(LATENCY_BUCKETS[i], self.max)
+        return self.max
+
+
+class ApiMetrics(object):
+    """
+    In-process registry of API call metrics, safe to share between threads
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method, cluster, latency, request_bytes=0,
+                response_bytes=0, outcome=OK):
+        slot = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                slot = i
+                break
+        with self._lock:
+            series = self._series.get((method, cluster))
+            if series is None:
+                series = self._series[(method, cluster)] = _Series()
+            series.buckets[slot] += 1
+            series.count += 1
+            series.total += latency
+            series.max = max(series.max, latency)
+            series.request_bytes += request_bytes
+            series.response_bytes += response_bytes
+            series.outcomes[outcome] = series.outcomes.get(outcome, 0) + 1
+
+    def __len__(self):
+        with self._lock:
+            return sum(series.count for series in self._series.values())
+
+    def summary(self):
+        """
+        Returns one dict per (method, cluster), slowest mean first
+        """
+        with self._lock:
+            rows = [{"method": method,
+                     "cluster": cluster,
+                     "calls": series.count,
+                     "errors": series.count - series.outcomes.get(OK, 0),
+                     "outcomes": dict(series.outcomes),
+                     "mean_ms": round(series.total / series.count * 1000, 3),
+                     "p50_ms": round(series.quantile(0.50) * 1000, 3),
+                     "p99_ms": round(series.quantile(0.99) * 1000, 3),
+                     "max_ms": round(series.max * 1000, 3),
+                     "request_bytes": series.request_bytes,
+                     "response_bytes": series.response_bytes}
+                    for (method, cluster), series in self._series.items()]
+        return sorted(rows, key=lambda row: row["mean_ms"], reverse=True)
+
+    def prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format
+        """
+        lines = ["# HELP sf_api_call_seconds Element API call latency",
+                 "# TYPE sf_api_call_seconds histogram"]
+        calls, request_bytes, response_bytes = [], [], []
+        with self._lock:
+            for (method, cluster), series in sorted(self._series.items()):
+                labels = 'method="{}",cluster="{}"'.format(
+                    _escape(method), _escape(cluster))
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS + ("+Inf",),
+                                    series.buckets):
+                    cumulative += n
+                    lines.append('sf_api_call_seconds_bucket{{{},le="{}"}} {}'
+                                 .format(labels, bound, cumulative))
+                lines.append("sf_api_call_seconds_sum{{{}}} {!r}".format(
+                    labels, series.total))
+                lines.append("sf_api_call_seconds_count{{{}}} {}".format(
+                    labels, series.count))
+                for outcome, n in sorted(series.outcomes.items()):
+                    calls.append('sf_api_calls_total{{{},outcome="{}"}} {}'
+                                 .format(labels, _escape(outcome), n))
+                request_bytes.append("sf_api_request_bytes_total{{{}}} {}"
+                                     .format(labels, series.request_bytes))
+                response_bytes.append("sf_api_response_bytes_total{{{}}} {}"
+                                      .format(labels, series.response_bytes))
+        lines += ["# HELP sf_api_calls_total Element API calls by outcome",
+                  "# TYPE sf_api_calls_total counter"] + calls
+        lines += ["# HELP sf_api_request_bytes_total Bytes sent in API calls",
+                  "# TYPE sf_api_request_bytes_total counter"] + request_bytes
+        lines += ["# HELP sf_api_response_bytes_total Bytes received from "
+                  "API calls",
+                  "# TYPE sf_api_response_bytes_total counter"] + response_bytes
+        return "\n".join(lines) + "\n"
+
+    def write(self, metrics_dir, name="api_metrics"):
+        """
+        Writes name.json and name.prom to metrics_dir
+        """
+        if metrics_dir and not os.path.isdir(metrics_dir):
+            os.makedirs(metrics_dir)
+        path = os.path.join(metrics_dir, name)
+        with open(path + ".json", "w") as mf:
+            json.dump({"written": time.time(), "calls": self.summary()}, mf,
+                      indent=2)
+        with open(path + ".prom", "w") as mf:
+            mf.write(self.prometheus())
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+class _MeteredDispatcher(object):
+    """
+    Wraps an SDK dispatcher to note the bytes of the call on this thread
+    """
+
+    def __init__(self, dispatcher, sizes):
+        self._dispatcher = dispatcher
+        self._sizes = sizes
+
+    def post(self, data):
+        self._sizes.request = len(data)
+        response = self._dispatcher.post(data)
+        # The dispatcher returns a dict instead of text for an empty body
+        self._sizes.response = len(response) if isinstance(response, str) else 0
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._dispatcher, name)
+
+
+def instrument(sfe, cluster, metrics=None):
+    """
+    Records every API call made through an Element SDK client
+    The client is changed in place and returned
+    """
+    if metrics is None:
+        metrics = default_metrics
+    sizes = threading.local()
+    sfe._dispatcher = _MeteredDispatcher(sfe._dispatcher, sizes)
+    send_request = sfe.send_request
+
+    def timed_send_request(method_name, *args, **kwargs):
+        sizes.request = sizes.response = 0
+        outcome = OK
+        started = time.time()
+        try:
+            return send_request(method_name, *args, **kwargs)
+        except Exception as e:
+            outcome = error_name(e)
+            raise
+        finally:
+            metrics.observe(method_name, cluster, time.time() - started,
+                            sizes.request, sizes.response, outcome)
+
+    sfe.send_request = timed_send_request
+    return sfe
+
+
+def cluster_of(url):
+    """
+    The cluster label for a /json-rpc URL, its host
+    """
+    return url.split("://", 1)[-1].split("/", 1)[0]
+
+
+def post_json_rpc(method, url, payload, headers, metrics=None, **kwargs):
+    """
+    POSTs one JSON-RPC payload with requests, records the call and
+        returns the decoded response
+    """
+    import requests
+    if metrics is None:
+        metrics = default_metrics
+    response_bytes = 0
+    outcome = OK
+    started = time.time()
+    try:
+        response = requests.request("POST", url, data=payload,
+                                    headers=headers, **kwargs)
+        response_bytes = len(response.content)
+        raw = json.loads(response.text)
+        if "error" in raw:
+            outcome = raw["error"].get("name", "Unknown")
+        return raw
+    except Exception as e:
+        outcome = error_name(e)
+        raise
+    finally:
+        metrics.observe(method, cluster_of(url), time.time() - started,
+                        len(payload), response_bytes, outcome)
+
+
+def _write_at_exit():
+    if METRICS_DIR and len(default_metrics):
+        try:
+            default_metrics.write(METRICS_DIR, "api_metrics-{}-{}".format(
+                time.strftime("%Y%m%d-%H%M%S"), os.getpid()))
+        except (IOError, OSError) as e:
+            print("Unable to write API metrics to {}: {}".format(
+                METRICS_DIR, e))
+
+
+# Shared by every caller in a process so the files cover the whole run
+default_metrics = ApiMetrics()
+atexit.register(_write_at_exit)
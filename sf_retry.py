@@ -0,0 +1,211 @@
+#!/usr/local/bin/python
+# Written for Python 3.5 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module retries Element API calls that failed for a retryable reason
+# Errors are classified as:
+#   transient - the connection failed, dropped or timed out, or the cluster
+#               reports xDBOperationTimeout or xDBConnectionLoss, the call
+#               may or may not have applied
+#   overload  - the cluster answered and rejected the call because it is
+#               busy (an exact xDBVersionMismatch or xServiceUnavailable
+#               error name, or HTTP 503), nothing was applied
+#   fatal     - anything else, never retried
+# Errors are told apart by exception type and exact error name, never by
+#   their text, and an unknown outcome is checked first so a timed out
+#   CreateVolume is never retried as if it had been rejected
+# Each API method has an idempotency rule deciding which of those it may
+#   be retried after, see METHOD_RULES
+# Retries wait a capped exponential backoff with full jitter and draw from a
+#   retry budget, so a contended cluster sees a bounded number of extra calls
+#   instead of a retry storm
+
+import random
+import threading
+import time
+import socket
+from sf_throttle import error_name, is_overload_error
+
+OVERLOAD = "overload"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+# Exception class names raised for connection level failures and timeouts
+#   by requests, urllib3, the SolidFire SDK and aiohttp, subclasses match too
+TRANSIENT_ERRORS = ("ApiConnectionError",
+                    "ConnectionError",
+                    "ConnectTimeout",
+                    "ReadTimeout",
+                    "Timeout",
+                    "ChunkedEncodingError",
+                    "ProtocolError",
+                    "ReadTimeoutError",
+                    "NewConnectionError",
+                    "ClientConnectionError",
+                    "ClientPayloadError",
+                    "ServerDisconnectedError",
+                    "ServerTimeoutError")
+# JSON-RPC error names for a cluster side timeout or lost database
+#   connection, where the call may still have been applied
+TRANSIENT_ERROR_NAMES = ("xDBConnectionLoss",
+                         "xDBOperationTimeout")
+
+# Idempotency rules
+IDEMPOTENT = "idempotent"        # retry after overload and transient errors
+REJECTED_ONLY = "rejected_only"  # retry only when the call was not applied
+FRESH_KEY = "fresh_key"          # like rejected_only, and the pairing key
+                                 #   must be reissued through before_retry
+
+METHOD_RULES = {
+    "CreateVolume": REJECTED_ONLY,
+    "StartVolumePairing": REJECTED_ONLY,
+    "CompleteVolumePairing": FRESH_KEY,
+    "RemoveVolumePair": IDEMPOTENT,
+    "ModifyVolume": IDEMPOTENT,
+    "ModifyVolumes": IDEMPOTENT,
+    "DeleteVolumes": IDEMPOTENT,
+    "PurgeDeletedVolumes": IDEMPOTENT,
+}
+
+
+def is_transient_error(error):
+    """
+    True if error, or an error it was raised from, is a connection failure
+        or timeout
+    The SDK raises a read timeout as an ApiServerError with no error name,
+        so the errors it was raised from are checked as well
+    """
+    if error_name(error) in TRANSIENT_ERROR_NAMES:
+        return True
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (ConnectionError, TimeoutError, socket.timeout)):
+            return True
+        if any(cls.__name__ in TRANSIENT_ERRORS
+               for cls in type(error).__mro__):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def classify(error):
+    if is_transient_error(error):
+        return TRANSIENT
+    if is_overload_error(error):
+        return OVERLOAD
+    return FATAL
+
+
+def method_rule(method):
+    if method in METHOD_RULES:
+        return METHOD_RULES[method]
+    if method.startswith(("List", "Get")):
+        return IDEMPOTENT
+    return REJECTED_ONLY
+
+
+class RetryPolicy(object):
+    """
+    Retries API calls per METHOD_RULES with capped exponential backoff
+    The budget allows budget_ratio retries per call made plus min_budget,
+        once it is spent failures are raised without retrying
+    """
+
+    def __init__(self, max_attempts=6, base_delay=0.5, max_delay=30.0,
+                 budget_ratio=0.2, min_budget=10):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_budget = min_budget
+        self.calls = 0
+        self.retries = 0
+        self.giveups = 0
+        self.budget_exhausted = 0
+        self.sleep_time = 0.0
+        self.retries_by_error = {}
+        self._lock = threading.Lock()
+
+    def _should_retry(self, method, error, attempt, before_retry):
+        kind = classify(error)
+        rule = method_rule(method)
+        if kind == FATAL or (kind == TRANSIENT and rule != IDEMPOTENT):
+            return False
+        if rule == FRESH_KEY and before_retry is None:
+            return False
+        with self._lock:
+            if attempt >= self.max_attempts:
+                self.giveups += 1
+                return False
+            if self.retries >= self.min_budget + self.budget_ratio * self.calls:
+                self.budget_exhausted += 1
+                return False
+            self.retries += 1
+            name = error_name(error)
+            self.retries_by_error[name] = self.retries_by_error.get(name, 0) + 1
+        return True
+
+    def _delay(self, attempt):
+        delay = random.uniform(0, min(self.max_delay,
+                                      self.base_delay * 2 ** (attempt - 1)))
+        with self._lock:
+            self.sleep_time += delay
+        return delay
+
+    def call(self, method, fn, *args, **kwargs):
+        """
+        Calls fn(*args, **kwargs) for API method, retrying when allowed
+        before_retry is called between attempts, use it to reissue a
+            pairing key for CompleteVolumePairing
+        """
+        before_retry = kwargs.pop("before_retry", None)
+        with self._lock:
+            self.calls += 1
+        attempt = 1
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(method, e, attempt, before_retry):
+                    raise
+                print("##########\n"
+                      "{} encountered on {}, retry {} of {}"
+                      "\n##########".format(error_name(e), method, attempt,
+                                            self.max_attempts - 1))
+                time.sleep(self._delay(attempt))
+                attempt += 1
+                if before_retry is not None:
+                    before_retry()
+
+    async def call_async(self, method, coro_fn, *args, **kwargs):
+        """
+        call() for coroutine functions
+        """
+        import asyncio
+        before_retry = kwargs.pop("before_retry", None)
+        with self._lock:
+            self.calls += 1
+        attempt = 1
+        while True:
+            try:
+                return await coro_fn(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(method, e, attempt, before_retry):
+                    raise
+                await asyncio.sleep(self._delay(attempt))
+                attempt += 1
+                if before_retry is not None:
+                    await before_retry()
+
+    def snapshot(self):
+        with self._lock:
+            return {"calls": self.calls,
+                    "retries": self.retries,
+                    "giveups": self.giveups,
+                    "budget_exhausted": self.budget_exhausted,
+                    "sleep_time": round(self.sleep_time, 2),
+                    "retries_by_error": dict(self.retries_by_error)}
+
+
+# Shared by every caller in a process so the budget covers the whole run
+default_policy = RetryPolicy()
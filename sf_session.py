@@ -0,0 +1,194 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module hands out Element connections and remembers how to make them
+# Within a process one client is kept per (MVIP, user) and reused
+# ElementFactory.create() probes the cluster for its API version every time
+#   it runs, so the negotiated version is also written to a local cache file
+#   and later runs inside the TTL build the Element client directly from the
+#   cache without the probe
+# A cached entry goes stale when the cluster is upgraded or its MVIP moves,
+#   so if the first call of a cached client, or the probe itself, fails to
+#   connect or is refused its API version, the entry is invalidated and the
+#   connection made again once through ElementFactory
+# The cache holds no credentials, only MVIP, version and timestamp
+# read_cache() and write_cache() are shared by the other local caches,
+#   sf_accounts and qos_catalog
+# Every client is instrumented by sf_metrics so its API calls are recorded
+
+import json
+import os
+import threading
+import time
+from sf_metrics import instrument
+from sf_retry import IDEMPOTENT, is_transient_error, method_rule
+from sf_throttle import error_name, error_status
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".solidfire_vol_create",
+                          "api_versions.json")
+DEFAULT_TTL = 24 * 60 * 60
+# Errors meaning the API version or endpoint a client was built for is
+#   gone, along with any connection error
+STALE_ERRORS = ("xUnknownAPIVersion",)
+STALE_STATUSES = (404,)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def read_cache(cache_path):
+    """
+    Returns the JSON cache file at cache_path, empty if it is missing or
+        unreadable
+    """
+    try:
+        with open(cache_path) as cf:
+            return json.load(cf)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def write_cache(cache_path, cache):
+    """
+    Replaces the JSON cache file at cache_path, creating its directory
+    """
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    # Write then rename so a concurrent run never reads half a file
+    tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    with open(tmp_path, "w") as cf:
+        json.dump(cache, cf, indent=2, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+
+
+def cached_version(mvip, ttl=DEFAULT_TTL, cache_path=CACHE_PATH):
+    """
+    Returns the cache entry for mvip if it is younger than ttl, else None
+    """
+    entry = read_cache(cache_path).get(mvip)
+    if entry is None or time.time() - entry.get("stamp", 0) > ttl:
+        return None
+    return entry
+
+
+def invalidate(mvip, user=None, cache_path=CACHE_PATH):
+    """
+    Drops mvip from the version cache and (mvip, user) from the in-process
+        registry, every user of mvip when user is None
+    """
+    cache = read_cache(cache_path)
+    if cache.pop(mvip, None) is not None:
+        try:
+            write_cache(cache_path, cache)
+        except (IOError, OSError) as e:
+            print("Unable to write API version cache {}: {}".format(
+                cache_path, e))
+    with _clients_lock:
+        for key in [key for key in _clients
+                    if key[0] == mvip and user in (None, key[1])]:
+            del _clients[key]
+
+
+def is_stale_error(error):
+    """
+    True if error means the client's MVIP or API version no longer works
+    """
+    if type(error).__name__ == "ApiConnectionError":
+        return True
+    return (error_name(error) in STALE_ERRORS or
+            error_status(error) in STALE_STATUSES)
+
+
+def _probe(mvip, user, password, cache_path):
+    """
+    Creates a client through ElementFactory and caches its version
+    """
+    from solidfire.factory import ElementFactory
+
+    sfe = ElementFactory.create(mvip, user, password,
+                                print_ascii_art=False)
+    cache = read_cache(cache_path)
+    cache[mvip] = {"version": sfe.api_version, "stamp": time.time()}
+    try:
+        write_cache(cache_path, cache)
+    except (IOError, OSError) as e:
+        print("Unable to write API version cache {}: {}".format(
+            cache_path, e))
+    return instrument(sfe, mvip)
+
+
+def _check_first_call(sfe, mvip, user, password, cache_path):
+    """
+    Makes sfe, built from a cache entry, reconnect once through
+        ElementFactory if its first call finds the entry stale
+    Later calls go to the new client, and so does the failed call unless
+        the connection dropped with the call's outcome unknown and the
+        method is not safe to repeat
+    """
+    send_request = sfe.send_request
+    checked = threading.Event()
+
+    def checked_send_request(method_name, *args, **kwargs):
+        if checked.is_set():
+            return send_request(method_name, *args, **kwargs)
+        try:
+            result = send_request(method_name, *args, **kwargs)
+        except Exception as e:
+            if checked.is_set() or not is_stale_error(e):
+                raise
+            checked.set()
+            print("Cached API version for {} failed ({}), "
+                  "reconnecting".format(mvip, error_name(e)))
+            invalidate(mvip, user, cache_path)
+            fresh = _probe(mvip, user, password, cache_path)
+            # invalidate() dropped sfe, callers still hold it
+            with _clients_lock:
+                _clients.setdefault((mvip, user), sfe)
+            sfe._api_version = fresh.api_version
+            sfe.send_request = fresh.send_request
+            if (is_transient_error(e) and
+                    method_rule(method_name) != IDEMPOTENT):
+                raise
+            return fresh.send_request(method_name, *args, **kwargs)
+        checked.set()
+        return result
+
+    sfe.send_request = checked_send_request
+    return sfe
+
+
+def connect(mvip, user, password, ttl=DEFAULT_TTL, cache_path=CACHE_PATH):
+    """
+    Returns the Element client for (mvip, user), creating it on first use
+    A fresh cache entry skips the version probe, otherwise the version
+        negotiated by ElementFactory is saved for the next run
+    A connection or version error invalidates the entry and the connection
+        is made once more through ElementFactory
+    """
+    key = (mvip, user)
+    with _clients_lock:
+        if key in _clients:
+            return _clients[key]
+
+    # The SDK is only loaded once a connection is actually needed
+    from solidfire import Element
+
+    entry = cached_version(mvip, ttl, cache_path)
+    if entry is not None:
+        sfe = Element(mvip, user, password, entry["version"], False)
+        # Same read timeout ElementFactory.create() sets by default
+        sfe.timeout(30)
+        instrument(sfe, mvip)
+        _check_first_call(sfe, mvip, user, password, cache_path)
+    else:
+        try:
+            sfe = _probe(mvip, user, password, cache_path)
+        except Exception as e:
+            if not is_stale_error(e):
+                raise
+            invalidate(mvip, user, cache_path)
+            sfe = _probe(mvip, user, password, cache_path)
+
+    with _clients_lock:
+        return _clients.setdefault(key, sfe)
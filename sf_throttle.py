@@ -0,0 +1,249 @@
+#!/usr/local/bin/python
+# Written for Python 3.5 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module sets how many API calls are in flight against a cluster at once
+# Parallel provisioning against a single MVIP eventually pushes the cluster
+#   into xDBVersionMismatch errors and rising latency, so rather than a fixed
+#   worker count the limit is adjusted with AIMD (additive increase,
+#   multiplicative decrease) from what each call observed:
+#     a fast, successful call grows the limit by about one per window
+#     a slow call or an overload error cuts the limit by the decrease factor
+# A token bucket also caps the calls per second sent to each cluster
+# One limiter exists per cluster in a process, so the SDK scripts
+#   (ThrottledClient) and the raw JSON-RPC client (acquire_async) share it
+
+import threading
+import time
+from contextlib import contextmanager
+
+# JSON-RPC error names for a call the cluster rejected without applying it
+#   because it is busy, matched exactly
+OVERLOAD_ERRORS = ("xDBVersionMismatch",
+                   "xServiceUnavailable")
+# HTTP statuses with the same meaning
+OVERLOAD_STATUSES = (503,)
+
+DEFAULT_RATE = 25.0
+DEFAULT_MAX_LIMIT = 32
+
+
+def error_name(error):
+    """
+    The JSON-RPC error name of error, or its class name
+    """
+    # error_name on SDK ApiServerError, name on JsonRpcError
+    for attr in ("error_name", "name"):
+        value = getattr(error, attr, None)
+        if isinstance(value, str):
+            return value
+    return type(error).__name__
+
+
+def error_status(error):
+    """
+    The HTTP status of the response behind error, None if there was none
+    """
+    # status on aiohttp errors, response.status_code on requests errors
+    status = getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code",
+                         None)
+    if status is None and type(error).__name__ == "ApiServerError":
+        # The SDK turns an empty HTTP error response into an error object
+        #   with the status as its code
+        try:
+            status = error.error_code
+        except (AttributeError, TypeError, ValueError):
+            status = None
+    return status if isinstance(status, int) else None
+
+
+def is_overload_error(error):
+    return (error_name(error) in OVERLOAD_ERRORS or
+            error_status(error) in OVERLOAD_STATUSES)
+
+
+class TokenBucket(object):
+    """
+    Allows rate calls per second with bursts of up to burst calls
+    Not locked on its own, AdaptiveLimiter calls it under its lock
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self._tokens = self.burst
+        self._stamp = time.time()
+
+    def reserve(self):
+        """
+        Takes a token and returns 0, or returns the seconds until one is free
+        """
+        now = time.time()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+
+class AdaptiveLimiter(object):
+    """
+    AIMD concurrency limit for one cluster with a token bucket ceiling
+    target_latency is the per-call latency in seconds above which the
+        cluster is treated as overloaded, rate=None disables the bucket
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=DEFAULT_MAX_LIMIT,
+                 target_latency=2.0, increase=1.0, decrease=0.5,
+                 error_threshold=0.1, rate=DEFAULT_RATE, burst=None):
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.error_threshold = error_threshold
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.cuts = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters = []
+
+    def _try_acquire(self):
+        """
+        Returns 0 when a slot was taken, else the seconds worth waiting
+            for a token, or None when the concurrency limit is full
+        """
+        if self.in_flight >= int(self.limit):
+            return None
+        wait = self.bucket.reserve() if self.bucket else 0
+        if wait == 0:
+            self.in_flight += 1
+        return wait
+
+    def acquire(self):
+        """
+        Blocks until a call may start, returns its start time for release()
+        """
+        with self._cond:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    return time.time()
+                self._cond.wait(wait)
+
+    async def acquire_async(self):
+        """
+        acquire() for coroutines, waits on a future that release() wakes
+            instead of blocking the event loop
+        """
+        import asyncio
+        loop = asyncio.get_event_loop()
+        while True:
+            with self._cond:
+                wait = self._try_acquire()
+                if wait is None:
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+            if wait == 0:
+                return time.time()
+            if wait is None:
+                await waiter
+            else:
+                await asyncio.sleep(wait)
+
+    def release(self, started, error=None):
+        """
+        Ends a call and adjusts the limit from its latency and outcome
+        """
+        now = time.time()
+        latency = now - started
+        overloaded = error is not None and is_overload_error(error)
+        with self._cond:
+            self.in_flight -= 1
+            self.calls += 1
+            if error is not None:
+                self.errors += 1
+            self.latency_ewma = (latency if self.latency_ewma is None else
+                                 0.8 * self.latency_ewma + 0.2 * latency)
+            self.error_ewma = 0.9 * self.error_ewma + (0.1 if overloaded else 0.0)
+
+            if overloaded or latency > self.target_latency:
+                # Calls started before the last cut already saw the old limit
+                if started >= self._last_cut:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_cut = now
+                    self.cuts += 1
+            elif error is None and self.error_ewma < self.error_threshold:
+                self.limit = min(self.max_limit,
+                                 self.limit + self.increase / self.limit)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    @contextmanager
+    def slot(self):
+        started = self.acquire()
+        try:
+            yield
+        except Exception as e:
+            self.release(started, e)
+            raise
+        self.release(started)
+
+    def snapshot(self):
+        with self._cond:
+            return {"limit": round(self.limit, 2),
+                    "in_flight": self.in_flight,
+                    "calls": self.calls,
+                    "errors": self.errors,
+                    "cuts": self.cuts,
+                    "latency_ewma": self.latency_ewma}
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(mvip, **kwargs):
+    """
+    Returns the shared limiter for a cluster, kwargs only apply on creation
+    """
+    with _limiters_lock:
+        if mvip not in _limiters:
+            _limiters[mvip] = AdaptiveLimiter(**kwargs)
+        return _limiters[mvip]
+
+
+class ThrottledClient(object):
+    """
+    Wraps an Element SDK client so every API method runs under a limiter
+    """
+
+    def __init__(self, sfe, limiter):
+        self._sfe = sfe
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._sfe, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+
+        def throttled(*args, **kwargs):
+            with self.limiter.slot():
+                return attr(*args, **kwargs)
+        return throttled
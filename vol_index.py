@@ -0,0 +1,71 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module keeps a volume name to volume ID index for an Element connection
+# The index is built once per session and updated as volumes are created,
+#   so duplicate name checks are dictionary lookups instead of a scan of
+#   every volume on the cluster
+# Volume IDs only ever increase, so refresh() asks the cluster for volumes
+#   newer than the highest ID it has listed rather than the full inventory
+# Volumes added locally by create workers do not move that mark, another
+#   client may have created volumes with lower IDs in the meantime
+# refresh() can hand each volume it lists to a callback, so other checks
+#   such as the preflight's min IOPS tally share the one listing
+
+import threading
+from vol_listing import DEFAULT_PAGE_SIZE, iter_volumes
+
+
+class VolumeNameIndex(object):
+    """
+    Maps volume name to volume ID for one cluster
+    Safe to update from several create workers at once
+    """
+
+    def __init__(self, sfe, page_size=DEFAULT_PAGE_SIZE):
+        self._sfe = sfe
+        self._page_size = page_size
+        self._ids = {}
+        self._lock = threading.Lock()
+        # Highest volume ID seen in a listing, not by add()
+        self.listed_volume_id = 0
+
+    def refresh(self, on_volume=None):
+        """
+        Pulls volumes newer than listed_volume_id into the index
+        The first call pages through the whole inventory
+        on_volume, when given, is called with each SDK Volume listed
+        Returns the number of volumes added
+        """
+        added = 0
+        for vol in iter_volumes(self._sfe, self.listed_volume_id + 1,
+                                self._page_size):
+            self.add(vol.name, vol.volume_id)
+            with self._lock:
+                if vol.volume_id > self.listed_volume_id:
+                    self.listed_volume_id = vol.volume_id
+            if on_volume is not None:
+                on_volume(vol)
+            added += 1
+        return added
+
+    def add(self, name, volume_id):
+        """
+        Records a volume, the lowest ID wins if a name is used more than once
+        """
+        with self._lock:
+            if name not in self._ids or volume_id < self._ids[name]:
+                self._ids[name] = volume_id
+
+    def discard(self, name):
+        with self._lock:
+            self._ids.pop(name, None)
+
+    def get(self, name, default=None):
+        return self._ids.get(name, default)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __len__(self):
+        return len(self._ids)
@@ -0,0 +1,214 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module keeps a cluster's volume inventory in compact records
+# An SDK Volume carries every field ListVolumes returns, attributes, IQN,
+#   timestamps and nested model objects included, a VolumeRecord keeps only
+#   the ID, name, account, size, 512e, QoS, QoS policy, access and pair
+#   mode and state, in __slots__ so there is no per record dict
+# Records convert from SDK models (from_model) or from the raw JSON-RPC
+#   dicts rpc_stream yields (from_dict), so both paths share one inventory
+# An Inventory shares the QoS tuples and access and pair strings that repeat
+#   across volumes, indexes names and keeps the volume IDs in an array so ID
+#   ranges are found by bisection
+# 100,000 volumes take about 28MB this way, against about 260MB as SDK
+#   models, see bench_inventory.py
+
+import fnmatch
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import takewhile
+from vol_listing import DEFAULT_PAGE_SIZE, iter_volumes
+
+
+class VolumeRecord(object):
+    """
+    The fields of one volume the inventory work reads
+    qos is (min, max, burst) IOPS or None, qos_policy_id the QoS policy the
+        volume is bound to or None, pair_mode and pair_state are those of
+        the first volume pair, None if the volume is not paired and
+        "Unknown" if the pair has no remote replication details yet
+    """
+
+    __slots__ = ("volume_id", "name", "account_id", "total_size",
+                 "enable512e", "qos", "access", "pair_mode", "pair_state",
+                 "qos_policy_id")
+
+    def __init__(self, volume_id, name, account_id, total_size, enable512e,
+                 qos=None, access=None, pair_mode=None, pair_state=None,
+                 qos_policy_id=None):
+        self.volume_id = volume_id
+        self.name = name
+        self.account_id = account_id
+        self.total_size = total_size
+        self.enable512e = enable512e
+        self.qos = qos
+        self.access = access
+        self.pair_mode = pair_mode
+        self.pair_state = pair_state
+        self.qos_policy_id = qos_policy_id
+
+    @classmethod
+    def from_model(cls, vol):
+        """
+        Converts an SDK Volume from ListVolumes or ListActivePairedVolumes
+        """
+        qos = None
+        if vol.qos is not None:
+            qos = (vol.qos.min_iops, vol.qos.max_iops, vol.qos.burst_iops)
+        mode = state = None
+        for pair in vol.volume_pairs or []:
+            remote = pair.remote_replication
+            if remote is None:
+                mode = "Unknown"
+            else:
+                mode, state = remote.mode, remote.state
+            break
+        return cls(vol.volume_id, vol.name, vol.account_id, vol.total_size,
+                   vol.enable512e, qos, vol.access, mode, state,
+                   vol.qos_policy_id)
+
+    @classmethod
+    def from_dict(cls, raw):
+        """
+        Converts a volume dict from a decoded JSON-RPC list response
+        """
+        qos = raw.get("qos")
+        if qos is not None:
+            qos = (qos.get("minIOPS"), qos.get("maxIOPS"),
+                   qos.get("burstIOPS"))
+        mode = state = None
+        for pair in raw.get("volumePairs") or []:
+            remote = pair.get("remoteReplication")
+            if remote is None:
+                mode = "Unknown"
+            else:
+                mode, state = remote.get("mode"), remote.get("state")
+            break
+        return cls(raw["volumeID"], raw["name"], raw["accountID"],
+                   raw["totalSize"], raw.get("enable512e"), qos,
+                   raw.get("access"), mode, state, raw.get("qosPolicyID"))
+
+    @property
+    def paired(self):
+        return self.pair_mode is not None
+
+    def __repr__(self):
+        return "VolumeRecord({}, {!r}, account {}, size {}, qos {}, " \
+            "policy {}, {}, pair {}/{})".format(
+                self.volume_id, self.name, self.account_id, self.total_size,
+                self.qos, self.qos_policy_id, self.access, self.pair_mode,
+                self.pair_state)
+
+
+class Inventory(object):
+    """
+    VolumeRecords in the order added, with a name index
+    get() returns the first record added under a name, the lowest volume ID
+        when loaded from a listing
+    """
+
+    def __init__(self, records=()):
+        self.records = []
+        self._ids = array("q")
+        self._sorted = True
+        self._names = {}
+        self._shared = {}
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def load(cls, sfe, start_volume_id=1, page_size=DEFAULT_PAGE_SIZE,
+             last_volume_id=None):
+        """
+        Pages through ListVolumes, converting each volume as it arrives so
+            no more than a page of SDK models is held at a time
+        Paging stops past last_volume_id when it is given
+        """
+        volumes = iter_volumes(sfe, start_volume_id, page_size)
+        if last_volume_id is not None:
+            volumes = takewhile(lambda vol: vol.volume_id <= last_volume_id,
+                                volumes)
+        return cls(VolumeRecord.from_model(vol) for vol in volumes)
+
+    @classmethod
+    def from_models(cls, volumes):
+        """
+        Builds an inventory from SDK Volumes, such as ListDeletedVolumes
+            returns
+        """
+        return cls(VolumeRecord.from_model(vol) for vol in volumes)
+
+    @classmethod
+    def from_dicts(cls, volumes):
+        """
+        Builds an inventory from JSON-RPC volume dicts, such as the records
+            rpc_stream.stream_json_rpc() yields for ListVolumes
+        """
+        return cls(VolumeRecord.from_dict(raw) for raw in volumes)
+
+    def _share(self, value):
+        if value is None:
+            return None
+        return self._shared.setdefault(value, value)
+
+    def add(self, record):
+        record.qos = self._share(record.qos)
+        record.access = self._share(record.access)
+        record.pair_mode = self._share(record.pair_mode)
+        record.pair_state = self._share(record.pair_state)
+        if self._ids and record.volume_id < self._ids[-1]:
+            self._sorted = False
+        self._ids.append(record.volume_id)
+        self.records.append(record)
+        self._names.setdefault(record.name, record)
+        return record
+
+    def get(self, name, default=None):
+        return self._names.get(name, default)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def names(self):
+        return self._names.keys()
+
+    def _id_slice(self, ids):
+        first, last = ids
+        if not self._sorted:
+            return [record for record in self.records
+                    if record.volume_id >= first and
+                    (last is None or record.volume_id <= last)]
+        low = bisect_left(self._ids, first)
+        high = (len(self._ids) if last is None
+                else bisect_right(self._ids, last))
+        return self.records[low:high]
+
+    def filter(self, pattern=None, prefix=None, account=None, ids=None,
+               paired=None, volume_ids=None):
+        """
+        Returns the records matching every filter given
+        pattern is a shell style name pattern, ids a (first, last) volume ID
+            range with last None when open ended, paired True or False and
+            volume_ids a set of the volume IDs to keep
+        """
+        records = self.records if ids is None else self._id_slice(ids)
+        if volume_ids is not None:
+            records = [r for r in records if r.volume_id in volume_ids]
+        if account is not None:
+            records = [r for r in records if r.account_id == account]
+        if prefix is not None:
+            records = [r for r in records if r.name.startswith(prefix)]
+        if pattern is not None:
+            match = re.compile(fnmatch.translate(pattern)).match
+            records = [r for r in records if match(r.name)]
+        if paired is not None:
+            records = [r for r in records if r.paired == paired]
+        return list(records)
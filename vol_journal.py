@@ -0,0 +1,101 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module keeps an append-only checkpoint journal for bulk runs
+# Each completed step for a volume is one JSON line, written and fsynced
+#   before the run moves on, so after a crash the journal holds every step
+#   that finished
+# replay() folds the journal back into per-volume state so a resumed run
+#   can continue each volume from the step it stopped at
+# A line cut short by the crash is ignored, its step is redone on resume
+
+import json
+import os
+import re
+import threading
+import time
+
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".solidfire_vol_create",
+                           "journals")
+
+
+def journal_path(*parts):
+    """
+    Returns the default journal file for a run identified by parts
+    """
+    name = "_".join(re.sub(r"[^A-Za-z0-9.-]", "-", str(part))
+                    for part in parts)
+    return os.path.join(JOURNAL_DIR, name + ".jsonl")
+
+
+class VolumeState(object):
+    """
+    What the journal says about one volume
+    steps is the set of completed steps, fields the latest value of every
+        field recorded with them, stamps the time each step completed
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.steps = set()
+        self.fields = {}
+        self.stamps = {}
+
+
+def replay(path):
+    """
+    Returns a dict of volume name to VolumeState from a journal file,
+        empty if the file does not exist
+    """
+    states = {}
+    try:
+        jf = open(path)
+    except (IOError, OSError):
+        return states
+    with jf:
+        for text in jf:
+            try:
+                rec = json.loads(text)
+            except ValueError:
+                continue
+            state = states.get(rec["name"])
+            if state is None:
+                state = states[rec["name"]] = VolumeState(rec["name"])
+            state.steps.add(rec["step"])
+            state.stamps[rec["step"]] = rec["time"]
+            state.fields.update(rec.get("fields", {}))
+    return states
+
+
+class Journal(object):
+    """
+    Appends step records to path, safe to share between worker threads
+    """
+
+    def __init__(self, path):
+        journal_dir = os.path.dirname(path)
+        if journal_dir and not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+        self.path = path
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+        # End a line cut short by a crash so the next record starts clean
+        if self._file.tell() > 0:
+            with open(path, "rb") as jf:
+                jf.seek(-1, os.SEEK_END)
+                if jf.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def record(self, name, step, **fields):
+        line = json.dumps({"name": name,
+                           "step": step,
+                           "time": time.time(),
+                           "fields": fields}) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,47 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module pages through volume listings instead of loading them whole
+# Each generator asks the cluster for page_size volumes at a time using
+#   startVolumeID/limit and yields them one by one, so memory stays flat
+#   however big the cluster is and a caller can stop as soon as it has
+#   found what it needs without fetching the remaining pages
+
+DEFAULT_PAGE_SIZE = 1000
+
+
+def _iter_pages(list_call, start_volume_id, page_size):
+    while True:
+        page = list_call(start_volume_id=start_volume_id, limit=page_size).volumes
+        for vol in page:
+            yield vol
+        if len(page) < page_size:
+            return
+        start_volume_id = page[-1].volume_id + 1
+
+
+def iter_volumes(sfe, start_volume_id=1, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Yields every volume from ListVolumes with a volume ID >= start_volume_id
+    """
+    return _iter_pages(sfe.list_volumes, start_volume_id, page_size)
+
+
+def iter_active_paired_volumes(sfe, start_volume_id=1,
+                               page_size=DEFAULT_PAGE_SIZE):
+    """
+    Yields every volume from ListActivePairedVolumes with a volume ID
+        >= start_volume_id
+    """
+    return _iter_pages(sfe.list_active_paired_volumes, start_volume_id,
+                       page_size)
+
+
+def find_volume(sfe, vol_name, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Returns the first volume named vol_name or None, stops paging on a match
+    """
+    for vol in iter_volumes(sfe, page_size=page_size):
+        if vol.name == vol_name:
+            return vol
+    return None
@@ -0,0 +1,111 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module reads a volume manifest for batch volume creation
+# A manifest is either a CSV file with a header row or a JSONL file
+#   (one JSON object per line), selected by the file extension
+# Each row describes one volume with the following fields:
+#   name, account, size, enable512e, min_iops, max_iops, burst_iops
+# The QoS fields are optional, leave all three empty to use default QoS
+# An optional tier column names a QoS tier from qos_catalog instead, the
+#   volume is created on the tier's QoS policy and the row takes the
+#   tier's IOPS for capacity planning
+# example CSV row: myvol1,1,1073741824,false,500,1000,5000
+# The rows are checked by vol_validate, all of them before any is used
+
+import csv
+import json
+from collections import namedtuple
+from vol_validate import validate_rows
+
+MANIFEST_FIELDS = ("name", "account", "size", "enable512e",
+                   "min_iops", "max_iops", "burst_iops")
+
+
+class VolumeRequest(namedtuple("VolumeRequest",
+                               ("line",) + MANIFEST_FIELDS + ("tier",))):
+    """
+    One validated manifest row, line is the source line for reporting
+    tier is the QoS tier name or None
+    """
+    __slots__ = ()
+
+    @property
+    def has_qos(self):
+        return self.min_iops is not None
+
+
+# Rows are validated without a tier
+VolumeRequest.__new__.__defaults__ = (None,)
+
+
+def read_manifest(path):
+    """
+    Returns a list of (line, raw row dict) tuples from a CSV or JSONL file
+    """
+    rows = []
+    with open(path, newline="") as mf:
+        if path.lower().endswith((".jsonl", ".json")):
+            for line, text in enumerate(mf, 1):
+                if not text.strip():
+                    continue
+                try:
+                    raw = json.loads(text)
+                except ValueError as e:
+                    raw = {"_error": "invalid JSON: {}".format(e)}
+                if not isinstance(raw, dict):
+                    raw = {"_error": "row must be a JSON object"}
+                rows.append((line, raw))
+        else:
+            # Line 1 is the header row
+            for line, raw in enumerate(csv.DictReader(mf), 2):
+                rows.append((line, raw))
+    return rows
+
+
+def tier_column(rows, errors):
+    """
+    Returns a dict of line to tier name for the rows that set a tier,
+        adding an error for unknown tiers and tiers set with inline QoS
+    """
+    tier_by_line = {}
+    for line, raw in rows:
+        tier = raw.get("tier")
+        if tier is None or (isinstance(tier, str) and not tier.strip()):
+            continue
+        tier_by_line[line] = tier.strip() if isinstance(tier, str) else tier
+    if not tier_by_line:
+        return tier_by_line
+    from qos_catalog import tiers
+    catalog = tiers()
+    inline = set(line for line, raw in rows
+                 if any(raw.get(field) not in (None, "")
+                        for field in MANIFEST_FIELDS[4:]))
+    for line, tier in sorted(tier_by_line.items()):
+        if tier not in catalog:
+            errors.append("line {}: tier must be one of {}, got {!r}".format(
+                line, ", ".join(sorted(catalog)), tier))
+        elif line in inline:
+            errors.append("line {}: set a tier or min_iops, max_iops and "
+                          "burst_iops, not both".format(line))
+    return tier_by_line
+
+
+def load_manifest(path):
+    """
+    Reads and validates every row of the manifest up front
+    Returns (requests, errors) where errors is a list of "line N: message"
+        strings covering every bad row, including duplicate names
+    """
+    rows = read_manifest(path)
+    reqs, errors = validate_rows(rows, VolumeRequest)
+    tier_by_line = tier_column(rows, errors)
+    if tier_by_line and not errors:
+        from qos_catalog import tiers
+        catalog = tiers()
+        reqs = [req._replace(tier=tier_by_line[req.line],
+                             min_iops=catalog[tier_by_line[req.line]][0],
+                             max_iops=catalog[tier_by_line[req.line]][1],
+                             burst_iops=catalog[tier_by_line[req.line]][2])
+                if req.line in tier_by_line else req for req in reqs]
+    return reqs, errors
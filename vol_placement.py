@@ -0,0 +1,137 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module places a batch of volumes across a fleet of clusters
+# survey() connects to every cluster at once and gathers, per cluster, the
+#   capacity and guaranteed QoS load from the preflight, the accounts and
+#   the existing volume names
+# Account IDs are local to a cluster, so a manifest's account IDs are those
+#   of the first cluster, the home cluster, and each one is matched on the
+#   other clusters by the username it has there, never by its ID
+# place() then hands each volume to the cluster holding its account with
+#   the most headroom left once the volume is added, headroom being the
+#   smaller of the free provisioned space and free min IOPS fractions, and
+#   rewrites its account to that cluster's ID for the username
+# Volumes are placed largest first, so the big ones are spread before the
+#   small ones fill the gaps, and a volume that fits nowhere is an error
+
+from concurrent.futures import ThreadPoolExecutor
+from vol_index import VolumeNameIndex
+from vol_preflight import DEFAULT_MIN_IOPS, MinIopsTally, preflight
+
+
+class ClusterLoad(object):
+    """
+    What survey() found on one cluster, updated by place() as volumes
+        are assigned to it
+    """
+
+    def __init__(self, cluster, sfe, plan, accounts, names):
+        # accounts maps username to account ID on this cluster
+        self.cluster = cluster
+        self.sfe = sfe
+        self.plan = plan
+        self.accounts = accounts
+        self.names = names
+        self.placed = []
+        self.placed_bytes = 0
+        self.placed_min_iops = 0
+
+    def free_space(self):
+        return (self.plan.max_provisioned_space - self.plan.provisioned_space -
+                self.placed_bytes)
+
+    def free_min_iops(self):
+        return (self.plan.max_iops - self.plan.guaranteed_min_iops -
+                self.placed_min_iops)
+
+    def headroom(self, size=0, min_iops=0):
+        """
+        Returns the fraction of space or IOPS left, whichever is smaller,
+            after adding a volume, negative if it would not fit
+        A limit the cluster does not report is treated as unlimited
+        """
+        fractions = [1.0]
+        if self.plan.max_provisioned_space:
+            fractions.append(float(self.free_space() - size) /
+                             self.plan.max_provisioned_space)
+        if self.plan.max_iops:
+            fractions.append(float(self.free_min_iops() - min_iops) /
+                             self.plan.max_iops)
+        return min(fractions)
+
+    def assign(self, req, min_iops):
+        self.placed.append(req)
+        self.placed_bytes += req.size
+        self.placed_min_iops += min_iops
+
+
+def _survey_one(cluster, connect):
+    sfe = connect(cluster)
+    names = VolumeNameIndex(sfe)
+    tally = MinIopsTally()
+    names.refresh(on_volume=tally.add)
+    plan = preflight(sfe, cluster, [], tally=tally)
+    accounts = dict((acct.username, acct.account_id)
+                    for acct in sfe.list_accounts().accounts)
+    return ClusterLoad(cluster, sfe, plan, accounts, names)
+
+
+def survey(clusters, connect):
+    """
+    Returns a ClusterLoad for every cluster, gathered in parallel
+    connect(cluster) returns the Element connection to use for it
+    """
+    with ThreadPoolExecutor(max_workers=len(clusters)) as pool:
+        return list(pool.map(lambda cluster: _survey_one(cluster, connect),
+                             clusters))
+
+
+def place(reqs, loads):
+    """
+    Assigns every request to one of loads, the first being the home
+        cluster whose account IDs the requests use
+    Returns a list of "line N: message" errors for requests that could not
+        be placed, the placed requests are in each load's placed list in
+        manifest order with the account ID of their cluster
+    """
+    errors = []
+    home = loads[0]
+    usernames = dict((account_id, username)
+                     for username, account_id in home.accounts.items())
+    for req in reqs:
+        for load in loads:
+            if req.name in load.names:
+                errors.append("line {}: duplicate volume name {} exists on "
+                              "{}".format(req.line, req.name, load.cluster))
+    if errors:
+        return errors
+
+    for req in sorted(reqs, key=lambda req: (-req.size, req.line)):
+        min_iops = DEFAULT_MIN_IOPS if req.min_iops is None else req.min_iops
+        username = usernames.get(req.account)
+        if username is None:
+            errors.append("line {}: account ID {} does not exist on {}".format(
+                req.line, req.account, home.cluster))
+            continue
+        candidates = [load for load in loads if username in load.accounts]
+        best = max(candidates, key=lambda load: load.headroom(req.size,
+                                                              min_iops))
+        if best.headroom(req.size, min_iops) < 0:
+            errors.append("line {}: no cluster with account {} has room "
+                          "for {} bytes and {} min IOPS".format(
+                              req.line, username, req.size, min_iops))
+            continue
+        best.assign(req._replace(account=best.accounts[username]), min_iops)
+    for load in loads:
+        load.placed.sort(key=lambda req: req.line)
+    return errors
+
+
+def print_placement(loads):
+    for load in loads:
+        print("{}: {} volumes, {} bytes, {} min IOPS, "
+              "{:.1f}% headroom left".format(load.cluster, len(load.placed),
+                                             load.placed_bytes,
+                                             load.placed_min_iops,
+                                             100.0 * load.headroom()))
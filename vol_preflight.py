@@ -0,0 +1,168 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module checks that a cluster can take a batch before it is created
+# One GetClusterCapacity call gives the provisioned space limit, the used
+#   space, the IOPS the cluster can deliver and the block counts the
+#   efficiency ratios come from, one pass of ListVolumes gives the min IOPS
+#   already guaranteed to existing volumes, unless the caller passes a
+#   MinIopsTally that already summed them during its own listing, such as
+#   VolumeNameIndex.refresh(on_volume=tally.add)
+# The batch fails preflight if its total size would go past the cluster's
+#   provisioned space limit or its min IOPS would raise the guaranteed total
+#   past the cluster's max IOPS
+# A warning is printed if the batch, once filled and reduced by the current
+#   dedup and compression ratios, would take used space past the limit
+
+from vol_listing import DEFAULT_PAGE_SIZE, iter_volumes
+
+BLOCK_SIZE = 4096
+# minIOPS Element gives a volume created without QoS
+DEFAULT_MIN_IOPS = 50
+
+
+def _ratio(numerator, denominator):
+    if not numerator or not denominator:
+        return 1.0
+    return float(numerator) / denominator
+
+
+def efficiency(cap):
+    """
+    Returns the thin provisioning, dedup, compression and overall ratios
+        from a ClusterCapacity, the same calculations as the Element UI
+    """
+    thin = _ratio((cap.non_zero_blocks or 0) + (cap.zero_blocks or 0),
+                  cap.non_zero_blocks)
+    dedup = _ratio((cap.non_zero_blocks or 0) +
+                   (cap.snapshot_non_zero_blocks or 0),
+                   cap.unique_blocks)
+    compression = _ratio((cap.unique_blocks or 0) * BLOCK_SIZE,
+                         (cap.unique_blocks_used_space or 0) * 0.93)
+    return {"thin_provisioning": thin,
+            "deduplication": dedup,
+            "compression": compression,
+            "overall": thin * dedup * compression}
+
+
+def volume_min_iops(vol):
+    if vol.qos is None:
+        return 0
+    return vol.qos.min_iops or 0
+
+
+class MinIopsTally(object):
+    """
+    Sums the min IOPS guaranteed to the volumes passed to add()
+    """
+
+    def __init__(self):
+        self.total = 0
+
+    def add(self, vol):
+        self.total += volume_min_iops(vol)
+
+
+class CapacityPlan(object):
+    """
+    Result of preflight() for one cluster
+    errors make the batch not fit, warnings are printed but allowed
+    """
+
+    def __init__(self, cluster, volumes, requested_bytes, requested_min_iops):
+        self.cluster = cluster
+        self.volumes = volumes
+        self.requested_bytes = requested_bytes
+        self.requested_min_iops = requested_min_iops
+        self.provisioned_space = 0
+        self.max_provisioned_space = 0
+        self.used_space = 0
+        self.max_used_space = 0
+        self.guaranteed_min_iops = 0
+        self.max_iops = 0
+        self.efficiency = {}
+        self.errors = []
+        self.warnings = []
+
+    @property
+    def fits(self):
+        return not self.errors
+
+
+def preflight(sfe, cluster, requests, page_size=DEFAULT_PAGE_SIZE,
+              tally=None):
+    """
+    Projects whether a batch fits on the cluster sfe is connected to
+    requests is a list of (size in bytes, min IOPS or None for default QoS)
+    tally, a MinIopsTally fed every volume of the cluster, saves listing it
+    """
+    requested_bytes = sum(size for size, _ in requests)
+    requested_min_iops = sum(DEFAULT_MIN_IOPS if min_iops is None
+                             else min_iops for _, min_iops in requests)
+    plan = CapacityPlan(cluster, len(requests), requested_bytes,
+                        requested_min_iops)
+
+    cap = sfe.get_cluster_capacity().cluster_capacity
+    plan.provisioned_space = cap.provisioned_space or 0
+    plan.max_provisioned_space = cap.max_provisioned_space or 0
+    plan.used_space = cap.used_space or 0
+    plan.max_used_space = cap.max_used_space or 0
+    plan.max_iops = cap.max_iops or 0
+    plan.efficiency = efficiency(cap)
+    if tally is None:
+        tally = MinIopsTally()
+        for vol in iter_volumes(sfe, page_size=page_size):
+            tally.add(vol)
+    plan.guaranteed_min_iops = tally.total
+
+    projected = plan.provisioned_space + requested_bytes
+    if plan.max_provisioned_space and projected > plan.max_provisioned_space:
+        plan.errors.append(
+            "{} bytes requested, only {} of {} provisionable bytes are "
+            "free".format(requested_bytes,
+                          max(0, plan.max_provisioned_space -
+                              plan.provisioned_space),
+                          plan.max_provisioned_space))
+
+    guaranteed = plan.guaranteed_min_iops + requested_min_iops
+    if plan.max_iops and guaranteed > plan.max_iops:
+        plan.errors.append(
+            "{} min IOPS requested on top of {} already guaranteed, the "
+            "cluster delivers {} IOPS".format(requested_min_iops,
+                                              plan.guaranteed_min_iops,
+                                              plan.max_iops))
+
+    reduction = (plan.efficiency["deduplication"] *
+                 plan.efficiency["compression"])
+    filled = plan.used_space + requested_bytes / reduction
+    if plan.max_used_space and filled > plan.max_used_space:
+        plan.warnings.append(
+            "filled at the current {:.2f}x data reduction the batch would "
+            "use {:.0f} of {} bytes".format(reduction, filled,
+                                           plan.max_used_space))
+    return plan
+
+
+def print_plan(plan):
+    print("Preflight {}: {} volumes, {} bytes, {} min IOPS".format(
+        plan.cluster, plan.volumes, plan.requested_bytes,
+        plan.requested_min_iops))
+    if plan.max_provisioned_space:
+        print("  provisioned space {} -> {} of {} ({:.1f}%)".format(
+            plan.provisioned_space,
+            plan.provisioned_space + plan.requested_bytes,
+            plan.max_provisioned_space,
+            100.0 * (plan.provisioned_space + plan.requested_bytes) /
+            plan.max_provisioned_space))
+    if plan.max_iops:
+        print("  guaranteed min IOPS {} -> {} of {}".format(
+            plan.guaranteed_min_iops,
+            plan.guaranteed_min_iops + plan.requested_min_iops,
+            plan.max_iops))
+    print("  efficiency: thin {thin_provisioning:.2f}x, dedup "
+          "{deduplication:.2f}x, compression {compression:.2f}x, "
+          "overall {overall:.2f}x".format(**plan.efficiency))
+    for warning in plan.warnings:
+        print("  WARNING {}".format(warning))
+    for error in plan.errors:
+        print("  FAILED {}".format(error))
@@ -0,0 +1,252 @@
+#!/usr/local/bin/python
+# Written for Python 3.5 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script sets new QoS on many volumes at once, to move them between
+#   performance tiers
+# Volumes are selected by any mix of a name pattern (-p, shell style),
+#   an account (-a) and a volume ID range (-r), all given filters must match
+# One paged pass of ListVolumes, starting at the range's first ID and
+#   stopping past its last, loads them into a vol_inventory Inventory whose
+#   filter() picks them, volumes already at the new QoS are left out
+# Volumes bound to a QoS policy, such as a qos_catalog tier, are skipped and
+#   listed, setting inline QoS would take them off the policy, so later
+#   policy changes would no longer reach them
+# --override-policy retiers them anyway and unbinds them from the policy
+# The rest are changed with ModifyVolumes, -c volumes per call, so
+#   retiering 10,000 volumes takes 20 calls rather than 10,000
+# --plan lists what would change without changing anything
+# usage: python vol_qos.py -sm <MVIP> -su <USER> -sp <PASSWORD> [-p pattern] [-a account] [-r first-last] -n <min> -x <max> -b <burst> [-c chunk] [--plan] [--override-policy]
+# example python vol_qos.py -sm sf-mvip -su admin -sp Netapp1! -p "tenant1-*" -n 1000 -x 5000 -b 8000
+
+import sys
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from vol_inventory import Inventory
+import sf_session
+from sf_throttle import DEFAULT_RATE, ThrottledClient, limiter_for
+from sf_retry import default_policy as retry
+from sf_audit import get_log, redact_args
+from vol_validate import (BURST_QOS_RANGE, MAX_QOS_RANGE, MIN_QOS_RANGE,
+                          bounded_int)
+
+DEFAULT_CHUNK = 500
+
+
+def id_range(value):
+    """
+    argparse type for a volume ID range, FIRST-LAST, FIRST- or -LAST
+    Returns (first, last) with last None when open ended
+    """
+    first, sep, last = value.partition("-")
+    try:
+        if not sep:
+            raise ValueError
+        first = int(first) if first.strip() else 1
+        last = int(last) if last.strip() else None
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "invalid volume ID range {!r}, use FIRST-LAST, FIRST- or "
+            "-LAST".format(value))
+    if first < 1 or (last is not None and last < first):
+        raise argparse.ArgumentTypeError(
+            "volume ID range {!r} is empty".format(value))
+    return first, last
+
+
+def select_volumes(sfe, pattern=None, account=None, ids=None):
+    """
+    Returns the inventory records of the volumes matching every filter given
+    """
+    first, last = ids or (1, None)
+    inventory = Inventory.load(sfe, first, last_volume_id=last)
+    return inventory.filter(pattern=pattern, account=account)
+
+
+def needs_change(vol, min_iops, max_iops, burst_iops):
+    return vol.qos != (min_iops, max_iops, burst_iops)
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def describe_ids(ids):
+    return "{}".format(ids[0]) if len(ids) == 1 else "{}..{}".format(
+        min(ids), max(ids))
+
+
+def modify_chunk(sfe, vol_ids, qos, unbind=False):
+    """
+    Returns (volume IDs, error, elapsed seconds) for one ModifyVolumes call
+    unbind also takes the volumes off their QoS policy
+    """
+    start = time.time()
+    extra = {"associate_with_qos_policy": False} if unbind else {}
+    try:
+        retry.call("ModifyVolumes", sfe.modify_volumes, vol_ids, qos=qos,
+                   **extra)
+        return vol_ids, None, time.time() - start
+    except Exception as e:
+        return vol_ids, str(e), time.time() - start
+
+
+def apply_qos(sfe, vol_ids, min_iops, max_iops, burst_iops, chunk, workers,
+              unbind=False):
+    """
+    Sets the QoS on every volume in vol_ids with ModifyVolumes calls of at
+        most chunk volumes, workers calls at a time
+    unbind is for volumes bound to a QoS policy, it takes them off it
+    Returns the number of volumes whose call failed
+    """
+    from solidfire.models import QoS
+    qos = QoS(min_iops=min_iops, max_iops=max_iops, burst_iops=burst_iops)
+    audit = get_log()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(modify_chunk, sfe, ids, qos, unbind)
+                   for ids in chunked(vol_ids, chunk)]
+        for future in as_completed(futures):
+            ids, err, elapsed = future.result()
+            audit.record("result", volume_ids=ids, error=err,
+                         elapsed=elapsed)
+            if err is None:
+                print("modified volumes {} ({}) in {:.2f}s".format(
+                    describe_ids(ids), len(ids), elapsed))
+            else:
+                failed += len(ids)
+                print("FAILED volumes {} ({}) after {:.2f}s: {}".format(
+                    describe_ids(ids), len(ids), elapsed, err))
+    return failed
+
+
+def add_arguments(parser):
+    parser.add_argument('-sm', type=str,
+                        required=True,
+                        metavar='mvip',
+                        help='MVIP/node name or IP')
+    parser.add_argument('-su', type=str,
+                        required=True,
+                        metavar='username',
+                        help='username to connect with')
+    parser.add_argument('-sp', type=str,
+                        required=True,
+                        metavar='password',
+                        help='password for user')
+    parser.add_argument('-p', type=str,
+                        required=False,
+                        metavar='pattern',
+                        help='volume name pattern, * and ? wildcards')
+    parser.add_argument('-a', type=int,
+                        required=False,
+                        metavar='account',
+                        help='only volumes of this account ID')
+    parser.add_argument('-r', type=id_range,
+                        required=False,
+                        metavar='first-last',
+                        help='only volume IDs in this range, either end may '
+                        'be left open')
+    parser.add_argument('-n', type=bounded_int(*MIN_QOS_RANGE),
+                        required=True,
+                        metavar='min QoS',
+                        help='min QoS between 50 and 15000')
+    parser.add_argument('-x', type=bounded_int(*MAX_QOS_RANGE),
+                        required=True,
+                        metavar='max QoS',
+                        help='max QoS between 100 and 200000')
+    parser.add_argument('-b', type=bounded_int(*BURST_QOS_RANGE),
+                        required=True,
+                        metavar='burst QoS',
+                        help='burst QoS between 100 and 200000')
+    parser.add_argument('-c', type=bounded_int(1, DEFAULT_CHUNK),
+                        default=DEFAULT_CHUNK,
+                        required=False,
+                        metavar='chunk',
+                        help='volumes per ModifyVolumes call, at most and '
+                        'default {}'.format(DEFAULT_CHUNK))
+    parser.add_argument('--plan', action='store_true',
+                        help='list the volumes that would change and exit')
+    parser.add_argument('--override-policy', action='store_true',
+                        help='also retier volumes bound to a QoS policy, '
+                        'taking them off it')
+    parser.add_argument('-w', type=int,
+                        default=2,
+                        required=False,
+                        metavar='workers',
+                        help='ModifyVolumes calls at the same time, default 2')
+    parser.add_argument('-l', type=float,
+                        default=DEFAULT_RATE,
+                        required=False,
+                        metavar='rate',
+                        help='most API calls per second to the cluster, '
+                        'default {}'.format(DEFAULT_RATE))
+
+
+def parse_inputs():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    return parser.parse_args()
+
+
+def run(args):
+    if args.p is None and args.a is None and args.r is None:
+        sys.exit("select volumes with at least one of -p, -a or -r")
+    if not args.n <= args.x <= args.b:
+        sys.exit("QoS must satisfy min <= max <= burst, got {}/{}/{}".format(
+            args.n, args.x, args.b))
+    if args.w < 1:
+        sys.exit("-w must be at least 1")
+
+    audit = get_log()
+    audit.record("request", script="vol_qos", args=redact_args(args))
+
+    start = time.time()
+    sfe = ThrottledClient(sf_session.connect(args.sm, args.su, args.sp),
+                          limiter_for(args.sm, max_limit=args.w, rate=args.l))
+    matched = 0
+    todo = []
+    skipped = []
+    for vol in select_volumes(sfe, args.p, args.a, args.r):
+        matched += 1
+        bound = vol.qos_policy_id is not None
+        if bound and not args.override_policy:
+            skipped.append(vol.volume_id)
+            print("= {} ({}): on QoS policy {}, skipped".format(
+                vol.name, vol.volume_id, vol.qos_policy_id))
+        elif bound or needs_change(vol, args.n, args.x, args.b):
+            todo.append(vol.volume_id)
+            if args.plan:
+                print("~ {} ({}): qos {}{} -> ({}, {}, {})".format(
+                    vol.name, vol.volume_id, vol.qos,
+                    " on QoS policy {}".format(vol.qos_policy_id)
+                    if bound else "", args.n, args.x, args.b))
+    calls = -(-len(todo) // args.c)
+    print("{} volumes matched, {} to change in {} ModifyVolumes calls, "
+          "{} already at {}/{}/{}".format(
+              matched, len(todo), calls, matched - len(todo) - len(skipped),
+              args.n, args.x, args.b))
+    if skipped:
+        print("{} volumes on a QoS policy were skipped, retier them through "
+              "their policy or use --override-policy".format(len(skipped)))
+    audit.record("plan", matched=matched, changes=len(todo), calls=calls,
+                 skipped=skipped)
+    if args.plan or not todo:
+        return
+
+    failed = apply_qos(sfe, todo, args.n, args.x, args.b, args.c, args.w,
+                       unbind=args.override_policy)
+    print("{} of {} volumes retiered in {:.2f}s".format(
+        len(todo) - failed, len(todo), time.time() - start))
+    print("Retries: {}".format(retry.snapshot()))
+    audit.record("summary", changed=len(todo) - failed, failed=failed,
+                 elapsed=time.time() - start)
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    run(parse_inputs())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+#!/usr/local/bin/python
+# Written for Python 3.5 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script makes a cluster match a desired-state file of volumes
+# The desired-state file is a volume manifest (see vol_manifest.py) with an
+#   optional replication column of sync, async or snap for volumes that
+#   must be paired to the -dm cluster
+# Actual state is read with one paged pass of ListVolumes per cluster into
+#   compact vol_inventory records, both sides are indexed by name with a
+#   fingerprint of the managed fields, so only volumes whose fingerprints
+#   differ are compared field by field
+# The diff is applied as the fewest operations:
+#   +  create  the volume does not exist
+#   ~  modify  account, size (grow only) or QoS differ, one ModifyVolume
+#   >  pair    replication is wanted and the volume is not paired
+#   !  conflict, a difference no API call can fix (shrinking a volume,
+#              changing 512e or the mode of an existing pair, or a volume
+#              of the same name on -dm that cannot be the pair's target),
+#              reported only
+# A destination volume of the same name is only reused as the target when
+#   it is unpaired with the same account, size and 512e, and when it is
+#   still readWrite only if it holds no data
+# Volumes on the cluster that are not in the file are counted, never touched
+# --plan prints the diff and exits without changing anything
+# usage: python vol_reconcile.py -sm <MVIP> -su <USER> -sp <PASSWORD> -f <desired state> [-dm <MVIP> -du <USER> -dp <PASSWORD>] [--plan] [-w workers]
+# example python vol_reconcile.py -sm sf-mvip -su admin -sp Netapp1! -f tenant1.jsonl --plan
+
+import sys
+import argparse
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from vol_manifest import VolumeRequest, read_manifest
+from vol_validate import validate_rows
+from vol_inventory import Inventory
+import sf_session
+from sf_throttle import DEFAULT_RATE, ThrottledClient, limiter_for
+from sf_retry import default_policy as retry
+from sf_audit import get_log, redact_args
+
+REPLICATION_MODES = {"sync": "Sync", "async": "Async", "snap": "SnapshotsOnly"}
+# Element rounds totalSize up, sizes this close are the same volume size
+SIZE_SLACK = 1024 * 1024
+
+CREATE = "create"
+MODIFY = "modify"
+PAIR = "pair"
+CONFLICT = "conflict"
+SYMBOLS = {CREATE: "+", MODIFY: "~", PAIR: ">", CONFLICT: "!"}
+
+Change = namedtuple("Change", ("kind", "name", "want", "have", "details"))
+
+
+class DesiredVolume(namedtuple("DesiredVolume", VolumeRequest._fields +
+                               ("replication",))):
+    """
+    One volume of the desired state, replication is a pairing mode or None
+    """
+    __slots__ = ()
+
+    @property
+    def has_qos(self):
+        return self.min_iops is not None
+
+
+def load_desired(path):
+    """
+    Reads and validates the desired-state file
+    Returns (volumes, errors) in the same form as load_manifest()
+    """
+    rows = read_manifest(path)
+    parsed, errors = validate_rows(rows)
+    modes = {}
+    for line, raw in rows:
+        if raw.get("tier") not in (None, ""):
+            errors.append("line {}: tier is not supported in a desired-state "
+                          "file, set min_iops, max_iops and "
+                          "burst_iops".format(line))
+        mode = raw.get("replication")
+        if mode is None or (isinstance(mode, str) and not mode.strip()):
+            continue
+        if not isinstance(mode, str) or mode.strip().lower() not in REPLICATION_MODES:
+            errors.append("line {}: replication must be one of {}, got "
+                          "{!r}".format(line, ", ".join(REPLICATION_MODES), mode))
+            continue
+        modes[line] = REPLICATION_MODES[mode.strip().lower()]
+    volumes = [DesiredVolume(*(row + (None, modes.get(row[0]))))
+               for row in parsed]
+    return volumes, errors
+
+
+def fingerprint(account, size, enable512e, qos, mode):
+    """
+    Hashable key of the managed fields, equal fingerprints need no
+        field by field comparison
+    """
+    return (account, -(-size // SIZE_SLACK), enable512e, qos, mode)
+
+
+def desired_fingerprint(want):
+    qos = ((want.min_iops, want.max_iops, want.burst_iops)
+           if want.has_qos else None)
+    return fingerprint(want.account, want.size, want.enable512e, qos,
+                       want.replication)
+
+
+def actual_fingerprint(vol, want):
+    # QoS and pairing only count when the desired state manages them
+    return fingerprint(vol.account_id, vol.total_size, vol.enable512e,
+                       vol.qos if want.has_qos else None,
+                       vol.pair_mode if want.replication else None)
+
+
+def index_volumes(sfe):
+    """
+    Returns an Inventory of every volume on the cluster, read in one pass
+    The lowest volume ID wins if a name is used more than once
+    """
+    return Inventory.load(sfe)
+
+
+def compare(want, have):
+    """
+    Returns the changes that turn the actual volume into the desired one
+    """
+    changes = []
+    modify = {}
+    conflicts = []
+    if have.account_id != want.account:
+        modify["account_id"] = (have.account_id, want.account)
+    if want.size > have.total_size:
+        modify["total_size"] = (have.total_size, want.size)
+    elif have.total_size - want.size >= SIZE_SLACK:
+        conflicts.append("size {} -> {} would shrink the volume".format(
+            have.total_size, want.size))
+    if have.enable512e != want.enable512e:
+        conflicts.append("enable512e {} -> {} cannot be changed".format(
+            have.enable512e, want.enable512e))
+    if want.has_qos:
+        qos = have.qos or (None, None, None)
+        wanted = (want.min_iops, want.max_iops, want.burst_iops)
+        if qos != wanted:
+            modify["qos"] = (qos, wanted)
+    if modify:
+        changes.append(Change(MODIFY, want.name, want, have, modify))
+    if want.replication:
+        mode = have.pair_mode
+        if mode is None:
+            changes.append(Change(PAIR, want.name, want, have,
+                                  {"mode": (None, want.replication)}))
+        elif mode != want.replication:
+            conflicts.append("pair mode {} -> {} cannot be changed".format(
+                mode, want.replication))
+    for conflict in conflicts:
+        changes.append(Change(CONFLICT, want.name, want, have, conflict))
+    return changes
+
+
+def reuse_conflict(want, dst):
+    """
+    Returns why the destination volume dst cannot become the replication
+        target for want, None if it can
+    """
+    problems = []
+    if dst.paired:
+        problems.append("is already paired")
+    if dst.account_id != want.account:
+        problems.append("belongs to account {}".format(dst.account_id))
+    if -(-dst.total_size // SIZE_SLACK) != -(-want.size // SIZE_SLACK):
+        problems.append("is {} bytes".format(dst.total_size))
+    if dst.enable512e != want.enable512e:
+        problems.append("has enable512e {}".format(dst.enable512e))
+    if not problems:
+        return None
+    return "destination volume {} {}, not reused as the pair " \
+        "target".format(dst.volume_id, ", ".join(problems))
+
+
+def plan_changes(desired, actual, dst_index=None):
+    """
+    Diffs the desired volumes against the name index of the cluster
+    A pair whose destination volume exists in dst_index but cannot be
+        reused is a conflict
+    Returns (changes, unchanged count)
+    """
+    changes = []
+    unchanged = 0
+    for want in desired:
+        have = actual.get(want.name)
+        if have is None:
+            changes.append(Change(CREATE, want.name, want, None, {}))
+            if want.replication:
+                changes.append(Change(PAIR, want.name, want, None,
+                                      {"mode": (None, want.replication)}))
+        elif desired_fingerprint(want) == actual_fingerprint(have, want):
+            unchanged += 1
+        else:
+            found = compare(want, have)
+            if found:
+                changes.extend(found)
+            else:
+                unchanged += 1
+    if dst_index is not None:
+        for i, change in enumerate(changes):
+            dst = dst_index.get(change.name) if change.kind == PAIR else None
+            conflict = dst is not None and reuse_conflict(change.want, dst)
+            if conflict:
+                changes[i] = Change(CONFLICT, change.name, change.want,
+                                    change.have, conflict)
+    return changes, unchanged
+
+
+def describe(change):
+    want = change.want
+    if change.kind == CREATE:
+        qos = ("qos {}/{}/{}".format(want.min_iops, want.max_iops,
+                                     want.burst_iops)
+               if want.has_qos else "default qos")
+        return "account {} size {} 512e {} {}".format(
+            want.account, want.size, want.enable512e, qos)
+    if change.kind == CONFLICT:
+        return change.details
+    return ", ".join("{} {} -> {}".format(field, old, new)
+                     for field, (old, new) in sorted(change.details.items()))
+
+
+def print_plan(changes, unchanged, unmanaged):
+    for change in changes:
+        print("{} {} {}: {}".format(SYMBOLS[change.kind], change.kind,
+                                    change.name, describe(change)))
+    counts = dict((kind, 0) for kind in SYMBOLS)
+    for change in changes:
+        counts[change.kind] += 1
+    print("{} to create, {} to modify, {} to pair, {} conflicts, "
+          "{} unchanged, {} on the cluster not in the desired state".format(
+              counts[CREATE], counts[MODIFY], counts[PAIR], counts[CONFLICT],
+              unchanged, unmanaged))
+
+
+def apply_create(sfe, change):
+    from solidfire.models import QoS
+    want = change.want
+    qos = None
+    if want.has_qos:
+        qos = QoS(min_iops=want.min_iops, max_iops=want.max_iops,
+                  burst_iops=want.burst_iops)
+    result = retry.call("CreateVolume", sfe.create_volume, want.name,
+                        want.account, want.size, want.enable512e, qos=qos)
+    return result.volume_id
+
+
+def apply_modify(sfe, change):
+    from solidfire.models import QoS
+    kwargs = {}
+    if "account_id" in change.details:
+        kwargs["account_id"] = change.want.account
+    if "total_size" in change.details:
+        kwargs["total_size"] = change.want.size
+    if "qos" in change.details:
+        kwargs["qos"] = QoS(min_iops=change.want.min_iops,
+                            max_iops=change.want.max_iops,
+                            burst_iops=change.want.burst_iops)
+    retry.call("ModifyVolume", sfe.modify_volume, change.have.volume_id,
+               **kwargs)
+
+
+def apply_pair(change, src_vol_id, dst_index, create_pool):
+    """
+    Pairs an existing source volume using the pairing script's pipeline,
+        reusing a destination volume of the same name if there is one
+    plan_changes() has checked the destination matches, a readWrite one
+        is refused here if it holds data
+    """
+    import create_vol_with_pairing_argparse_functions as pairing
+    want = change.want
+    pair = pairing.VolumePair(want.name)
+    pair.src_vol_id = src_vol_id
+    pair.steps.add("src_created")
+    dst = dst_index.get(want.name)
+    if dst is not None:
+        if dst.access != "replicationTarget":
+            stats = retry.call("GetVolumeStats",
+                               pairing.sfe_dst.get_volume_stats,
+                               dst.volume_id).volume_stats
+            if stats.non_zero_blocks:
+                raise ValueError("destination volume {} is readWrite and "
+                                 "holds data, not reused as the pair "
+                                 "target".format(dst.volume_id))
+        pair.dst_vol_id = dst.volume_id
+        pair.steps.add("dst_created")
+        if dst.access == "replicationTarget":
+            pair.steps.add("dst_modified")
+    pairing.provision_pair(pair, want.account, want.size, want.enable512e,
+                           want.replication, create_pool)
+
+
+def apply_changes(sfe_src, sfe_dst, changes, dst_index, workers):
+    """
+    Applies the changes, creates and modifies first, then pairing
+    Returns the number of failed changes
+    """
+    audit = get_log()
+    failed = 0
+    created = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for change in changes:
+            if change.kind == CREATE:
+                futures[pool.submit(apply_create, sfe_src, change)] = change
+            elif change.kind == MODIFY:
+                futures[pool.submit(apply_modify, sfe_src, change)] = change
+        for future in as_completed(futures):
+            change = futures[future]
+            try:
+                vol_id = future.result()
+            except Exception as e:
+                failed += 1
+                print("FAILED {} {}: {}".format(change.kind, change.name, e))
+                audit.record("result", action=change.kind, name=change.name,
+                             error=str(e))
+                continue
+            if change.kind == CREATE:
+                created[change.name] = vol_id
+            print("{} {} {}".format(SYMBOLS[change.kind], change.kind,
+                                    change.name))
+            audit.record("result", action=change.kind, name=change.name,
+                         volume_id=vol_id, error=None)
+
+    pairs = [change for change in changes if change.kind == PAIR]
+    if not pairs:
+        return failed
+    import create_vol_with_pairing_argparse_functions as pairing
+    pairing.sfe_src = sfe_src
+    pairing.sfe_dst = sfe_dst
+    with ThreadPoolExecutor(max_workers=workers * 2) as create_pool, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for change in pairs:
+            src_vol_id = (change.have.volume_id if change.have is not None
+                          else created.get(change.name))
+            if src_vol_id is None:
+                # Its create failed and was already counted
+                continue
+            futures[pool.submit(apply_pair, change, src_vol_id, dst_index,
+                                create_pool)] = change
+        for future in as_completed(futures):
+            change = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print("FAILED pair {}: {}".format(change.name, e))
+                audit.record("result", action=PAIR, name=change.name,
+                             error=str(e))
+                continue
+            print("> pair {}".format(change.name))
+            audit.record("result", action=PAIR, name=change.name, error=None)
+    return failed
+
+
+def add_arguments(parser):
+    parser.add_argument('-sm', type=str,
+                        required=True,
+                        metavar='mvip',
+                        help='MVIP/node name or IP')
+    parser.add_argument('-su', type=str,
+                        required=True,
+                        metavar='username',
+                        help='username to connect with')
+    parser.add_argument('-sp', type=str,
+                        required=True,
+                        metavar='password',
+                        help='password for user')
+    parser.add_argument('-f', type=str,
+                        required=True,
+                        metavar='desired state',
+                        help='CSV or JSONL volume manifest with an optional '
+                        'replication column')
+    parser.add_argument('-dm', type=str,
+                        required=False,
+                        metavar='dmvip',
+                        help='Destination MVIP for volumes with replication')
+    parser.add_argument('-du', type=str,
+                        required=False,
+                        metavar='dusername',
+                        help='Destination username to connect with')
+    parser.add_argument('-dp', type=str,
+                        required=False,
+                        metavar='dpassword',
+                        help='Destination password for user')
+    parser.add_argument('--plan', action='store_true',
+                        help='print the changes without applying them')
+    parser.add_argument('-w', type=int,
+                        default=4,
+                        required=False,
+                        metavar='workers',
+                        help='changes applied at the same time, default 4')
+    parser.add_argument('-l', type=float,
+                        default=DEFAULT_RATE,
+                        required=False,
+                        metavar='rate',
+                        help='most API calls per second to each cluster, '
+                        'default {}'.format(DEFAULT_RATE))
+
+
+def parse_inputs():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    return parser.parse_args()
+
+
+def run(args):
+    if args.w < 1:
+        sys.exit("-w must be at least 1")
+    desired, errors = load_desired(args.f)
+    if any(want.replication for want in desired) and not (
+            args.dm and args.du and args.dp):
+        errors.append("volumes with replication need -dm, -du and -dp")
+    if errors:
+        for err in errors:
+            print(err)
+        sys.exit("Desired state validation failed with {} error(s), "
+                 "nothing was changed".format(len(errors)))
+
+    audit = get_log()
+    audit.record("request", script="vol_reconcile", args=redact_args(args))
+
+    start = time.time()
+    sfe_src = ThrottledClient(sf_session.connect(args.sm, args.su, args.sp),
+                              limiter_for(args.sm, max_limit=args.w,
+                                          rate=args.l))
+    actual = index_volumes(sfe_src)
+    sfe_dst = None
+    dst_index = Inventory()
+    if any(want.replication for want in desired):
+        sfe_dst = ThrottledClient(sf_session.connect(args.dm, args.du,
+                                                     args.dp),
+                                  limiter_for(args.dm, max_limit=args.w,
+                                              rate=args.l))
+        dst_index = index_volumes(sfe_dst)
+
+    changes, unchanged = plan_changes(desired, actual, dst_index)
+    wanted = set(want.name for want in desired)
+    unmanaged = sum(1 for name in actual.names() if name not in wanted)
+    print_plan(changes, unchanged, unmanaged)
+    print("Inventory and diff took {:.2f}s".format(time.time() - start))
+    audit.record("plan", changes=len(changes), unchanged=unchanged,
+                 unmanaged=unmanaged)
+
+    if args.plan:
+        return
+    todo = [change for change in changes if change.kind != CONFLICT]
+    if not todo:
+        print("Nothing to apply")
+        return
+    failed = apply_changes(sfe_src, sfe_dst, todo, dst_index, args.w)
+    print("{} of {} changes applied in {:.2f}s".format(
+        len(todo) - failed, len(todo), time.time() - start))
+    print("Retries: {}".format(retry.snapshot()))
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    run(parse_inputs())
+
+if __name__ == "__main__":
+    main()
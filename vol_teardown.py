@@ -0,0 +1,310 @@
+#!/usr/local/bin/python
+# Written for Python 3.5 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This script removes the volumes a test or failed run left behind
+# Volumes are found by name prefix (-p) or from the checkpoint journal of a
+#   create_vol_with_pairing_argparse_functions.py run (-J), on the source
+#   cluster and, with -dm, on the destination cluster as well
+# Each cluster is listed once into a vol_inventory Inventory and the
+#   selection is applied with its filter()
+# A journal selects only the volume IDs it recorded, a volume that merely
+#   shares a recorded name is never touched
+# Purging cannot be undone, so a prefix shorter than MIN_PREFIX characters
+#   needs --yes
+# On each cluster the volume pairs are removed first, a paired volume
+#   cannot be deleted, then the volumes are deleted with DeleteVolumes and
+#   purged with PurgeDeletedVolumes, -c volumes per call
+# Matching volumes that were already deleted before this run keep their
+#   restore window unless --purge-deleted is given
+# Both clusters are torn down at the same time
+# A journal whose volumes are all gone from both clusters is removed, so a
+#   fresh pairing run can start under the same name
+# --plan lists what would be removed without changing anything
+# usage: python vol_teardown.py -sm <MVIP> -su <USER> -sp <PASSWORD> [-dm <MVIP> -du <USER> -dp <PASSWORD>] (-p prefix | -J journal) [-c chunk] [--purge-deleted] [--yes] [--plan]
+# example python vol_teardown.py -sm sf-mvip -su admin -sp Netapp1! -dm sf-mvip2 -du admin -dp Netapp1! -p bench-pair-
+
+import sys
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from vol_inventory import Inventory
+from vol_journal import replay
+import sf_session
+from sf_throttle import DEFAULT_RATE, ThrottledClient, limiter_for
+from sf_retry import default_policy as retry
+from sf_audit import get_log, redact_args
+from vol_validate import bounded_int, volume_prefix
+
+DEFAULT_CHUNK = 500
+# Shorter prefixes match too much to remove without --yes
+MIN_PREFIX = 4
+
+
+class Selection(object):
+    """
+    Which volumes to remove: names starting with prefix, or the volume IDs
+        recorded in a journal
+    """
+
+    def __init__(self, prefix=None, ids=()):
+        self.prefix = prefix
+        self.ids = set(ids)
+
+    def pick(self, inventory):
+        """
+        Returns the records of inventory this selection covers
+        """
+        if self.prefix is not None:
+            return inventory.filter(prefix=self.prefix)
+        return inventory.filter(volume_ids=self.ids)
+
+
+def journal_selection(path, id_field):
+    """
+    Returns a Selection of the volume IDs a pairing journal recorded in
+        id_field, src_vol_id or dst_vol_id
+    """
+    states = replay(path)
+    return Selection(ids=[state.fields[id_field] for state in states.values()
+                          if state.fields.get(id_field) is not None])
+
+
+class Teardown(object):
+    """
+    What to remove on one cluster, found by scan()
+    """
+
+    def __init__(self, cluster, sfe, selection, purge_deleted=False):
+        self.cluster = cluster
+        self.sfe = sfe
+        self.selection = selection
+        self.purge_deleted = purge_deleted
+        self.paired = []
+        self.active = []
+        self.deleted = []
+        self.failed = 0
+
+    def scan(self):
+        for vol in self.selection.pick(Inventory.load(self.sfe)):
+            self.active.append(vol.volume_id)
+            if vol.paired:
+                self.paired.append(vol.volume_id)
+        if self.purge_deleted:
+            deleted = Inventory.from_models(
+                self.sfe.list_deleted_volumes().volumes)
+            self.deleted = [vol.volume_id for vol in
+                            self.selection.pick(deleted)]
+        return self
+
+    def summary(self):
+        return "{}: {} volumes to delete, {} pairs to remove, {} to " \
+            "purge".format(self.cluster, len(self.active), len(self.paired),
+                           len(self.active) + len(self.deleted))
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _call(teardown, method, fn, *args, **kwargs):
+    """
+    Runs one call with retries, returns True if it went through
+    """
+    try:
+        retry.call(method, fn, *args, **kwargs)
+        return True
+    except Exception as e:
+        print("{}: FAILED {} {}: {}".format(teardown.cluster, method,
+                                            args or kwargs, e))
+        get_log().record("error", cluster=teardown.cluster, method=method,
+                         error=str(e))
+        return False
+
+
+def tear_down(teardown, chunk, workers):
+    """
+    Removes pairs, then deletes and purges in chunks on one cluster
+    Returns the number of volumes that could not be removed
+    """
+    sfe = teardown.sfe
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        unpaired = list(pool.map(
+            lambda vol_id: _call(teardown, "RemoveVolumePair",
+                                 sfe.remove_volume_pair, vol_id),
+            teardown.paired))
+    still_paired = set(vol_id for vol_id, ok in zip(teardown.paired, unpaired)
+                       if not ok)
+    deletable = [vol_id for vol_id in teardown.active
+                 if vol_id not in still_paired]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        chunks = list(chunked(deletable, chunk))
+        deleted = list(pool.map(
+            lambda ids: _call(teardown, "DeleteVolumes", sfe.delete_volumes,
+                              volume_ids=ids), chunks))
+    purgeable = [vol_id for ids, ok in zip(chunks, deleted) if ok
+                 for vol_id in ids] + teardown.deleted
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        chunks = list(chunked(purgeable, chunk))
+        purged = list(pool.map(
+            lambda ids: _call(teardown, "PurgeDeletedVolumes",
+                              sfe.purge_deleted_volumes, volume_ids=ids),
+            chunks))
+    removed = sum(len(ids) for ids, ok in zip(chunks, purged) if ok)
+    teardown.failed = len(teardown.active) + len(teardown.deleted) - removed
+    print("{}: {} pairs removed, {} volumes purged, {} failed in "
+          "{:.2f}s".format(teardown.cluster, sum(unpaired), removed,
+                           teardown.failed, time.time() - start))
+    get_log().record("result", cluster=teardown.cluster,
+                     pairs_removed=sum(unpaired), purged=removed,
+                     failed=teardown.failed, elapsed=time.time() - start)
+    return teardown.failed
+
+
+def add_arguments(parser):
+    parser.add_argument('-sm', type=str,
+                        required=True,
+                        metavar='mvip',
+                        help='MVIP/node name or IP')
+    parser.add_argument('-su', type=str,
+                        required=True,
+                        metavar='username',
+                        help='username to connect with')
+    parser.add_argument('-sp', type=str,
+                        required=True,
+                        metavar='password',
+                        help='password for user')
+    parser.add_argument('-dm', type=str,
+                        required=False,
+                        metavar='dmvip',
+                        help='Destination MVIP to tear down as well')
+    parser.add_argument('-du', type=str,
+                        required=False,
+                        metavar='dusername',
+                        help='Destination username to connect with')
+    parser.add_argument('-dp', type=str,
+                        required=False,
+                        metavar='dpassword',
+                        help='Destination password for user')
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument('-p', type=volume_prefix,
+                           metavar='prefix',
+                           help='remove every volume whose name starts with '
+                           'this prefix')
+    selection.add_argument('-J', type=str,
+                           metavar='journal',
+                           help='remove the volumes recorded in this pairing '
+                           'checkpoint journal')
+    parser.add_argument('-c', type=bounded_int(1, DEFAULT_CHUNK),
+                        default=DEFAULT_CHUNK,
+                        required=False,
+                        metavar='chunk',
+                        help='volumes per DeleteVolumes and '
+                        'PurgeDeletedVolumes call, at most and default '
+                        '{}'.format(DEFAULT_CHUNK))
+    parser.add_argument('--purge-deleted', action='store_true',
+                        help='also purge matching volumes that were deleted '
+                        'before this run, ending their restore window')
+    parser.add_argument('--yes', action='store_true',
+                        help='allow a prefix shorter than {} '
+                        'characters'.format(MIN_PREFIX))
+    parser.add_argument('--plan', action='store_true',
+                        help='list what would be removed and exit')
+    parser.add_argument('-w', type=int,
+                        default=4,
+                        required=False,
+                        metavar='workers',
+                        help='calls at the same time on each cluster, '
+                        'default 4')
+    parser.add_argument('-l', type=float,
+                        default=DEFAULT_RATE,
+                        required=False,
+                        metavar='rate',
+                        help='most API calls per second to each cluster, '
+                        'default {}'.format(DEFAULT_RATE))
+
+
+def parse_inputs():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    return parser.parse_args()
+
+
+def run(args):
+    if args.dm is not None and not (args.du and args.dp):
+        sys.exit("-dm needs -du and -dp")
+    if args.w < 1:
+        sys.exit("-w must be at least 1")
+    if args.J is not None and not os.path.exists(args.J):
+        sys.exit("Journal {} does not exist".format(args.J))
+    if args.p is not None and len(args.p) < MIN_PREFIX and not args.yes:
+        sys.exit("-p {!r} is shorter than {} characters and could match "
+                 "unrelated volumes, give --yes to remove them "
+                 "anyway".format(args.p, MIN_PREFIX))
+
+    audit = get_log()
+    audit.record("request", script="vol_teardown", args=redact_args(args))
+
+    clusters = [(args.sm, args.su, args.sp, "src_vol_id")]
+    if args.dm is not None:
+        clusters.append((args.dm, args.du, args.dp, "dst_vol_id"))
+
+    def prepare(cluster):
+        mvip, user, password, id_field = cluster
+        sfe = ThrottledClient(sf_session.connect(mvip, user, password),
+                              limiter_for(mvip, max_limit=args.w,
+                                          rate=args.l))
+        if args.J is not None:
+            selection = journal_selection(args.J, id_field)
+        else:
+            selection = Selection(prefix=args.p)
+        return Teardown(mvip, sfe, selection, args.purge_deleted).scan()
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=len(clusters)) as pool:
+        teardowns = list(pool.map(prepare, clusters))
+    for teardown in teardowns:
+        print(teardown.summary())
+    audit.record("plan", clusters={t.cluster: {"delete": len(t.active),
+                                               "unpair": len(t.paired),
+                                               "purge": len(t.deleted)}
+                                   for t in teardowns})
+    if args.plan:
+        return
+    if not any(t.active or t.deleted for t in teardowns):
+        print("Nothing to remove")
+        return
+
+    with ThreadPoolExecutor(max_workers=len(teardowns)) as pool:
+        failed = sum(pool.map(lambda t: tear_down(t, args.c, args.w),
+                              teardowns))
+    print("Teardown finished in {:.2f}s with {} failures".format(
+        time.time() - start, failed))
+    print("Retries: {}".format(retry.snapshot()))
+    if failed:
+        sys.exit(1)
+    if args.J is None:
+        return
+    # A volume created just before a crash may have no ID in the journal
+    unrecorded = sorted(name for name, state in replay(args.J).items()
+                        if any(state.fields.get(id_field) is None
+                               for _, _, _, id_field in clusters))
+    if unrecorded:
+        print("Kept journal {}, {} volumes have no recorded volume ID and "
+              "were not removed, check for them by name: {}".format(
+                  args.J, len(unrecorded), ", ".join(unrecorded)))
+    elif args.dm is not None:
+        os.remove(args.J)
+        print("Removed journal {}".format(args.J))
+    else:
+        print("Kept journal {}, the destination cluster was not torn "
+              "down".format(args.J))
+
+
+def main():
+    run(parse_inputs())
+
+if __name__ == "__main__":
+    main()
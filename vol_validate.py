@@ -0,0 +1,332 @@
+#!/usr/local/bin/python
+# Written for Python 3.4 and above
+# No warranty is offered, use at your own risk.  While these scripts have been tested in lab situations, all use cases cannot be accounted for.
+# This module holds the volume naming, size and QoS rules for every script
+# The argparse types (volume_name, volume_prefix, bounded_int) check single
+#   values as they are parsed
+# validate_rows() checks a whole manifest at once: each field is converted
+#   into a column, the bounds and min <= max <= burst checks run as NumPy
+#   array operations, duplicate names are found with one sort, and every
+#   violation of every row is reported together
+# check_volume() applies the same rules to one volume in plain Python, so a
+#   single create never imports NumPy
+# NumPy is required for validate_rows(), it is imported when it is first
+#   called so the argparse types and check_volume() stay cheap to load
+
+import argparse
+import re
+
+# 1 to 64 letters, digits and '-', not starting or ending with '-'
+VOL_NAME_RE = re.compile(r"^[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,62}[a-zA-Z0-9])?$")
+# A name that a number is appended to, so it may end with '-'
+VOL_PREFIX_RE = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9-]{0,59}$")
+NAME_RULE = ("ensure there are no special characters, that it is between "
+             "1 and 64 characters in length, and that no '-' exists at the "
+             "start or end of the volume")
+
+MIN_VOL_SIZE = 1000000000
+MAX_VOL_SIZE = 8796093022208
+MIN_QOS_RANGE = (50, 15000)
+MAX_QOS_RANGE = (100, 200000)
+BURST_QOS_RANGE = (100, 200000)
+
+# Field states while building the columns
+_OK, _MISSING, _BAD = 0, 1, 2
+# Values past this are clamped, they fail every range check anyway
+_INT_LIMIT = 2 ** 62
+
+
+def volume_name(value):
+    """
+    argparse type for a full volume name
+    """
+    if VOL_NAME_RE.match(value):
+        return value
+    raise argparse.ArgumentTypeError(
+        "\nString {} does not match required format, {}".format(value,
+                                                                NAME_RULE))
+
+
+def volume_prefix(value):
+    """
+    argparse type for a name that a volume number is appended to
+    """
+    if VOL_PREFIX_RE.match(value):
+        return value
+    raise argparse.ArgumentTypeError(
+        "\nVolume {} does not match required name format, ensure there are "
+        "no special characters, that it is between 1 and 60 characters in "
+        "length, and that no '-' exists at the start of the "
+        "volume".format(value))
+
+
+def bounded_int(low, high):
+    """
+    Returns an argparse type accepting integers from low to high inclusive
+    """
+    def check(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                "invalid int value: {!r}".format(value))
+        if not low <= number <= high:
+            raise argparse.ArgumentTypeError(
+                "{} is not between {} and {}".format(number, low, high))
+        return number
+    return check
+
+
+def _int_column(np, raws, field):
+    """
+    Returns (values, states) arrays for an integer field
+    CSV text and JSON numbers are converted as whole columns, anything
+        else is converted one value at a time
+    """
+    column = [raw.get(field) for raw in raws]
+    types = set(map(type, column))
+    if types == {str}:
+        try:
+            # Every value is a plain number, the usual case
+            values = np.array(column, dtype=np.int64)
+            return values, np.zeros(len(column), dtype=np.int8)
+        except (ValueError, OverflowError):
+            pass
+        text = np.char.strip(np.array(column, dtype=str))
+        digits = np.char.lstrip(text, "-")
+        negative = np.char.str_len(text) - np.char.str_len(digits)
+        numeric = np.char.isdigit(digits) & (negative <= 1)
+        # Too many digits for int64, far outside every range anyway
+        huge = numeric & (np.char.str_len(digits) > 18)
+        values = np.where(numeric & ~huge, digits, "0").astype(np.int64)
+        values[huge] = _INT_LIMIT
+        values[negative == 1] *= -1
+        states = np.where(text == "", _MISSING,
+                          np.where(numeric, _OK, _BAD)).astype(np.int8)
+        return values, states
+    if (types == {int} and
+            -_INT_LIMIT < min(column) and max(column) < _INT_LIMIT):
+        return (np.array(column, dtype=np.int64),
+                np.zeros(len(column), dtype=np.int8))
+
+    values, states = [], []
+    for value in column:
+        if value is None or (isinstance(value, str) and not value.strip()):
+            values.append(0)
+            states.append(_MISSING)
+            continue
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            number = int(value)
+        except (TypeError, ValueError):
+            values.append(0)
+            states.append(_BAD)
+            continue
+        values.append(max(-_INT_LIMIT, min(_INT_LIMIT, number)))
+        states.append(_OK)
+    return np.array(values, dtype=np.int64), np.array(states, dtype=np.int8)
+
+
+def _bool_column(np, raws, field):
+    """
+    Returns (values, states) arrays for a true/false field
+    """
+    column = [raw.get(field) for raw in raws]
+    if set(map(type, column)) == {str}:
+        text = np.char.lower(np.char.strip(np.array(column, dtype=str)))
+        values = text == "true"
+        states = np.where(values | (text == "false"), _OK, _BAD)
+        return values, states.astype(np.int8)
+    values, states = [], []
+    for value in column:
+        if isinstance(value, str):
+            value = {"true": True, "false": False}.get(value.strip().lower())
+        values.append(value is True)
+        states.append(_OK if isinstance(value, bool) else _BAD)
+    values = np.array(values, dtype=bool)
+    states = np.array(states, dtype=np.int8)
+    return values, states
+
+
+def _row_tuple(*fields):
+    return fields
+
+
+def _validate(rows, factory=_row_tuple):
+    """
+    Checks (line, raw dict) rows, returns (parsed rows, problems) where
+        problems maps the index of each bad row to its messages and parsed
+        rows are factory(line, name, account, size, enable512e, min, max,
+        burst) for the rows without problems
+    """
+    import numpy as np
+
+    count = len(rows)
+    problems = {}
+    flagged = np.zeros(count, dtype=bool)
+    raws = [raw for _, raw in rows]
+
+    def report(mask, message):
+        flagged[mask] = True
+        for i in np.flatnonzero(mask):
+            problems.setdefault(i, []).append(message(i))
+
+    unreadable = np.fromiter(("_error" in raw for raw in raws), bool, count)
+    report(unreadable, lambda i: raws[i]["_error"])
+    readable = ~unreadable
+
+    names = [raw.get("name") for raw in raws]
+    name_ok = np.fromiter((isinstance(name, str) and
+                           VOL_NAME_RE.match(name) is not None
+                           for name in names), bool, count)
+    report(readable & ~name_ok,
+           lambda i: "name {!r} does not match required format, {}".format(
+               names[i], NAME_RULE))
+
+    columns = {}
+    for field in ("account", "size", "min_iops", "max_iops", "burst_iops"):
+        columns[field] = _int_column(np, raws, field)
+        if field in ("account", "size"):
+            report(readable & (columns[field][1] == _MISSING),
+                   lambda i, field=field: "{} is required".format(field))
+        report(readable & (columns[field][1] == _BAD),
+               lambda i, field=field: "{} must be a number, got {!r}".format(
+                   field, raws[i].get(field)))
+
+    sizes, size_states = columns["size"]
+    report(readable & (size_states == _OK) &
+           ((sizes < MIN_VOL_SIZE) | (sizes > MAX_VOL_SIZE)),
+           lambda i: "size must be between {} and {}, got {}".format(
+               MIN_VOL_SIZE, MAX_VOL_SIZE, raws[i].get("size")))
+
+    enable512e, e_states = _bool_column(np, raws, "enable512e")
+    report(readable & (e_states == _BAD),
+           lambda i: "enable512e must be true or false, got {!r}".format(
+               raws[i].get("enable512e")))
+
+    qos_states = np.stack([columns[field][1] for field in
+                           ("min_iops", "max_iops", "burst_iops")])
+    partial = ((qos_states != _MISSING).any(axis=0) &
+               (qos_states == _MISSING).any(axis=0))
+    report(readable & partial,
+           lambda i: "min_iops, max_iops and burst_iops must be set together")
+    has_qos = readable & (qos_states == _OK).all(axis=0)
+    for field, (low, high) in (("min_iops", MIN_QOS_RANGE),
+                               ("max_iops", MAX_QOS_RANGE),
+                               ("burst_iops", BURST_QOS_RANGE)):
+        values = columns[field][0]
+        report(has_qos & ((values < low) | (values > high)),
+               lambda i, field=field, low=low, high=high:
+               "{} must be between {} and {}, got {}".format(
+                   field, low, high, raws[i].get(field)))
+    min_iops, max_iops, burst_iops = (columns[field][0] for field in
+                                      ("min_iops", "max_iops", "burst_iops"))
+    report(has_qos & ((min_iops > max_iops) | (max_iops > burst_iops)),
+           lambda i: "QoS must satisfy min <= max <= burst, got "
+           "{}/{}/{}".format(min_iops[i], max_iops[i], burst_iops[i]))
+
+    # Every later use of a name is a duplicate of its first row
+    named = np.flatnonzero(readable & name_ok)
+    if len(named):
+        _, first, inverse = np.unique(np.array([names[i] for i in named]),
+                                      return_index=True, return_inverse=True)
+        first_row = np.zeros(count, dtype=np.int64)
+        first_row[named] = named[first[inverse]]
+        duplicate = np.zeros(count, dtype=bool)
+        duplicate[named] = first_row[named] != named
+        report(duplicate,
+               lambda i: "duplicate volume name {} also on line {}".format(
+                   names[i], rows[first_row[i]][0]))
+
+    good = np.flatnonzero(~flagged)
+    qos = [np.where(has_qos[good], column[good], None).tolist()
+           for column in (min_iops, max_iops, burst_iops)]
+    parsed = list(map(factory, [rows[i][0] for i in good.tolist()],
+                      [names[i] for i in good.tolist()],
+                      columns["account"][0][good].tolist(),
+                      sizes[good].tolist(), enable512e[good].tolist(), *qos))
+    return parsed, problems
+
+
+def validate_rows(rows, factory=None):
+    """
+    Validates every (line, raw dict) row of a manifest in one pass
+    Returns (parsed rows, errors) where errors is a list of
+        "line N: message" strings covering every problem of every row
+    Parsed rows are built with factory, a plain tuple by default
+    """
+    parsed, problems = _validate(rows, factory or _row_tuple)
+    errors = ["line {}: {}".format(rows[i][0], msg)
+              for i in sorted(problems) for msg in problems[i]]
+    return parsed, errors
+
+
+def _int_value(value):
+    """
+    Returns (number, state) for one integer field, as _int_column does
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return 0, _MISSING
+    if isinstance(value, bool):
+        return 0, _BAD
+    try:
+        return int(value), _OK
+    except (TypeError, ValueError):
+        return 0, _BAD
+
+
+def check_volume(name, account, size, enable512e, min_iops=None,
+                 max_iops=None, burst_iops=None):
+    """
+    Validates one volume by the manifest rules, returns every problem found
+    Gives the messages validate_rows() would for the same row
+    """
+    problems = []
+    if not (isinstance(name, str) and VOL_NAME_RE.match(name)):
+        problems.append("name {!r} does not match required format, "
+                        "{}".format(name, NAME_RULE))
+
+    raw = {"account": account, "size": size, "min_iops": min_iops,
+           "max_iops": max_iops, "burst_iops": burst_iops}
+    values, states = {}, {}
+    for field in ("account", "size", "min_iops", "max_iops", "burst_iops"):
+        values[field], states[field] = _int_value(raw[field])
+        if field in ("account", "size") and states[field] == _MISSING:
+            problems.append("{} is required".format(field))
+        if states[field] == _BAD:
+            problems.append("{} must be a number, got {!r}".format(
+                field, raw[field]))
+
+    if (states["size"] == _OK and
+            not MIN_VOL_SIZE <= values["size"] <= MAX_VOL_SIZE):
+        problems.append("size must be between {} and {}, got {}".format(
+            MIN_VOL_SIZE, MAX_VOL_SIZE, size))
+
+    flag = enable512e
+    if isinstance(flag, str):
+        flag = {"true": True, "false": False}.get(flag.strip().lower())
+    if not isinstance(flag, bool):
+        problems.append("enable512e must be true or false, got {!r}".format(
+            enable512e))
+
+    qos_states = [states[field] for field in
+                  ("min_iops", "max_iops", "burst_iops")]
+    if _MISSING in qos_states and any(state != _MISSING
+                                      for state in qos_states):
+        problems.append(
+            "min_iops, max_iops and burst_iops must be set together")
+    if all(state == _OK for state in qos_states):
+        for field, (low, high) in (("min_iops", MIN_QOS_RANGE),
+                                   ("max_iops", MAX_QOS_RANGE),
+                                   ("burst_iops", BURST_QOS_RANGE)):
+            if not low <= values[field] <= high:
+                problems.append("{} must be between {} and {}, "
+                                "got {}".format(field, low, high, raw[field]))
+        if not (values["min_iops"] <= values["max_iops"] <=
+                values["burst_iops"]):
+            problems.append("QoS must satisfy min <= max <= burst, got "
+                            "{}/{}/{}".format(values["min_iops"],
+                                              values["max_iops"],
+                                              values["burst_iops"]))
+    return problems